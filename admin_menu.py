@@ -88,24 +88,31 @@ def hamta_fran_api() -> None:
         print("\n🥫 Hämtar PRODUKTER från Open Food Facts...")
         print("📝 OBS: Endast livsmedelsproduktser hämtas - INGA RECEPT")
         
-        # Be användaren om sökterm
-        sokterm = input("Ange livsmedel att söka efter (tryck Enter för 'pasta'): ").strip()
-        if not sokterm:
-            sokterm = "pasta"
+        # Be användaren om sökterm(er) - flera termer separeras med komma
+        sokterm = input("Ange livsmedel att söka efter, kommaseparerat (tryck Enter för 'pasta'): ").strip()
+        soktermer = [term.strip() for term in sokterm.split(",") if term.strip()] or ["pasta"]
         
-        print(f"🔍 Söker efter produkter: {sokterm}")
+        print(f"🔍 Söker efter produkter: {', '.join(soktermer)}")
         
         # Skapa databasanslutning
         db = SchoolLunchDB('test.db')
         
         # Importera ENDAST produkter från Open Food Facts
-        result = db.import_meals_from_openfoodfacts(sokterm)
+        if len(soktermer) == 1:
+            result = db.import_meals_from_openfoodfacts(soktermer[0])
+        else:
+            result = db.import_search_terms(soktermer)
         
         if "error" in result:
             print(f"❌ Fel: {result['error']}")
         else:
             print(f"✅ Framgångsrikt!")
-            print(f"  Sökterm: {result['search_term']}")
+            if "terms" in result:
+                for term, stats in result['terms'].items():
+                    fel = f" ⚠️ {stats['error']}" if "error" in stats else ""
+                    print(f"  {term}: {stats['added']} nya, {stats['skipped']} överhoppade{fel}")
+            else:
+                print(f"  Sökterm: {result['search_term']}")
             print(f"  Datakällor: {result['sources']}")
             print(f"  Nya produkter: {result['added']}")
             print(f"  Hoppade över: {result['skipped']}")
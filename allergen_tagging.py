@@ -0,0 +1,133 @@
+"""
+Allergenmärkning av måltider vid import
+Ett svenskt/engelskt lexikon kompileras en gång till ett enda reguljärt
+uttryck (samma prefixträd som product_classifier). Måltidens namn,
+beskrivning, ingredienstext och Open Food Facts allergen-taggar skannas
+en gång när den sparas, och träffarna lagras som taggar i meal_allergens
+så att filtrering aldrig behöver tolka texten igen.
+"""
+
+import argparse
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence
+
+from product_classifier import _trie_pattern
+
+# Allergen -> nyckelord (gemener). Nyckelord matchar även som del av
+# sammansatta ord, t.ex. "vetemjöl" eller "äggula".
+ALLERGEN_KEYWORDS: Dict[str, Sequence[str]] = {
+    "gluten": ["gluten", "vete", "wheat", "råg", "rye", "kornmjöl", "korngryn", "barley", "havre", "oats",
+               "oatmeal", "dinkel", "spelt", "durum", "semolina", "mannagryn", "couscous", "bulgur"],
+    "milk": ["mjölk", "milk", "grädde", "cream", "smör", "butter", "cheese", "mozzarella", "parmesan",
+             "cheddar", "fetaost", "laktos", "lactose", "vassle", "whey", "kasein", "casein", "yoghurt",
+             "yogurt", "kvarg", "crème fraiche", "creme fraiche", "gräddfil"],
+    "egg": ["ägg", "egg", "albumin", "majonnäs", "mayonnaise"],
+    "peanuts": ["jordnöt", "peanut"],
+    "nuts": ["nötter", "nuts", "hasselnöt", "hazelnut", "valnöt", "walnut", "mandel", "mandlar", "almond",
+             "cashew", "pekannöt", "pecan", "paranöt", "brazil nut", "pistage", "pistasch", "pistachio",
+             "macadamia"],
+    "soy": ["soja", "soy", "tofu", "edamame", "miso", "tempeh"],
+    "fish": ["fisk", "fish", "lax", "salmon", "torsk", "cod", "tonfisk", "tuna", "sill", "herring",
+             "makrill", "mackerel", "ansjovis", "anchov", "kolja", "haddock", "sardin"],
+    "shellfish": ["skaldjur", "shellfish", "crustacean", "mollus", "räka", "räkor", "shrimp", "prawn",
+                  "kräft", "krabba", "crab", "hummer", "lobster", "mussl", "mussel", "ostron", "oyster",
+                  "bläckfisk", "squid", "calamari", "scampi", "scallop"],
+    "sesame": ["sesam", "tahini"],
+    "celery": ["selleri", "celery"],
+    "mustard": ["senap", "mustard"],
+    "lupin": ["lupin"],
+    "sulphites": ["sulfit", "sulphite", "sulfite", "svaveldioxid", "sulphur dioxide", "sulphur-dioxide",
+                  "sulfur dioxide"],
+}
+
+# Längre ord som vinner över ett nyckelord de innehåller. Tom tuppel = inget allergen
+# (t.ex. "nötfärs" är nötkött, "bovete" innehåller inte gluten, "lägg" är inte ägg).
+COMPOUND_OVERRIDES: Dict[str, Sequence[str]] = {
+    "bovete": (), "buckwheat": (),
+    "kokosmjölk": (), "coconut milk": (), "rismjölk": (), "rice milk": (),
+    "kakaosmör": (), "cocoa butter": (), "cream of tartar": (),
+    "sojamjölk": ("soy",), "soy milk": ("soy",),
+    "havremjölk": ("gluten",), "oat milk": ("gluten",),
+    "mandelmjölk": ("nuts",), "almond milk": ("nuts",),
+    "jordnötssmör": ("peanuts",), "peanut butter": ("peanuts",),
+    "kokosnöt": (), "coconut": (), "muskotnöt": (), "nutmeg": (),
+    "eggplant": (), "vegg": (), "lägg": (), "bägge": (), "goat": (), "doughnut": (), "donut": (),
+}
+
+# Svenska visningsnamn
+ALLERGEN_LABELS: Dict[str, str] = {
+    "gluten": "Gluten", "milk": "Mjölk", "egg": "Ägg", "peanuts": "Jordnötter", "nuts": "Nötter",
+    "soy": "Soja", "fish": "Fisk", "shellfish": "Skaldjur", "sesame": "Sesam", "celery": "Selleri",
+    "mustard": "Senap", "lupin": "Lupin", "sulphites": "Sulfiter",
+}
+
+# Fält i ett måltids-dict som skannas; "ingredients" och "allergens" lagras inte som kolumner
+TAG_SOURCE_FIELDS = ("name", "description", "ingredients", "allergens")
+
+
+class AllergenTagger:
+    """Hittar allergener i fritext med ett kompilerat regex (längsta ordet vinner på varje position)"""
+
+    def __init__(self, keywords: Dict[str, Sequence[str]] = ALLERGEN_KEYWORDS,
+                 overrides: Dict[str, Sequence[str]] = COMPOUND_OVERRIDES) -> None:
+        self._tags: Dict[str, FrozenSet[str]] = {}
+        for allergen, words in keywords.items():
+            for word in words:
+                self._tags[word] = self._tags.get(word, frozenset()) | {allergen}
+        for word, allergens in overrides.items():
+            self._tags[word] = frozenset(allergens)
+        self._pattern = re.compile(_trie_pattern(self._tags))
+
+    @property
+    def allergens(self) -> List[str]:
+        return sorted(set().union(*self._tags.values()))
+
+    def tag(self, *texts: Optional[str]) -> List[str]:
+        """Sorterade allergener som nämns i texterna"""
+        found: set = set()
+        for text in texts:
+            if text:
+                for word in self._pattern.findall(text.lower()):
+                    found |= self._tags[word]
+        return sorted(found)
+
+    def tag_meal(self, meal: Dict[str, Any]) -> List[str]:
+        """Allergener för en måltid utifrån namn, beskrivning, ingredienser och allergen-taggar"""
+        return self.tag(*(_as_text(meal.get(field)) for field in TAG_SOURCE_FIELDS))
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+DEFAULT_TAGGER = AllergenTagger()
+
+
+def parse_allergen_list(value: Optional[str]) -> List[str]:
+    """Kommaseparerade allergener (t.ex. från en query-parameter), okända ignoreras"""
+    known = set(ALLERGEN_LABELS)
+    return [item.strip().lower() for item in (value or "").split(",") if item.strip().lower() in known]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Allergenmärkning av måltider')
+    parser.add_argument('--db', default='test.db', help='Databasfil')
+    parser.add_argument('--retag', action='store_true', help='Märk om alla måltider (efter ändrat lexikon)')
+    parser.add_argument('text', nargs='*', help='Text att testa lexikonet mot')
+    args = parser.parse_args()
+
+    if args.text:
+        tags = DEFAULT_TAGGER.tag(" ".join(args.text))
+        print(f"🏷️  {', '.join(ALLERGEN_LABELS[tag] for tag in tags) or 'Inga allergener hittades'}")
+    if args.retag:
+        from lunch_system_database import SchoolLunchDB
+        result = SchoolLunchDB(args.db).retag_allergens()
+        print(f"✅ {result['meals']} måltider märkta, {result['tags']} allergentaggar")
+    if not args.text and not args.retag:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
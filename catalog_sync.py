@@ -0,0 +1,189 @@
+"""
+Inkrementell synk av importerade produkter mot Open Food Facts
+Måltider som importerats från Open Food Facts har streckkod och upstreams
+last_modified sparade. Synken kontrollerar bara produkter som inte
+kontrollerats på ett tag, hämtar dem i parallella omgångar och uppdaterar
+enbart de kolumner som faktiskt ändrats.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from lunch_system_database import SchoolLunchDB
+from skolmaten_api import FoodAPI, get_default_api
+
+# Kolumner som kan skrivas över av en nyare version av produkten
+SYNCED_COLUMNS = ("name", "description", "price", "category", "ingredients")
+
+
+class CatalogSync:
+    """Håller importerade måltider i takt med Open Food Facts"""
+
+    def __init__(self, db: SchoolLunchDB, api: Optional[FoodAPI] = None, max_age_hours: float = 24,
+                 batch_size: int = 50, max_workers: int = 8) -> None:
+        self.db: SchoolLunchDB = db
+        self.api: FoodAPI = api or get_default_api()
+        self.max_age_seconds: float = max_age_hours * 3600
+        self.batch_size: int = batch_size
+        self.max_workers: int = max_workers
+
+    def stale_meals(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Importerade måltider som aldrig kontrollerats eller kontrollerades för länge sedan"""
+        rows = self.db.db.execute(f"""
+            SELECT m.id, m.product_code, m.source_last_modified, m.source_allergens, {', '.join('m.' + c for c in SYNCED_COLUMNS)}
+            FROM meals m
+            LEFT JOIN meal_sync_state s ON s.meal_id = m.id
+            WHERE m.product_code IS NOT NULL
+              AND (s.last_checked_at IS NULL OR s.last_checked_at < ?)
+            ORDER BY COALESCE(s.last_checked_at, 0), m.id
+            LIMIT ?
+        """, (time.time() - self.max_age_seconds, -1 if limit is None else limit))
+        return [dict(row) for row in rows]
+
+    def _diff(self, meal: Dict[str, Any], product: Dict[str, Any]) -> Dict[str, Any]:
+        """Ändrade kolumner för en nyare version av produkten"""
+        converted = self.api.convert_openfoodfacts_to_local({"products": [product]})
+        if not converted:
+            return {}
+        fresh = converted[0]
+        changes = {column: fresh[column] for column in SYNCED_COLUMNS
+                   if column in fresh and (fresh[column] or None) != (meal[column] or None)}
+        # Allergen-taggarna sparas som source_allergens; update_meal märker om när de ändras
+        if (fresh.get("allergens") or None) != (meal["source_allergens"] or None):
+            changes["allergens"] = fresh.get("allergens")
+        return changes
+
+    def _apply_batch(self, meals: List[Dict[str, Any]], stats: Dict[str, Any]) -> None:
+        codes = [meal["product_code"] for meal in meals]
+        products = self.api.get_products_by_barcodes(codes, max_workers=self.max_workers)
+        now = time.time()
+
+        with self.db.db.transaction():
+            for meal in meals:
+                result = products.get(meal["product_code"], {"error": "Inget svar"})
+                if "error" in result:
+                    # last_checked_at lämnas orörd så att produkten tas om nästa körning
+                    stats["errors"] += 1
+                    self._mark(meal["id"], None, "error", result["error"])
+                    continue
+                if result.get("status") != 1 or not result.get("product"):
+                    stats["missing"] += 1
+                    self._mark(meal["id"], now, "missing")
+                    continue
+
+                product = result["product"]
+                upstream_modified = product.get("last_modified_t")
+                known_modified = meal["source_last_modified"]
+                if upstream_modified is not None and known_modified is not None \
+                        and int(upstream_modified) <= known_modified:
+                    stats["unchanged"] += 1
+                    self._mark(meal["id"], now, "unchanged")
+                    continue
+
+                changes = self._diff(meal, product)
+                if upstream_modified is not None and upstream_modified != known_modified:
+                    changes["source_last_modified"] = int(upstream_modified)
+                if any(column in changes for column in SYNCED_COLUMNS):
+                    stats["updated"] += 1
+                    for column in SYNCED_COLUMNS:
+                        if column in changes:
+                            stats["fields_changed"][column] = stats["fields_changed"].get(column, 0) + 1
+                else:
+                    stats["unchanged"] += 1
+                if changes:
+                    self.db.update_meal(meal["id"], changes)
+                self._mark(meal["id"], now, "updated" if changes else "unchanged")
+        stats["checked"] += len(meals)
+
+    def _mark(self, meal_id: int, checked_at: Optional[float], status: str, error: Optional[str] = None) -> None:
+        self.db.db.execute_write("""
+            INSERT INTO meal_sync_state (meal_id, last_checked_at, last_status, error) VALUES (?, ?, ?, ?)
+            ON CONFLICT(meal_id) DO UPDATE SET
+                last_checked_at = COALESCE(excluded.last_checked_at, last_checked_at),
+                last_status = excluded.last_status,
+                error = excluded.error
+        """, (meal_id, checked_at, status, error))
+
+    def sync(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Kontrollera inaktuella produkter i omgångar och applicera ändringar
+
+        Args:
+            limit: Max antal produkter den här körningen (None = alla inaktuella)
+
+        Returns:
+            Dict med antal kontrollerade, uppdaterade, oförändrade, borttagna och misslyckade
+        """
+        started = time.monotonic()
+        stats: Dict[str, Any] = {"checked": 0, "updated": 0, "unchanged": 0, "missing": 0, "errors": 0,
+                                 "fields_changed": {}}
+        stale = self.stale_meals(limit)
+        for start in range(0, len(stale), self.batch_size):
+            self._apply_batch(stale[start:start + self.batch_size], stats)
+        stats["seconds"] = round(time.monotonic() - started, 2)
+        return stats
+
+
+class CatalogSyncScheduler(threading.Thread):
+    """Bakgrundstråd som kör katalogsynken med jämna mellanrum"""
+
+    def __init__(self, sync: CatalogSync, interval_seconds: float = 3600) -> None:
+        super().__init__(name="catalog-sync", daemon=True)
+        self.catalog_sync: CatalogSync = sync
+        self.interval_seconds: float = interval_seconds
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.failures: int = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.last_result = self.catalog_sync.sync()
+            except Exception as e:
+                # Ett fel (t.ex. låst databas) ska inte stoppa tråden - nästa omgång försöker igen
+                self.failures += 1
+                self.last_result = {"error": f"Katalogsynken misslyckades: {e}"}
+                print(f"⚠️ {self.last_result['error']}")
+            self._stop_event.wait(self.interval_seconds)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Synka importerade produkter mot Open Food Facts')
+    parser.add_argument('--database', '-d', default='test.db', help='Database file path')
+    parser.add_argument('--max-age-hours', type=float, default=24, help='Kontrollera produkter äldre än så här')
+    parser.add_argument('--batch-size', type=int, default=50, help='Produkter per omgång')
+    parser.add_argument('--workers', type=int, default=8, help='Max antal samtidiga anrop')
+    parser.add_argument('--limit', type=int, default=None, help='Max antal produkter per körning')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='Run as a scheduler with this many seconds between syncs')
+
+    args = parser.parse_args()
+    catalog_sync = CatalogSync(SchoolLunchDB(args.database), max_age_hours=args.max_age_hours,
+                               batch_size=args.batch_size, max_workers=args.workers)
+
+    if args.interval <= 0:
+        result = catalog_sync.sync(args.limit)
+        print(f"✅ {result['checked']} kontrollerade: {result['updated']} uppdaterade, "
+              f"{result['unchanged']} oförändrade, {result['missing']} borttagna, {result['errors']} fel "
+              f"({result['seconds']}s)")
+        sys.exit(1 if result['errors'] else 0)
+
+    scheduler = CatalogSyncScheduler(catalog_sync, args.interval)
+    scheduler.start()
+    print(f"⏱️  Synkar var {args.interval:.0f}:e sekund - Ctrl+C för att avsluta")
+    try:
+        while scheduler.is_alive():
+            scheduler.join(1)
+    except KeyboardInterrupt:
+        scheduler.stop()
+        print("\n👋 Katalogsynken stoppad")
+
+
+if __name__ == "__main__":
+    main()
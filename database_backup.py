@@ -0,0 +1,220 @@
+"""
+Online-backup av lunchdatabasen
+Använder sqlite3:s backup-API (Connection.backup) i små steg så att
+Flask-servern kan fortsätta skriva ordrar medan kopian tas.
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Skrivningar från andra anslutningar startar om en stegvis backup; efter så här många
+# omstarter i rad börjar backupen om med dubbelt så stora steg så att den alltid blir klar
+MAX_RESTARTS = 3
+
+
+class _BackupRestarted(Exception):
+    """Stegvisa backupen startades om för många gånger"""
+
+
+def _backup_pattern(db_path: str, backup_dir: str) -> str:
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(backup_dir, f"{stem}-*.db")
+
+
+def verify_backup(backup_path: str) -> bool:
+    """Kör PRAGMA integrity_check mot en backupfil"""
+    conn = sqlite3.connect(backup_path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()
+        return result is not None and result[0] == "ok"
+    finally:
+        conn.close()
+
+
+def rotate_backups(db_path: str, backup_dir: str, keep: int = 7) -> List[str]:
+    """
+    Ta bort äldsta backuperna så att högst `keep` finns kvar
+
+    Returns:
+        Lista med borttagna filer
+    """
+    # Äldst först; namnet avgör när två filer har samma ändringstid
+    backups = sorted(glob.glob(_backup_pattern(db_path, backup_dir)), key=lambda path: (os.path.getmtime(path), path))
+    removed = []
+    for old_backup in backups[:max(0, len(backups) - keep)]:
+        os.remove(old_backup)
+        removed.append(old_backup)
+    return removed
+
+
+def backup_database(db_path: str, backup_dir: str = "backups", pages_per_step: int = 256,
+                    sleep_seconds: float = 0.05, keep: int = 7,
+                    max_restarts: int = MAX_RESTARTS) -> Dict[str, Any]:
+    """
+    Ta en online-backup av databasen utan att blockera skrivare länge
+
+    Args:
+        db_path: Databasen som ska kopieras (t.ex. test.db)
+        backup_dir: Katalog där backuperna sparas
+        pages_per_step: Antal sidor som kopieras per steg
+        sleep_seconds: Paus mellan stegen så att skrivare släpps fram
+        keep: Antal backuper som behålls efter rotation
+        max_restarts: Omstarter (källan ändrades under kopieringen) innan stegen görs större;
+            med WAL tas då resten i ett steg, som bara håller en läs-snapshot
+
+    Returns:
+        Dict med sökväg, antal sidor och tidsåtgång, eller felmeddelande
+    """
+    if not os.path.exists(db_path):
+        return {"error": f"Databasen {db_path} finns inte"}
+
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    # Mikrosekunder så att två backuper samma sekund inte skriver över varandra; fast bredd
+    # gör att namnen sorteras i tidsordning för rotationen
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    backup_path = os.path.join(backup_dir, f"{stem}-{timestamp}.db")
+    suffix = 1
+    while os.path.exists(backup_path) or os.path.exists(backup_path + ".partial"):
+        backup_path = os.path.join(backup_dir, f"{stem}-{timestamp}-{suffix}.db")
+        suffix += 1
+    partial_path = backup_path + ".partial"
+
+    progress_info = {"steps": 0, "pages": 0, "restarts": 0, "attempt_restarts": 0, "remaining": None}
+
+    # Anropas efter varje steg - pausen låter väntande skrivare ta låset
+    def progress(status: int, remaining: int, total: int) -> None:
+        progress_info["steps"] += 1
+        progress_info["pages"] = total
+        if progress_info["remaining"] is not None and remaining >= progress_info["remaining"]:
+            # Källan skrevs till och SQLite började om från första sidan
+            progress_info["restarts"] += 1
+            progress_info["attempt_restarts"] += 1
+            if progress_info["attempt_restarts"] > max_restarts:
+                raise _BackupRestarted()
+        progress_info["remaining"] = remaining
+        if remaining > 0 and sleep_seconds > 0:
+            time.sleep(sleep_seconds)
+
+    started = time.monotonic()
+    source = sqlite3.connect(db_path, timeout=30)
+    target = sqlite3.connect(partial_path)
+    single_step = False
+    pages = pages_per_step
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+        while True:
+            try:
+                if single_step:
+                    source.backup(target)
+                else:
+                    source.backup(target, pages=pages, progress=progress)
+                break
+            except _BackupRestarted:
+                progress_info["attempt_restarts"] = 0
+                progress_info["remaining"] = None
+                if wal:
+                    # Med WAL håller ett steg bara en läs-snapshot, så skrivare blockeras inte
+                    single_step = True
+                else:
+                    # Utan WAL låser varje steg ut skrivarna - större steg, men fortfarande med pauser
+                    pages *= 2
+    except sqlite3.Error as e:
+        target.close()
+        source.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return {"error": f"Backup misslyckades: {e}"}
+    target.close()
+    source.close()
+
+    if not verify_backup(partial_path):
+        os.remove(partial_path)
+        return {"error": f"Integritetskontroll misslyckades för {backup_path}"}
+
+    os.replace(partial_path, backup_path)
+    removed = rotate_backups(db_path, backup_dir, keep)
+
+    return {
+        "path": backup_path,
+        "pages": progress_info["pages"],
+        "steps": progress_info["steps"],
+        "restarts": progress_info["restarts"],
+        "single_step": single_step,
+        "pages_per_step": pages,
+        "seconds": round(time.monotonic() - started, 3),
+        "integrity": "ok",
+        "removed": removed
+    }
+
+
+class BackupScheduler(threading.Thread):
+    """Bakgrundstråd som tar en online-backup med jämna mellanrum"""
+
+    def __init__(self, db_path: str, interval_seconds: float = 3600, **backup_options: Any) -> None:
+        super().__init__(name="database-backup", daemon=True)
+        self.db_path: str = db_path
+        self.interval_seconds: float = interval_seconds
+        self.backup_options: Dict[str, Any] = backup_options
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.failures: int = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.last_result = backup_database(self.db_path, **self.backup_options)
+            except Exception as e:
+                # T.ex. full disk eller låst databas - försök igen nästa gång i stället för att dö tyst
+                self.last_result = {"error": f"Backup misslyckades: {e}"}
+            if "error" in self.last_result:
+                self.failures += 1
+                print(f"⚠️ {self.last_result['error']}")
+            self._stop_event.wait(self.interval_seconds)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Online backup of the school lunch database')
+    parser.add_argument('--database', '-d', default='test.db', help='Database file path')
+    parser.add_argument('--dir', default='backups', help='Backup directory')
+    parser.add_argument('--pages', type=int, default=256, help='Pages copied per step')
+    parser.add_argument('--sleep', type=float, default=0.05, help='Seconds to sleep between steps')
+    parser.add_argument('--keep', type=int, default=7, help='Number of backups to keep')
+    parser.add_argument('--interval', type=float, default=0,
+                        help='Run as a scheduler with this many seconds between backups')
+
+    args = parser.parse_args()
+    options = {"backup_dir": args.dir, "pages_per_step": args.pages,
+               "sleep_seconds": args.sleep, "keep": args.keep}
+
+    if args.interval <= 0:
+        result = backup_database(args.database, **options)
+        if "error" in result:
+            print(f"❌ {result['error']}")
+            sys.exit(1)
+        print(f"✅ Backup klar: {result['path']} ({result['pages']} sidor, {result['seconds']}s)")
+        sys.exit(0)
+
+    scheduler = BackupScheduler(args.database, args.interval, **options)
+    scheduler.start()
+    print(f"⏱️  Tar backup var {args.interval:.0f}:e sekund - Ctrl+C för att avsluta")
+    try:
+        while scheduler.is_alive():
+            scheduler.join(1)
+    except KeyboardInterrupt:
+        scheduler.stop()
+        print("\n👋 Backup-schemaläggaren stoppad")
+
+
+if __name__ == "__main__":
+    main()
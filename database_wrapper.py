@@ -1,18 +1,27 @@
 import sqlite3
 import threading
-from typing import List, Optional, Any, Union
+from typing import Callable, Iterable, Iterator, List, Optional, Any, Union
 
 # Klass SQLite-databas
 class SQLiteDB:
-    def __init__(self, db_path: str) -> None:
+    def __init__(self, db_path: str, journal_mode: Optional[str] = None) -> None:
         self.db_path: str = db_path
+        # T.ex. "WAL" så att läsare (backup) kan köra parallellt med skrivningar. Läget sparas
+        # i databasfilen, så det är opt-in - att bara öppna en databas ska inte ändra den
+        self.journal_mode: Optional[str] = journal_mode
+        self._journal_mode_set = False
         self._local = threading.local()
     
     # Skapa eller hämta databasanslutning för aktuell tråd
     def _get_connection(self) -> sqlite3.Connection:
         if not hasattr(self._local, 'conn'):
-            self._local.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._local.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
             self._local.conn.row_factory = sqlite3.Row
+            self._local.conn.execute("PRAGMA busy_timeout=30000")
+            if self.journal_mode and not self._journal_mode_set:
+                # Beständigt för filen - räcker att sätta en gång
+                self._local.conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+                self._journal_mode_set = True
         return self._local.conn
     
     # Kör SELECT-frågor och returnera resultat
@@ -22,25 +31,87 @@ class SQLiteDB:
         cursor.execute(sql, params or [])
         return cursor.fetchall()
     
+    # Strömma SELECT-resultat i omgångar utan att läsa in allt i minnet
+    def iterate(self, sql: str, params: Optional[List[Any]] = None, batch_size: int = 500) -> Iterator[sqlite3.Row]:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params or [])
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    
     # Kör INSERT/UPDATE/DELETE och returnera rad-ID
     def execute_write(self, sql: str, params: Optional[List[Any]] = None) -> Optional[int]:
         conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute(sql, params or [])
-        conn.commit()
+        if not self._in_transaction():
+            conn.commit()
         return cursor.lastrowid
     
+    # Kör samma INSERT/UPDATE för många rader och returnera antal påverkade rader
+    def execute_many(self, sql: str, seq_of_params: Iterable[Any]) -> int:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(sql, seq_of_params)
+        if not self._in_transaction():
+            conn.commit()
+        return cursor.rowcount
+    
+    def _in_transaction(self) -> bool:
+        return getattr(self._local, 'depth', 0) > 0
+    
+    # Kör callback när skrivningarna är synliga för andra anslutningar: direkt
+    # utanför en transaktion, annars efter yttersta commit (slängs vid rollback)
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        if not self._in_transaction():
+            callback()
+            return
+        if not hasattr(self._local, 'after_commit'):
+            self._local.after_commit = []
+        self._local.after_commit.append(callback)
+    
     def transaction(self) -> 'SQLiteDB':
         return self
     
-    # Transaktionshantering med context manager
+    # Transaktionshantering med context manager - skrivningar inuti blocket
+    # committas tillsammans när det yttersta blocket avslutas. Inre block är
+    # SAVEPOINTs: ett undantag som lämnar ett inre block rullar tillbaka just det
+    # blocket, även om ett yttre block fångar undantaget och fortsätter
     def __enter__(self) -> 'SQLiteDB':
+        depth = getattr(self._local, 'depth', 0)
+        if depth > 0:
+            conn = self._get_connection()
+            if not conn.in_transaction:
+                # Annars skulle RELEASE av den första savepointen committa det yttre blocket
+                conn.execute("BEGIN")
+            conn.execute(f"SAVEPOINT sp_{depth}")
+            if not hasattr(self._local, 'after_commit'):
+                self._local.after_commit = []
+            self._local.savepoints = getattr(self._local, 'savepoints', []) + [len(self._local.after_commit)]
+        self._local.depth = depth + 1
         return self
     
     def __exit__(self, exc_type: Optional[type], exc_val: Optional[Exception], exc_tb: Optional[Any]) -> None:
+        self._local.depth -= 1
         conn = self._get_connection()
+        if self._local.depth > 0:
+            name = f"sp_{self._local.depth}"
+            callback_count = self._local.savepoints.pop()
+            if exc_type is not None:
+                conn.execute(f"ROLLBACK TO {name}")
+                # Callbacks från det rullade blocket ska aldrig köras
+                del self._local.after_commit[callback_count:]
+            conn.execute(f"RELEASE {name}")
+            return
+        callbacks = getattr(self._local, 'after_commit', [])
+        self._local.after_commit = []
         if exc_type is None:
             conn.commit()
+            for callback in callbacks:
+                callback()
         else:
             conn.rollback()
     
@@ -0,0 +1,64 @@
+"""
+Inspelning och uppspelning av FoodAPI-svar
+I record-läge sparas riktiga svar som JSON-filer, i replay-läge serveras
+de från disk utan nätverk - så tester och benchmarks blir snabba och
+deterministiska.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "food_api")
+
+MODES = ("off", "record", "replay")
+
+
+class FixtureMissing(requests.exceptions.ConnectionError):
+    """Replay-läge men inget inspelat svar för anropet"""
+
+
+def fixture_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Nyckel för ett anrop: sökväg och sorterade parametrar, utan värdnamn,
+    så att samma fixtures fungerar mot det riktiga API:et och stubservern
+    """
+    path = urlparse(url).path
+    normalized = sorted((str(name), str(value)) for name, value in (params or {}).items())
+    return json.dumps([path, normalized], ensure_ascii=False)
+
+
+class FixtureStore:
+    """Katalog med inspelade svar, en JSON-fil per anrop"""
+
+    def __init__(self, fixture_dir: str = DEFAULT_FIXTURE_DIR, mode: str = "replay") -> None:
+        if mode not in MODES:
+            raise ValueError(f"Okänt fixture-läge: '{mode}' (välj {', '.join(MODES)})")
+        self.fixture_dir: str = fixture_dir
+        self.mode: str = mode
+
+    def path_for(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.fixture_dir, f"{digest}.json")
+
+    def load(self, url: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Returnera inspelat svar eller kasta FixtureMissing"""
+        key = fixture_key(url, params)
+        try:
+            with open(self.path_for(key), "r", encoding="utf-8") as file:
+                return json.load(file)["response"]
+        except FileNotFoundError:
+            raise FixtureMissing(f"Ingen fixture för {key}")
+
+    def save(self, url: str, params: Optional[Dict[str, Any]], response: Any) -> str:
+        key = fixture_key(url, params)
+        os.makedirs(self.fixture_dir, exist_ok=True)
+        path = self.path_for(key)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"key": key, "url": url, "params": params or {}, "response": response},
+                      file, ensure_ascii=False, indent=1)
+        return path
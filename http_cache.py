@@ -0,0 +1,204 @@
+"""
+Beständig HTTP-svarscache för FoodAPI
+Sparar JSON-svar från Open Food Facts och TheMealDB i en SQLite-fil så att
+upprepade sökningar och streckkoder läses från disk i stället för nätet.
+Stöder TTL per endpoint, revalidering med ETag/Last-Modified och
+storleksbegränsad LRU-rensning.
+
+Läsningar skriver inte till databasen: åtkomsttiderna samlas i minnet och
+skrivs i en batch (var access_flush_interval:e sekund, vid ACCESS_FLUSH_SIZE
+poster och före rensning). Den totala storleken hålls som en löpande summa,
+så bara en store som tar cachen över max_bytes (eller var
+TOTAL_RESYNC_STORES:e store, för skrivningar från andra processer som delar
+filen) behöver läsa hela tabellen.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+from database_wrapper import SQLiteDB
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "food_api_cache.db")
+
+# Sekunder ett svar räknas som färskt per endpoint (0 = cachas inte)
+DEFAULT_TTLS: Dict[str, float] = {
+    "search": 6 * 3600,
+    "product": 24 * 3600,
+    "random": 0,
+    "catalog": 24 * 3600,
+    "default": 3600
+}
+
+# Väntande åtkomsttider som skrivs i en batch
+ACCESS_FLUSH_SIZE = 256
+# Rensningen tar cachen ner till den här andelen av max_bytes, så att nästa store inte rensar igen
+EVICT_TO_FRACTION = 0.9
+
+
+class ResponseCache:
+    """SQLite-baserad cache för GET-svar, nycklad på metod, URL och parametrar"""
+
+    # Var så här många store läses den totala storleken om från tabellen
+    TOTAL_RESYNC_STORES: int = 100
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH, ttls: Optional[Dict[str, float]] = None,
+                 max_bytes: int = 50 * 1024 * 1024, access_flush_interval: float = 30.0) -> None:
+        self.db: SQLiteDB = SQLiteDB(db_path, journal_mode="WAL")
+        self.ttls: Dict[str, float] = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_bytes: int = max_bytes
+        self.access_flush_interval: float = access_flush_interval
+        self._lock = threading.Lock()
+        # key -> senaste åtkomst som inte skrivits till databasen än
+        self._pending_access: Dict[str, float] = {}
+        self._last_access_flush: float = time.monotonic()
+        self._counters: Dict[str, int] = {
+            "hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "stores": 0, "evictions": 0
+        }
+        self._initialize()
+        self._total_bytes: int = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache")[0][0]
+        self._stores_since_resync: int = 0
+
+    def _initialize(self) -> None:
+        with self.db.transaction():
+            self.db.execute_write("""
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            self.db.execute_write(
+                "CREATE INDEX IF NOT EXISTS idx_http_cache_last_access ON http_cache (last_access)"
+            )
+
+    @staticmethod
+    def make_key(method: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Normaliserad nyckel: samma parametrar i annan ordning ger samma nyckel"""
+        normalized = sorted((str(name), str(value)) for name, value in (params or {}).items())
+        query = urlencode(normalized)
+        return f"{method.upper()} {url}?{query}" if query else f"{method.upper()} {url}"
+
+    def ttl_for(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.ttls["default"])
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        row = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM http_cache")[0]
+        counters["entries"] = row[0]
+        counters["bytes"] = row[1]
+        with self._lock:
+            counters["pending_access"] = len(self._pending_access)
+        return counters
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Hämta en post (färsk eller inte); LRU-tiden skrivs senare i en batch"""
+        rows = self.db.execute(
+            "SELECT body, etag, last_modified, expires_at FROM http_cache WHERE key = ?", (key,)
+        )
+        if not rows:
+            return None
+        with self._lock:
+            self._pending_access[key] = time.time()
+            due = (len(self._pending_access) >= ACCESS_FLUSH_SIZE
+                   or time.monotonic() - self._last_access_flush >= self.access_flush_interval)
+        if due:
+            self.flush_access_times()
+        body, etag, last_modified, expires_at = rows[0]
+        return {
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": expires_at > time.time()
+        }
+
+    def store(self, key: str, url: str, body: bytes, ttl: float,
+              etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        now = time.time()
+        with self.db.transaction():
+            # Primärnyckeluppslag - den löpande summan ska inte räkna en ersatt post två gånger
+            old = self.db.execute("SELECT size FROM http_cache WHERE key = ?", (key,))
+            self.db.execute_write("""
+                INSERT OR REPLACE INTO http_cache
+                    (key, url, body, etag, last_modified, fetched_at, expires_at, last_access, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key, url, body, etag, last_modified, now, now + ttl, now, len(body)))
+        with self._lock:
+            self._total_bytes += len(body) - (old[0][0] if old else 0)
+            self._pending_access.pop(key, None)
+            self._stores_since_resync += 1
+            resync = self._stores_since_resync >= self.TOTAL_RESYNC_STORES
+            over_limit = self._total_bytes > self.max_bytes
+        self.count("stores")
+        if over_limit or resync:
+            self._evict()
+
+    def refresh(self, key: str, ttl: float) -> None:
+        """Förläng en post efter ett 304 Not Modified"""
+        now = time.time()
+        with self.db.transaction():
+            self.db.execute_write(
+                "UPDATE http_cache SET fetched_at = ?, expires_at = ?, last_access = ? WHERE key = ?",
+                (now, now + ttl, now, key)
+            )
+
+    def flush_access_times(self) -> int:
+        """Skriv väntande åtkomsttider i en transaktion; returnerar antal poster"""
+        with self._lock:
+            pending = self._pending_access
+            self._pending_access = {}
+            self._last_access_flush = time.monotonic()
+        if not pending:
+            return 0
+        with self.db.transaction():
+            # MAX: en annan process kan ha skrivit en senare tid
+            self.db.execute_many(
+                "UPDATE http_cache SET last_access = MAX(last_access, ?) WHERE key = ?",
+                [(accessed, key) for key, accessed in pending.items()]
+            )
+        return len(pending)
+
+    def _evict(self) -> None:
+        """Läs om den totala storleken och ta bort minst nyligen använda poster tills cachen ryms"""
+        self.flush_access_times()
+        target = int(self.max_bytes * EVICT_TO_FRACTION)
+        evicted = 0
+        with self.db.transaction():
+            # Summan räknas om här: andra processer kan dela cachefilen
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache")[0][0]
+            if total > self.max_bytes:
+                for key, size in self.db.execute("SELECT key, size FROM http_cache ORDER BY last_access"):
+                    if total <= target:
+                        break
+                    self.db.execute_write("DELETE FROM http_cache WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+        with self._lock:
+            self._total_bytes = total
+            self._stores_since_resync = 0
+            self._counters["evictions"] += evicted
+
+    def close(self) -> None:
+        """Skriv väntande åtkomsttider och stäng anslutningen"""
+        self.flush_access_times()
+        self.db.close()
+
+    def clear(self) -> None:
+        with self.db.transaction():
+            self.db.execute_write("DELETE FROM http_cache")
+        with self._lock:
+            self._total_bytes = 0
+            self._pending_access.clear()
@@ -0,0 +1,236 @@
+"""
+Bakgrundsjobb för importer
+Jobb sparas i tabellen import_jobs och körs av en lokal trådpool, så att
+webbförfrågan kan svara direkt med ett jobb-id. Samma jobb (t.ex. "importera
+pasta") som redan väntar eller körs slås ihop till ett.
+
+Ett jobb som körs är märkt med processens ägar-id (claimed_by) och en
+heartbeat som förnyas medan processen lever. Bara jobb vars heartbeat är
+äldre än stale_after köas om - av resume_pending() vid start och av
+heartbeat-tråden i varje levande process - så flera processer (t.ex.
+WSGI-workers) mot samma databas kör inte samma jobb två gånger.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from database_wrapper import SQLiteDB
+
+# Ett jobb får params och en progress-funktion och returnerar ett resultat-dict
+JobHandler = Callable[[Dict[str, Any], Callable[[Dict[str, Any]], None]], Dict[str, Any]]
+
+
+class ImportJobQueue:
+    """Beständig jobbkö med trådpool och dedupe av aktiva jobb"""
+
+    def __init__(self, db: SQLiteDB, max_workers: int = 2, progress_interval: float = 0.5,
+                 heartbeat_interval: float = 10.0, stale_after: float = 60.0) -> None:
+        self.db: SQLiteDB = db
+        self.progress_interval: float = progress_interval
+        self.heartbeat_interval: float = heartbeat_interval
+        # Ett igångvarande jobb utan heartbeat så här länge räknas som övergivet
+        self.stale_after: float = stale_after
+        self.owner: str = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, JobHandler] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import-job")
+        self._active: Set[str] = set()
+        self._active_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._initialize()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="import-job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _initialize(self) -> None:
+        with self.db.transaction():
+            self.db.execute_write("""
+                CREATE TABLE IF NOT EXISTS import_jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    dedupe_key TEXT NOT NULL,
+                    params TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            # Högst ett aktivt jobb per dedupe-nyckel - databasen avgör vid samtidiga klick
+            self.db.execute_write(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_import_jobs_active ON import_jobs (dedupe_key) "
+                "WHERE status IN ('queued', 'running')"
+            )
+            # Tabeller från före ägar-id och heartbeat
+            columns = {row[1] for row in self.db.execute("PRAGMA table_info(import_jobs)")}
+            for column, column_type in (("claimed_by", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    self.db.execute_write(f"ALTER TABLE import_jobs ADD COLUMN {column} {column_type}")
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, params: Dict[str, Any],
+               dedupe_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Lägg ett jobb i kön, eller returnera det aktiva jobbet med samma nyckel
+
+        Returns:
+            (jobb, deduplicated) - deduplicated är True om ett befintligt jobb returnerades
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Okänd jobbtyp: '{kind}'")
+        dedupe_key = dedupe_key or f"{kind}:{json.dumps(params, sort_keys=True)}"
+        job_id = uuid.uuid4().hex
+        try:
+            with self.db.transaction():
+                self.db.execute_write(
+                    "INSERT INTO import_jobs (id, kind, dedupe_key, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, dedupe_key, json.dumps(params, ensure_ascii=False), time.time())
+                )
+        except sqlite3.IntegrityError:
+            rows = self.db.execute(
+                "SELECT id FROM import_jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')",
+                (dedupe_key,)
+            )
+            if rows:
+                return self.get(rows[0][0]), True
+            # Det aktiva jobbet hann bli klart - försök igen
+            return self.submit(kind, params, dedupe_key)
+
+        self._executor.submit(self._run, job_id)
+        return self.get(job_id), False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.execute("SELECT * FROM import_jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        for field in ("params", "progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def resume_pending(self) -> int:
+        """Köa om övergivna jobb och starta alla väntande; returnerar antal startade"""
+        self._requeue_stale()
+        rows = self.db.execute("SELECT id FROM import_jobs WHERE status = 'queued' ORDER BY created_at")
+        for row in rows:
+            self._executor.submit(self._run, row[0])
+        return len(rows)
+
+    def _requeue_stale(self) -> List[str]:
+        """Köa om igångvarande jobb vars process inte skickat heartbeat på stale_after sekunder"""
+        # Rader från före heartbeat-kolumnen har bara started_at
+        stale_condition = "status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ?"
+        cutoff = time.time() - self.stale_after
+        with self.db.transaction():
+            rows = self.db.execute(f"SELECT id FROM import_jobs WHERE {stale_condition} ORDER BY created_at",
+                                   (cutoff,))
+            self.db.execute_write(
+                f"UPDATE import_jobs SET status = 'queued', claimed_by = NULL WHERE {stale_condition}", (cutoff,)
+            )
+        return [row[0] for row in rows]
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                with self._active_lock:
+                    active = list(self._active)
+                if active:
+                    with self.db.transaction():
+                        self.db.execute_many(
+                            "UPDATE import_jobs SET heartbeat_at = ? WHERE id = ? AND claimed_by = ?",
+                            [(time.time(), job_id, self.owner) for job_id in active]
+                        )
+                # En process som dött utan omstart lämnar jobb efter sig - ta över dem
+                for job_id in self._requeue_stale():
+                    self._executor.submit(self._run, job_id)
+            except (sqlite3.Error, RuntimeError) as e:
+                # Låst databas, eller kön stängs just nu - nästa varv försöker igen
+                print(f"⚠️ Heartbeat för importjobb misslyckades: {e}")
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        # Bara ägaren skriver - ett jobb som köats om som övergivet tillhör någon annan nu
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.db.transaction():
+            self.db.execute_write(f"UPDATE import_jobs SET {assignments} WHERE id = ? AND claimed_by = ?",
+                                  (*fields.values(), job_id, self.owner))
+
+    def _claim(self, job_id: str) -> bool:
+        """Markera jobbet som igång om det fortfarande väntar (atomiskt, även mellan processer)"""
+        now = time.time()
+        with self.db.transaction():
+            self.db.execute_write(
+                "UPDATE import_jobs SET status = 'running', started_at = ?, heartbeat_at = ?, claimed_by = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, now, self.owner, job_id)
+            )
+            return self.db.execute("SELECT changes()")[0][0] == 1
+
+    def _run(self, job_id: str) -> None:
+        if not self._claim(job_id):
+            return
+        with self._active_lock:
+            self._active.add(job_id)
+        try:
+            self._run_claimed(job_id)
+        except Exception as e:
+            # Alla vägar ska sluta i succeeded eller failed - annars blockerar jobbet sin dedupe-nyckel
+            try:
+                self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            except sqlite3.Error as update_error:
+                # Utan heartbeat blir jobbet övergivet och köas om efter stale_after
+                print(f"⚠️ Kunde inte markera importjobb {job_id} som misslyckat: {update_error}")
+        finally:
+            with self._active_lock:
+                self._active.discard(job_id)
+
+    def _run_claimed(self, job_id: str) -> None:
+        job = self.get(job_id)
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            raise ValueError(f"Okänd jobbtyp: '{job['kind']}'")
+        last_report = 0.0
+
+        def report(progress: Dict[str, Any]) -> None:
+            # Glesa ut skrivningarna - progress kommer efter varje sparad omgång
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report >= self.progress_interval:
+                last_report = now
+                self._update(job_id, progress=json.dumps(progress, ensure_ascii=False), heartbeat_at=time.time())
+
+        result = handler(job["params"] or {}, report)
+        status = "failed" if "error" in result else "succeeded"
+        self._update(job_id, status=status, result=json.dumps(result, ensure_ascii=False),
+                     error=result.get("error"), finished_at=time.time())
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._stopped.set()
+        self._executor.shutdown(wait=wait)
+
+
+def openfoodfacts_import_handler(lunch_db: Any) -> JobHandler:
+    """Jobb som kör SchoolLunchDB.import_meals_from_openfoodfacts (eller import_search_terms
+    för flera termer) med progress från pipelinen"""
+    def handler(params: Dict[str, Any], report: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        if params.get("search_terms"):
+            return lunch_db.import_search_terms(
+                params["search_terms"],
+                limit=params.get("limit", 10),
+                pipeline_options={"on_progress": report}
+            )
+        return lunch_db.import_meals_from_openfoodfacts(
+            params.get("search_term", "pasta"),
+            limit=params.get("limit", 10),
+            pipeline_options={"on_progress": report}
+        )
+    return handler
@@ -0,0 +1,380 @@
+"""
+Strömmande importpipeline för Open Food Facts
+Tre steg i egna trådar kopplade med begränsade köer: hämtning (producent),
+konvertering/filtrering och en enda skrivare som sparar i omgångar. Nätverks-
+väntan och databasskrivningar överlappar, och fulla köer bromsar steget före
+(backpressure). Varje steg rapporterar genomströmning och ködjup, och hela
+körningen kan avbrytas mitt i.
+
+MultiTermProducts låter flera söktermer hämtas samtidigt in i samma pipeline,
+så att alla termer delar en dedupe-mängd och en skrivare.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from lunch_system_database import SchoolLunchDB
+
+_END = object()
+
+
+class StageStats:
+    """Räknare för ett steg i pipelinen"""
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.items_in: int = 0
+        self.items_out: int = 0
+        self.busy_seconds: float = 0.0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished or time.perf_counter()
+        elapsed = end - self.started if self.started else 0.0
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(self.items_in / elapsed, 1) if elapsed else 0.0,
+            "done": self.finished is not None
+        }
+
+
+class ImportPipeline:
+    """
+    Hämta -> konvertera/filtrera -> skriv, med begränsade köer mellan stegen
+
+    Args:
+        db: Databasen som måltiderna sparas i
+        products: Iterable med råa Open Food Facts-produkter (t.ex. FoodAPI.iter_search_products)
+        convert: Gör om en produkt till noll eller flera måltider (None = FoodAPI:s konvertering + receptfilter)
+        queue_size: Max antal poster i varje kö
+        batch_size: Måltider per skrivtransaktion
+        flush_interval: Sekunder skrivaren väntar innan en ofullständig omgång sparas
+        on_progress: Anropas med stats() efter varje sparad omgång
+        known_names: Delad dedupe-mängd med namn som redan finns; om satt frågas inte
+            meals-tabellen per omgång (mängden fylls på med det som sparas)
+        group_field: Måltidsfält att räkna found/added/skipped per (t.ex. "search_term")
+    """
+
+    def __init__(self, db: SchoolLunchDB, products: Iterable[Dict[str, Any]],
+                 convert: Optional[Callable[[Dict[str, Any]], List[Dict[str, Any]]]] = None,
+                 queue_size: int = 100, batch_size: int = 50, flush_interval: float = 0.2,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 known_names: Optional[Set[str]] = None, group_field: Optional[str] = None) -> None:
+        self.db: SchoolLunchDB = db
+        self.products: Iterable[Dict[str, Any]] = products
+        self.convert: Callable[[Dict[str, Any]], List[Dict[str, Any]]] = convert or _convert_product
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.on_progress: Optional[Callable[[Dict[str, Any]], None]] = on_progress
+        self.known_names: Optional[Set[str]] = known_names
+        self.group_field: Optional[str] = group_field
+        self.groups: Dict[str, Dict[str, int]] = {}
+        self.raw_queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.meal_queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._max_depth: Dict[str, int] = {"raw": 0, "meals": 0}
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, StageStats] = {name: StageStats(name) for name in ("fetch", "convert", "write")}
+        self.added: int = 0
+        self.skipped: int = 0
+        self.errors: List[str] = []
+
+    def cancel(self) -> None:
+        """Avbryt körningen; redan sparade omgångar ligger kvar"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Ögonblicksbild: per steg, ködjup och resultat hittills"""
+        with self._lock:
+            result = {
+                "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+                "queues": {
+                    "raw": {"depth": self.raw_queue.qsize(), "max_depth": self._max_depth["raw"]},
+                    "meals": {"depth": self.meal_queue.qsize(), "max_depth": self._max_depth["meals"]}
+                },
+                "added": self.added,
+                "skipped": self.skipped,
+                "cancelled": self.cancelled
+            }
+            if self.group_field:
+                result["groups"] = {name: dict(counts) for name, counts in self.groups.items()}
+            return result
+
+    def _put(self, target: "queue.Queue[Any]", name: str, item: Any) -> bool:
+        """Lägg i kö; blockerar när kön är full (backpressure) men ger upp om körningen avbryts"""
+        while not self.cancelled:
+            try:
+                target.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            with self._lock:
+                self._max_depth[name] = max(self._max_depth[name], target.qsize())
+            return True
+        return False
+
+    def _get(self, source: "queue.Queue[Any]", timeout: Optional[float] = None) -> Any:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.cancelled:
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                return source.get(timeout=wait)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _end(self, target: "queue.Queue[Any]") -> None:
+        # Slutmarkören måste fram även om kön är full; vid avbrott läser ingen den
+        while not self.cancelled:
+            try:
+                target.put(_END, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fetch(self) -> None:
+        stage = self.stages["fetch"]
+        stage.started = time.perf_counter()
+        try:
+            iterator = iter(self.products)
+            while not self.cancelled:
+                began = time.perf_counter()
+                product = next(iterator, _END)
+                stage.busy_seconds += time.perf_counter() - began
+                if product is _END:
+                    break
+                stage.items_in += 1
+                if not self._put(self.raw_queue, "raw", product):
+                    break
+                stage.items_out += 1
+        except Exception as e:
+            self.errors.append(f"Hämtning avbröts: {e}")
+        finally:
+            close = getattr(self.products, "close", None)
+            if close:
+                close()
+            stage.finished = time.perf_counter()
+            self._end(self.raw_queue)
+
+    def _convert(self) -> None:
+        stage = self.stages["convert"]
+        stage.started = time.perf_counter()
+        try:
+            while True:
+                product = self._get(self.raw_queue)
+                if product is _END:
+                    break
+                stage.items_in += 1
+                began = time.perf_counter()
+                try:
+                    meals = self.convert(product)
+                except Exception as e:
+                    # Poster kan vara produkter eller (sökterm, produkt)-par från MultiTermProducts
+                    raw = product[1] if isinstance(product, tuple) else product
+                    self.errors.append(f"Fel vid konvertering av {raw.get('code', 'okänd produkt')}: {e}")
+                    meals = []
+                stage.busy_seconds += time.perf_counter() - began
+                for meal in meals:
+                    if not self._put(self.meal_queue, "meals", meal):
+                        return
+                    stage.items_out += 1
+        finally:
+            stage.finished = time.perf_counter()
+            self._end(self.meal_queue)
+
+    def _write_batch(self, batch: List[Dict[str, Any]], seen: set) -> None:
+        stage = self.stages["write"]
+        began = time.perf_counter()
+        if self.known_names is None:
+            names = list({meal.get("name", "") for meal in batch})
+            placeholders = ",".join("?" * len(names))
+            existing = {row[0] for row in self.db.db.execute(
+                f"SELECT name FROM meals WHERE name IN ({placeholders})", names)}
+        else:
+            existing = set()
+
+        to_add = []
+        added_groups: List[Any] = []
+        # Namnen läggs i seen först när omgången är sparad - annars skulle en omgång som
+        # misslyckas göra att samma måltider hoppas över resten av körningen
+        batch_names: Set[str] = set()
+        for meal in batch:
+            name = meal.get("name", "")
+            if name in existing or name in seen or name in batch_names:
+                continue
+            batch_names.add(name)
+            added_groups.append(meal.get(self.group_field) if self.group_field else None)
+            meal_info = {
+                "name": name,
+                "description": meal.get("description", ""),
+                "price": meal.get("price", 0.0),
+                "category": meal.get("category", "Huvudrätt")
+            }
+            # Streckkod och ändringstid behövs för att katalogsynken ska kunna uppdatera måltiden,
+            # ingredienser och allergen-taggar för allergenmärkningen
+            for column in ("product_code", "source_last_modified", "ingredients", "allergens"):
+                if meal.get(column) is not None:
+                    meal_info[column] = meal[column]
+            to_add.append(meal_info)
+        try:
+            if to_add:
+                self.db.add_meals_bulk(to_add)
+            seen.update(batch_names)
+            with self._lock:
+                self.added += len(to_add)
+                self.skipped += len(batch) - len(to_add)
+                stage.items_out += len(to_add)
+                if self.group_field:
+                    self._count_groups(batch, added_groups)
+        except Exception as e:
+            self.errors.append(f"Fel vid sparande av {len(to_add)} måltider: {e}")
+        stage.busy_seconds += time.perf_counter() - began
+        if self.on_progress:
+            self.on_progress(self.stats())
+
+    def _count_groups(self, batch: List[Dict[str, Any]], added_groups: List[Any]) -> None:
+        # Anropas med self._lock hållet
+        for meal in batch:
+            counts = self.groups.setdefault(meal.get(self.group_field), {"found": 0, "added": 0, "skipped": 0})
+            counts["found"] += 1
+            counts["skipped"] += 1
+        for group in added_groups:
+            self.groups[group]["added"] += 1
+            self.groups[group]["skipped"] -= 1
+
+    def _write(self) -> None:
+        stage = self.stages["write"]
+        stage.started = time.perf_counter()
+        batch: List[Dict[str, Any]] = []
+        seen: set = self.known_names if self.known_names is not None else set()
+        try:
+            while True:
+                try:
+                    meal = self._get(self.meal_queue, timeout=self.flush_interval if batch else None)
+                except queue.Empty:
+                    # Inget nytt på en stund - spara det som finns så skrivningar överlappar hämtningen
+                    self._write_batch(batch, seen)
+                    batch = []
+                    continue
+                if meal is _END:
+                    break
+                stage.items_in += 1
+                batch.append(meal)
+                if len(batch) >= self.batch_size:
+                    self._write_batch(batch, seen)
+                    batch = []
+            if batch and not self.cancelled:
+                self._write_batch(batch, seen)
+        finally:
+            stage.finished = time.perf_counter()
+
+    def run(self) -> Dict[str, Any]:
+        """Kör pipelinen till slut (eller tills cancel()) och returnera resultatet"""
+        threads = [threading.Thread(target=target, name=f"import-{name}", daemon=True)
+                   for name, target in (("fetch", self._fetch), ("convert", self._convert), ("write", self._write))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result = self.stats()
+        result["total_found"] = self.stages["convert"].items_out
+        if self.errors:
+            result["errors"] = self.errors
+        return result
+
+
+class MultiTermProducts:
+    """
+    Produkter för flera söktermer, hämtade samtidigt, som (sökterm, produkt)-par
+
+    Varje term går igenom sina resultatsidor i en egen tråd (högst max_workers
+    samtidigt) och allt läggs i en gemensam begränsad kö, så en pipeline
+    kan läsa alla termer som en enda ström. Fel räknas per term i errors.
+    """
+
+    def __init__(self, api: Any, terms: List[str], page_size: int = 50, limit: Optional[int] = 10,
+                 deadline: Optional[float] = None, max_workers: int = 4, queue_size: int = 100) -> None:
+        self.api: Any = api
+        self.terms: List[str] = terms
+        self.page_size: int = max(1, min(page_size, limit)) if limit is not None else page_size
+        self.limit: Optional[int] = limit
+        self.deadline: Optional[float] = deadline
+        self.max_workers: int = max(1, min(max_workers, len(terms) or 1))
+        self.errors: Dict[str, str] = {}
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._stopped = threading.Event()
+
+    def _worker(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                try:
+                    term = self._pending.get_nowait()
+                except queue.Empty:
+                    return
+                products = self.api.iter_search_products(term, self.page_size, self.limit, self.deadline)
+                try:
+                    for product in products:
+                        if not self._offer((term, product)):
+                            return
+                except Exception as e:
+                    self.errors[term] = str(e)
+                finally:
+                    products.close()
+        finally:
+            self._offer(_END, force=True)
+
+    def _offer(self, item: Any, force: bool = False) -> bool:
+        while force or not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if force and self._stopped.is_set():
+                    return False
+        return False
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for term in self.terms:
+            self._pending.put(term)
+        workers = [threading.Thread(target=self._worker, name=f"import-term-{index}", daemon=True)
+                   for index in range(self.max_workers)]
+        for worker in workers:
+            worker.start()
+        running = len(workers)
+        while running:
+            item = self._queue.get()
+            if item is _END:
+                running -= 1
+                continue
+            yield item
+
+    def close(self) -> None:
+        """Stoppa hämtningen; trådarna avslutas efter pågående sida"""
+        self._stopped.set()
+
+
+def convert_tagged(item: Tuple[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Konvertera ett (sökterm, produkt)-par och märk måltiderna med söktermen"""
+    term, product = item
+    return [dict(meal, search_term=term) for meal in _convert_product(product)]
+
+
+def _convert_product(product: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """FoodAPI:s konvertering plus receptfiltret, för en produkt"""
+    from skolmaten_api import get_default_api, is_recipe_like
+
+    meals = get_default_api().convert_openfoodfacts_to_local({"products": [product]})
+    return [meal for meal in meals if not is_recipe_like(meal)]
@@ -1,10 +1,41 @@
+from allergen_tagging import DEFAULT_TAGGER, TAG_SOURCE_FIELDS
 from database_wrapper import SQLiteDB
 from typing import List, Dict, Optional, Any, Tuple
+import json
 import sqlite3
+import threading
+import time
+import uuid
+
+# Max antal namn i inloggningscachen innan den töms
+STUDENT_CACHE_SIZE = 10000
+
+
+def normalize_name(name: str) -> str:
+    """Lookup key for student names: case-folded (also å/ä/ö) with collapsed whitespace"""
+    return " ".join(name.split()).casefold()
+
 
 class SchoolLunchDB:
-    def __init__(self, db_path: str) -> None:
-        self.db: SQLiteDB = SQLiteDB(db_path)
+    # Changelog rows kept when no consumer is registered,
+    # and how often (in sequence numbers) writes trigger a prune
+    CHANGELOG_MAX_ROWS: int = 10000
+    CHANGELOG_PRUNE_EVERY: int = 500
+
+    def __init__(self, db_path: str, journal_mode: Optional[str] = None) -> None:
+        self.db: SQLiteDB = SQLiteDB(db_path, journal_mode)
+        # normalized name -> (id, name); only hits are cached so students added elsewhere are still found
+        self._student_cache: Dict[str, Tuple[int, str]] = {}
+        self._student_cache_lock = threading.Lock()
+        # In-memory catalog version; the boot id keeps versions from before a restart from matching
+        self.boot_id: str = uuid.uuid4().hex[:8]
+        self._catalog_counter: int = 0
+        self._catalog_modified_at: float = time.time()
+        self._catalog_lock = threading.Lock()
+        # Read-only connection whose PRAGMA data_version changes on every commit made by any
+        # other connection - other threads, admin_menu.py, the sync CLIs, other WSGI workers
+        self._version_conn: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
         self.initialize_database()
 
     def initialize_database(self) -> None:
@@ -18,6 +49,7 @@ class SchoolLunchDB:
                     class TEXT,
                     allergies TEXT,
                     external_account_id TEXT,
+                    name_normalized TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
@@ -31,10 +63,25 @@ class SchoolLunchDB:
                     category TEXT,
                     rating REAL DEFAULT 0.0,
                     rating_count INTEGER DEFAULT 0,
+                    product_code TEXT,
+                    source_last_modified INTEGER,
+                    ingredients TEXT,
+                    source_allergens TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
 
+            # When each imported product was last checked against upstream
+            self.db.execute_write("""
+                CREATE TABLE IF NOT EXISTS meal_sync_state (
+                    meal_id INTEGER PRIMARY KEY,
+                    last_checked_at REAL,
+                    last_status TEXT,
+                    error TEXT,
+                    FOREIGN KEY (meal_id) REFERENCES meals (id)
+                )
+            """)
+
             self.db.execute_write("""
                 CREATE TABLE IF NOT EXISTS meal_schedule (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,35 +99,432 @@ class SchoolLunchDB:
                     student_id INTEGER NOT NULL,
                     meal_id INTEGER NOT NULL,
                     date DATE NOT NULL,
+                    price REAL,
+                    external_transaction_id TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (student_id) REFERENCES students (id),
                     FOREIGN KEY (meal_id) REFERENCES meals (id)
                 )
             """)
 
+            # Append-only change feed for incremental consumers
+            self.db.execute_write("""
+                CREATE TABLE IF NOT EXISTS changelog (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    row_id INTEGER,
+                    operation TEXT NOT NULL,
+                    data TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            self.db.execute_write("""
+                CREATE TABLE IF NOT EXISTS changelog_consumers (
+                    name TEXT PRIMARY KEY,
+                    last_seq INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+        self._migrate_schema()
+
+    def _ensure_column(self, table: str, column: str, definition: str) -> bool:
+        """Add a column to an existing table; returns True if it was added"""
+        existing = [row[1] for row in self.db.execute(f"PRAGMA table_info({table})")]
+        if column in existing:
+            return False
+        self.db.execute_write(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+
+    def _migrate_schema(self) -> None:
+        """Bring databases created by older versions up to the current schema"""
+        with self.db.transaction():
+            if self._ensure_column("transactions", "price", "REAL"):
+                # Snapshot today's prices for history recorded before the column existed
+                self.db.execute_write("""
+                    UPDATE transactions
+                    SET price = (SELECT price FROM meals WHERE meals.id = transactions.meal_id)
+                    WHERE price IS NULL
+                """)
+
+            self.db.execute_write(
+                "CREATE INDEX IF NOT EXISTS idx_transactions_student_date ON transactions (student_id, date)"
+            )
+
+            self._ensure_column("transactions", "external_transaction_id", "TEXT")
+            self.db.execute_write(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_external_id "
+                "ON transactions (external_transaction_id)"
+            )
+
+            # Indexed login lookup; SQLite's LOWER() only folds ASCII and cannot use an index
+            self._ensure_column("students", "name_normalized", "TEXT")
+            self._backfill_normalized_names()
+            self.db.execute_write(
+                "CREATE INDEX IF NOT EXISTS idx_students_name_normalized ON students (name_normalized)"
+            )
+
+            # Upstream identity of imported products, for incremental catalog sync
+            self._ensure_column("meals", "product_code", "TEXT")
+            self._ensure_column("meals", "source_last_modified", "INTEGER")
+            self.db.execute_write("CREATE INDEX IF NOT EXISTS idx_meals_product_code ON meals (product_code)")
+
+            # Keyset pagination of the meal list (ORDER BY name, id), optionally per category
+            self.db.execute_write("CREATE INDEX IF NOT EXISTS idx_meals_name_id ON meals (name, id)")
+            self.db.execute_write("CREATE INDEX IF NOT EXISTS idx_meals_category_name_id ON meals (category, name, id)")
+
+            # Allergens detected at insert time, stored as tags so filters never re-parse text
+            tagged_before = bool(self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meal_allergens'"))
+            self.db.execute_write("""
+                CREATE TABLE IF NOT EXISTS meal_allergens (
+                    meal_id INTEGER NOT NULL,
+                    allergen TEXT NOT NULL,
+                    PRIMARY KEY (meal_id, allergen)
+                ) WITHOUT ROWID
+            """)
+            self.db.execute_write(
+                "CREATE INDEX IF NOT EXISTS idx_meal_allergens_allergen ON meal_allergens (allergen, meal_id)"
+            )
+            # Tag source text is stored so re-tagging (new lexicon, renamed meal) keeps
+            # allergens that came from ingredients or upstream tags
+            self._ensure_column("meals", "ingredients", "TEXT")
+            if self._ensure_column("meals", "source_allergens", "TEXT") and tagged_before:
+                # Older rows only have their tags - keep them as source text so a re-tag cannot drop them
+                legacy = self.db.execute(
+                    "SELECT meal_id, group_concat('en:' || allergen, ',') FROM meal_allergens GROUP BY meal_id")
+                self.db.execute_many("UPDATE meals SET source_allergens = ? WHERE id = ?",
+                                     [(tags, meal_id) for meal_id, tags in legacy])
+            if not tagged_before:
+                self.retag_allergens()
+
+    # --- CATALOG VERSION ---
+
+    @property
+    def catalog_version(self) -> str:
+        """Changes whenever a meal is added, updated, rated or re-tagged here, and after any commit elsewhere"""
+        data_version = self._check_data_version()
+        return f"{self.boot_id}-{self._catalog_counter}-{data_version}"
+
+    @property
+    def catalog_modified_at(self) -> float:
+        self._check_data_version()
+        return self._catalog_modified_at
+
+    def _check_data_version(self) -> int:
+        """PRAGMA data_version from the dedicated connection; a change counts as a catalog change"""
+        with self._catalog_lock:
+            try:
+                if self._version_conn is None:
+                    self._version_conn = sqlite3.connect(self.db.db_path, check_same_thread=False, timeout=1)
+                data_version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                # Låst just nu - behåll senaste värdet, nästa förfrågan frågar igen
+                return self._data_version or 0
+            if self._data_version is not None and data_version != self._data_version:
+                self._catalog_modified_at = time.time()
+            self._data_version = data_version
+            return data_version
+
+    def _catalog_changed(self) -> None:
+        # Bumped after commit, so a reader that sees the new version also sees the new rows
+        self.db.after_commit(self._bump_catalog_version)
+
+    def _bump_catalog_version(self) -> None:
+        with self._catalog_lock:
+            self._catalog_counter += 1
+            self._catalog_modified_at = time.time()
+
+    # --- CHANGE FEED ---
+
+    def _record_change(self, table_name: str, row_id: Optional[int], operation: str,
+                       data: Dict[str, Any]) -> None:
+        """Append a change; must be called inside the write's transaction"""
+        seq = self.db.execute_write(
+            "INSERT INTO changelog (table_name, row_id, operation, data) VALUES (?, ?, ?, ?)",
+            (table_name, row_id, operation, json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+        )
+        if seq and seq % self.CHANGELOG_PRUNE_EVERY == 0:
+            self.db.after_commit(self._prune_changelog_quietly)
+
+    def _prune_changelog_quietly(self) -> None:
+        # Körs efter writen är committad - en låst databas får inte få skrivningen att se misslyckad ut
+        try:
+            self.prune_changelog()
+        except sqlite3.Error as e:
+            print(f"⚠️ Kunde inte rensa changelog: {e}")
+
+    def changes_since(self, seq: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Changes with a sequence number greater than seq, oldest first"""
+        rows = self.db.execute(
+            "SELECT seq, table_name, row_id, operation, data, created_at FROM changelog "
+            "WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, limit)
+        )
+        changes = []
+        for row in rows:
+            change = dict(row)
+            change["data"] = json.loads(change["data"]) if change["data"] else {}
+            changes.append(change)
+        return changes
+
+    def latest_change_seq(self) -> int:
+        return self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM changelog")[0][0]
+
+    def oldest_change_seq(self) -> int:
+        """Oldest retained seq; a consumer whose last_seq is below this - 1 has missed changes and must resync"""
+        return self.db.execute("SELECT COALESCE(MIN(seq), 0) FROM changelog")[0][0]
+
+    def register_consumer(self, name: str, from_seq: int = 0) -> None:
+        """Register a change feed consumer; the changelog is kept until it has checkpointed"""
+        with self.db.transaction():
+            self.db.execute_write(
+                "INSERT OR IGNORE INTO changelog_consumers (name, last_seq) VALUES (?, ?)",
+                (name, from_seq)
+            )
+
+    def checkpoint_consumer(self, name: str, seq: int) -> int:
+        """Record that a consumer has processed everything up to seq, then prune"""
+        with self.db.transaction():
+            self.db.execute_write(
+                "UPDATE changelog_consumers SET last_seq = MAX(last_seq, ?), "
+                "updated_at = CURRENT_TIMESTAMP WHERE name = ?",
+                (seq, name)
+            )
+        return self.prune_changelog()
+
+    def unregister_consumer(self, name: str) -> int:
+        """Drop a consumer (e.g. one that has stalled) so it no longer holds the changelog back, then prune"""
+        with self.db.transaction():
+            self.db.execute_write("DELETE FROM changelog_consumers WHERE name = ?", (name,))
+        return self.prune_changelog()
+
+    def prune_changelog(self, max_rows: Optional[int] = None) -> int:
+        """
+        Delete changes that every registered consumer has checkpointed past, but
+        never one that a consumer still needs - a slow consumer must not lose
+        changes without knowing it. Without consumers all but the newest max_rows
+        (CHANGELOG_MAX_ROWS) changes are deleted. Unregister a consumer that has
+        stalled for good to let the changelog shrink again
+        """
+        max_rows = self.CHANGELOG_MAX_ROWS if max_rows is None else max_rows
+        with self.db.transaction():
+            row = self.db.execute("SELECT COUNT(*), MIN(last_seq) FROM changelog_consumers")[0]
+            consumer_count, consumed_seq = row[0], row[1]
+            safe_seq = consumed_seq if consumer_count else self.latest_change_seq() - max_rows
+            if safe_seq <= 0:
+                return 0
+            self.db.execute_write("DELETE FROM changelog WHERE seq <= ?", (safe_seq,))
+            return self.db.execute("SELECT changes()")[0][0]
+
     # --- BASIC OPERATIONS ---
 
     def add_student(self, student_info: Dict[str, Any]) -> Optional[int]:
-        cols, vals = zip(*student_info.items())
+        row = dict(student_info, name_normalized=normalize_name(student_info.get("name") or ""))
+        cols, vals = zip(*row.items())
         sql = f"INSERT INTO students ({','.join(cols)}) VALUES ({','.join(['?']*len(vals))})"
         with self.db.transaction():
-            return self.db.execute_write(sql, vals)
+            student_id = self.db.execute_write(sql, vals)
+            self._record_change("students", student_id, "insert", student_info)
+            self.db.after_commit(self._clear_student_cache)
+            return student_id
 
-    def add_meal(self, meal_info: Dict[str, Any]) -> Optional[int]:
-        cols, vals = zip(*meal_info.items())
+    def find_student_by_name(self, name: str) -> Optional[Tuple[int, str]]:
+        """
+        Case- and whitespace-insensitive login lookup
+
+        Returns:
+            (id, name as stored) or None; the oldest student wins if names collide
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        cached = self._student_cache.get(key)
+        if cached is not None:
+            return cached
+        rows = self._lookup_normalized_name(key)
+        if not rows and self._backfill_normalized_names():
+            # Elever som lagts in utan add_student (exempelskript, direkt SQL, en annan process)
+            rows = self._lookup_normalized_name(key)
+        if not rows:
+            return None
+        student = (rows[0][0], rows[0][1])
+        with self._student_cache_lock:
+            if len(self._student_cache) >= STUDENT_CACHE_SIZE:
+                self._student_cache.clear()
+            self._student_cache[key] = student
+        return student
+
+    def _lookup_normalized_name(self, key: str) -> List[sqlite3.Row]:
+        return self.db.execute(
+            "SELECT id, name FROM students WHERE name_normalized = ? ORDER BY id LIMIT 1", (key,))
+
+    def _backfill_normalized_names(self) -> int:
+        """Fill name_normalized for students inserted without it; returns the number of rows filled"""
+        # Uses the name_normalized index, so a miss costs one index probe when nothing is missing
+        missing = self.db.execute("SELECT id, name FROM students WHERE name_normalized IS NULL")
+        if not missing:
+            return 0
+        with self.db.transaction():
+            self.db.execute_many("UPDATE students SET name_normalized = ? WHERE id = ? AND name_normalized IS NULL",
+                                 [(normalize_name(name or ""), student_id) for student_id, name in missing])
+        return len(missing)
+
+    def _clear_student_cache(self) -> None:
+        with self._student_cache_lock:
+            self._student_cache.clear()
+
+    @staticmethod
+    def _meal_columns(meal_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Map meal input to columns; upstream allergen tags are stored as source_allergens text"""
+        row = {key: value for key, value in meal_info.items() if key != "allergens"}
+        for key, column in (("ingredients", "ingredients"), ("allergens", "source_allergens")):
+            if isinstance(meal_info.get(key), (list, tuple)):
+                row[column] = ", ".join(str(item) for item in meal_info[key])
+            elif key in meal_info:
+                row[column] = meal_info[key]
+        return row
+
+    def _insert_meal(self, meal_info: Dict[str, Any]) -> Optional[int]:
+        """Insert one meal and its allergen tags; must be called inside a transaction"""
+        row = self._meal_columns(meal_info)
+        cols, vals = zip(*row.items())
         sql = f"INSERT INTO meals ({','.join(cols)}) VALUES ({','.join(['?']*len(vals))})"
+        meal_id = self.db.execute_write(sql, vals)
+        self._set_allergens(meal_id, DEFAULT_TAGGER.tag_meal(meal_info))
+        self._record_change("meals", meal_id, "insert", row)
+        self._catalog_changed()
+        return meal_id
+
+    def _set_allergens(self, meal_id: Optional[int], allergens: List[str]) -> None:
+        self.db.execute_write("DELETE FROM meal_allergens WHERE meal_id = ?", (meal_id,))
+        if allergens:
+            self.db.execute_many("INSERT INTO meal_allergens (meal_id, allergen) VALUES (?, ?)",
+                                 [(meal_id, allergen) for allergen in allergens])
+
+    def add_meal(self, meal_info: Dict[str, Any]) -> Optional[int]:
+        with self.db.transaction():
+            return self._insert_meal(meal_info)
+
+    def add_meals_bulk(self, meals: List[Dict[str, Any]]) -> List[int]:
+        """Insert many meals in one transaction (one commit instead of one per meal)"""
         with self.db.transaction():
-            return self.db.execute_write(sql, vals)
+            return [self._insert_meal(meal_info) for meal_info in meals]
+
+    def update_meal(self, meal_id: int, changes: Dict[str, Any]) -> bool:
+        """Update only the given columns of a meal; returns True if the row exists"""
+        columns = self._meal_columns(changes)
+        if not columns:
+            return False
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self.db.transaction():
+            self.db.execute_write(f"UPDATE meals SET {assignments} WHERE id = ?", (*columns.values(), meal_id))
+            if not self.db.execute("SELECT changes()")[0][0]:
+                return False
+            if any(field in changes for field in TAG_SOURCE_FIELDS):
+                # Tag from the stored row, so a new name does not drop tags from ingredients
+                current = self.db.execute(
+                    "SELECT name, description, ingredients, source_allergens FROM meals WHERE id = ?", (meal_id,))[0]
+                self._set_allergens(meal_id, DEFAULT_TAGGER.tag(*current))
+            self._record_change("meals", meal_id, "update", columns)
+            self._catalog_changed()
+            return True
+
+    def retag_allergens(self) -> Dict[str, int]:
+        """Tag every meal again from its stored source text (after a lexicon change)"""
+        with self.db.transaction():
+            self.db.execute_write("DELETE FROM meal_allergens")
+            rows = [(row[0], allergen)
+                    for row in self.db.execute(
+                        "SELECT id, name, description, ingredients, source_allergens FROM meals")
+                    for allergen in DEFAULT_TAGGER.tag(*row[1:])]
+            if rows:
+                self.db.execute_many("INSERT INTO meal_allergens (meal_id, allergen) VALUES (?, ?)", rows)
+            self._catalog_changed()
+        meals = self.db.execute("SELECT COUNT(*) FROM meals")[0][0]
+        return {"meals": meals, "tags": len(rows)}
 
     def schedule_meal(self, meal_id: int, date: str, quantity: int = 0) -> Optional[int]:
         sql = "INSERT INTO meal_schedule (meal_id, date, available_quantity) VALUES (?, ?, ?)"
         with self.db.transaction():
-            return self.db.execute_write(sql, (meal_id, date, quantity))
+            schedule_id = self.db.execute_write(sql, (meal_id, date, quantity))
+            self._record_change("meal_schedule", schedule_id, "insert",
+                                {"meal_id": meal_id, "date": date, "available_quantity": quantity})
+            return schedule_id
 
-    def record_transaction(self, student_id: int, meal_id: int, date: str) -> Optional[int]:
-        sql = "INSERT INTO transactions (student_id, meal_id, date) VALUES (?, ?, ?)"
+    def record_transaction(self, student_id: int, meal_id: int, date: str,
+                           external_transaction_id: Optional[str] = None) -> Optional[int]:
+        """Record a purchase with the meal's price at order time"""
+        sql = """INSERT INTO transactions (student_id, meal_id, date, price, external_transaction_id)
+                 VALUES (?, ?, ?, ?, ?)"""
         with self.db.transaction():
-            return self.db.execute_write(sql, (student_id, meal_id, date))
+            meal = self.db.execute("SELECT price FROM meals WHERE id = ?", (meal_id,))
+            price = meal[0][0] if meal else None
+            transaction_id = self.db.execute_write(sql, (student_id, meal_id, date, price, external_transaction_id))
+            self._record_change("transactions", transaction_id, "insert",
+                                {"student_id": student_id, "meal_id": meal_id, "date": date, "price": price,
+                                 "external_transaction_id": external_transaction_id})
+            return transaction_id
+
+    def get_transaction_by_external_id(self, external_transaction_id: str) -> Optional[sqlite3.Row]:
+        rows = self.db.execute(
+            "SELECT * FROM transactions WHERE external_transaction_id = ?",
+            (external_transaction_id,)
+        )
+        return rows[0] if rows else None
+
+    def record_transaction_once(self, student_id: int, meal_id: int, date: str,
+                                external_transaction_id: str) -> Tuple[sqlite3.Row, bool]:
+        """
+        Record a purchase at most once per idempotency key.
+
+        Returns the transaction row and True if it was a replay of an earlier call.
+        """
+        existing = self.get_transaction_by_external_id(external_transaction_id)
+        if existing:
+            return existing, True
+        try:
+            self.record_transaction(student_id, meal_id, date, external_transaction_id)
+        except sqlite3.IntegrityError:
+            # A concurrent request with the same key won the insert
+            return self.get_transaction_by_external_id(external_transaction_id), True
+        return self.get_transaction_by_external_id(external_transaction_id), False
+
+    def record_transactions_bulk(self, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Record many purchases in one transaction (one commit for the whole batch)
+
+        Args:
+            orders: Dicts with student_id, meal_id, date and optional external_transaction_id
+
+        Returns:
+            One dict per order, in order: transaction_id, student_id, meal_id and replayed.
+            An order whose key is already stored, or repeated earlier in the batch, gets
+            the earlier transaction with replayed True.
+        """
+        keys = list({order["external_transaction_id"] for order in orders if order.get("external_transaction_id")})
+        results = []
+        with self.db.transaction():
+            known: Dict[str, Dict[str, Any]] = {}
+            if keys:
+                rows = self.db.execute(
+                    "SELECT id, student_id, meal_id, external_transaction_id FROM transactions "
+                    f"WHERE external_transaction_id IN ({','.join('?' * len(keys))})", tuple(keys))
+                known = {row["external_transaction_id"]: {"transaction_id": row["id"], "student_id": row["student_id"],
+                                                          "meal_id": row["meal_id"]} for row in rows}
+            for order in orders:
+                key = order.get("external_transaction_id")
+                if key and key in known:
+                    results.append(dict(known[key], replayed=True))
+                    continue
+                transaction_id = self.record_transaction(order["student_id"], order["meal_id"], order["date"], key)
+                result = {"transaction_id": transaction_id, "student_id": order["student_id"],
+                          "meal_id": order["meal_id"]}
+                if key:
+                    known[key] = result
+                results.append(dict(result, replayed=False))
+        return results
 
     # --- BASIC QUERIES ---
 
@@ -109,6 +553,120 @@ class SchoolLunchDB:
                  ORDER BY t.date DESC"""
         return self.db.execute(sql, (student_id,))
 
+    def get_meals_page(self, limit: Optional[int] = 50, after: Optional[Tuple[str, int]] = None,
+                       category: Optional[str] = None, min_price: Optional[float] = None,
+                       max_price: Optional[float] = None, min_rating: Optional[float] = None,
+                       exclude_allergens: Optional[List[str]] = None) -> List[sqlite3.Row]:
+        """
+        Meals ordered by (name, id) with keyset pagination and filters
+
+        Args:
+            limit: Max rows (None = all)
+            after: (name, id) of the last meal on the previous page
+            category: Only this category
+            min_price / max_price: Price range (inclusive)
+            min_rating: Lowest average rating
+            exclude_allergens: Skip meals tagged with any of these allergens
+        """
+        where: List[str] = []
+        params: List[Any] = []
+        if after is not None:
+            where.append("(name, id) > (?, ?)")
+            params.extend(after)
+        if category:
+            where.append("category = ?")
+            params.append(category)
+        if min_price is not None:
+            where.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            where.append("price <= ?")
+            params.append(max_price)
+        if min_rating is not None:
+            where.append("rating >= ?")
+            params.append(min_rating)
+        if exclude_allergens:
+            where.append(f"id NOT IN (SELECT meal_id FROM meal_allergens WHERE allergen IN "
+                         f"({','.join('?' * len(exclude_allergens))}))")
+            params.extend(exclude_allergens)
+        sql = f"""SELECT * FROM meals
+                  {'WHERE ' + ' AND '.join(where) if where else ''}
+                  ORDER BY name, id
+                  LIMIT ?"""
+        return self.db.execute(sql, (*params, -1 if limit is None else limit))
+
+    def get_allergens_for(self, meal_ids: List[int]) -> Dict[int, List[str]]:
+        """Allergen tags for the given meals only (e.g. one page)"""
+        allergens: Dict[int, List[str]] = {}
+        if not meal_ids:
+            return allergens
+        rows = self.db.execute(
+            f"SELECT meal_id, allergen FROM meal_allergens WHERE meal_id IN ({','.join('?' * len(meal_ids))}) "
+            "ORDER BY meal_id, allergen", tuple(meal_ids))
+        for meal_id, allergen in rows:
+            allergens.setdefault(meal_id, []).append(allergen)
+        return allergens
+
+    def get_meal_allergens(self, meal_id: int) -> List[str]:
+        rows = self.db.execute("SELECT allergen FROM meal_allergens WHERE meal_id = ? ORDER BY allergen",
+                               (meal_id,))
+        return [row[0] for row in rows]
+
+    def get_allergens_by_meal(self) -> Dict[int, List[str]]:
+        """Allergen tags for every tagged meal, in one query"""
+        allergens: Dict[int, List[str]] = {}
+        for meal_id, allergen in self.db.execute(
+                "SELECT meal_id, allergen FROM meal_allergens ORDER BY meal_id, allergen"):
+            allergens.setdefault(meal_id, []).append(allergen)
+        return allergens
+
+    def get_meals_with_allergen(self, allergen: str) -> List[sqlite3.Row]:
+        sql = """SELECT m.* FROM meal_allergens a
+                 JOIN meals m ON m.id = a.meal_id
+                 WHERE a.allergen = ?
+                 ORDER BY m.name"""
+        return self.db.execute(sql, (allergen,))
+
+    def get_meals_free_from(self, allergens: List[str]) -> List[sqlite3.Row]:
+        """Meals tagged with none of the given allergens"""
+        if not allergens:
+            return self.get_all_meals()
+        placeholders = ",".join("?" * len(allergens))
+        sql = f"""SELECT * FROM meals
+                  WHERE id NOT IN (SELECT meal_id FROM meal_allergens WHERE allergen IN ({placeholders}))
+                  ORDER BY name"""
+        return self.db.execute(sql, tuple(allergens))
+
+    def search_meals(self, search_term: str, limit: int = 50) -> List[sqlite3.Row]:
+        pattern = f"%{search_term}%"
+        sql = """SELECT * FROM meals
+                 WHERE name LIKE ? OR description LIKE ? OR category LIKE ?
+                 ORDER BY name
+                 LIMIT ?"""
+        return self.db.execute(sql, (pattern, pattern, pattern, limit))
+
+    # --- REPORTS ---
+
+    def get_report_totals(self) -> Dict[str, Any]:
+        """Totals for students, meals, transactions and revenue"""
+        row = self.db.execute("""
+            SELECT (SELECT COUNT(*) FROM students) AS students,
+                   (SELECT COUNT(*) FROM meals) AS meals,
+                   (SELECT COUNT(*) FROM transactions) AS transactions,
+                   (SELECT COALESCE(SUM(price), 0) FROM transactions) AS revenue
+        """)[0]
+        return dict(row)
+
+    def get_meal_popularity(self, limit: Optional[int] = 10) -> List[Dict[str, Any]]:
+        """Most ordered meals, grouped by name (limit=None returns all)"""
+        sql = """SELECT m.name, m.category, COUNT(t.id) AS orders
+                 FROM transactions t
+                 JOIN meals m ON t.meal_id = m.id
+                 GROUP BY m.name, m.category
+                 ORDER BY orders DESC, m.name
+                 LIMIT ?"""
+        return [dict(row) for row in self.db.execute(sql, (limit if limit is not None else -1,))]
+
     def rate_meal(self, meal_id: int, rating: float) -> bool:
         """Add a rating to a meal (1-5 stars) and update average"""
         # Get current rating info
@@ -127,14 +685,44 @@ class SchoolLunchDB:
         sql = "UPDATE meals SET rating = ?, rating_count = ? WHERE id = ?"
         with self.db.transaction():
             self.db.execute_write(sql, (new_average, new_count, meal_id))
+            self._record_change("meals", meal_id, "rate",
+                                {"rating": new_average, "rating_count": new_count})
+            self._catalog_changed()
         return True
 
+    def rate_meals_bulk(self, ratings: Dict[int, Tuple[float, int]]) -> int:
+        """
+        Apply many ratings in one transaction, one UPDATE per meal
+
+        Args:
+            ratings: meal_id -> (sum of new ratings, number of new ratings)
+
+        Returns:
+            Number of meals that existed and were updated
+        """
+        if not ratings:
+            return 0
+        with self.db.transaction():
+            # The new average is computed in SQL - no read-modify-write per rating
+            self.db.execute_many("""
+                UPDATE meals
+                SET rating = (COALESCE(rating, 0) * COALESCE(rating_count, 0) + ?) / (COALESCE(rating_count, 0) + ?),
+                    rating_count = COALESCE(rating_count, 0) + ?
+                WHERE id = ?
+            """, [(total, count, count, meal_id) for meal_id, (total, count) in ratings.items()])
+            meal_ids = list(ratings)
+            rows = self.db.execute(
+                f"SELECT id, rating, rating_count FROM meals WHERE id IN ({','.join('?' * len(meal_ids))})",
+                tuple(meal_ids))
+            for meal_id, rating, rating_count in rows:
+                self._record_change("meals", meal_id, "rate", {"rating": rating, "rating_count": rating_count})
+            if rows:
+                self._catalog_changed()
+        return len(rows)
 
 
     def import_menu_from_json(self, json_file_path: str = "menu.json") -> Dict[str, Any]:
         """Import meals from JSON file (replaces api_fetch.py functionality)"""
-        import json
-        
         try:
             with open(json_file_path, "r", encoding="utf-8") as file:
                 data = json.load(file)
@@ -168,78 +756,107 @@ class SchoolLunchDB:
                     "category": meal_data.get("type", "main")
                 }
                 
-                cols, vals = zip(*meal.items())
-                sql = f"INSERT INTO meals ({','.join(cols)}) VALUES ({','.join(['?']*len(vals))})"
-                with self.db.transaction():
-                    self.db.execute_write(sql, vals)
+                self.add_meal(meal)
                 added += 1
 
         return {"added": added, "skipped": skipped}
 
-    def import_meals_from_openfoodfacts(self, search_term: str = "pasta") -> Dict[str, Any]:
+    def import_meals_from_openfoodfacts(self, search_term: str = "pasta", limit: Optional[int] = 10,
+                                        page_size: int = 50, deadline: Optional[float] = None,
+                                        pipeline_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Hämta och importera livsmedel från Open Food Facts API (INGA RECEPT)
         
+        Körs som en strömmande pipeline (import_pipeline.py): hämtning,
+        konvertering/receptfilter och batchade skrivningar överlappar.
+        
         Args:
             search_term: Sökterm för livsmedel (t.ex. "pasta", "chicken", "vegetables")
+            limit: Max antal produkter (None = alla resultatsidor)
+            page_size: Produkter per resultatsida
+            deadline: Max antal sekunder för hämtningen
+            pipeline_options: Extra argument till ImportPipeline (t.ex. batch_size, on_progress)
             
         Returns:
-            Dict med resultat av import (added, skipped, errors)
+            Dict med resultat av import (added, skipped, errors, stages)
         """
         try:
             # Import här för att undvika cirkulära imports
-            from skolmaten_api import search_food_ingredients
+            from import_pipeline import ImportPipeline
+            from skolmaten_api import get_default_api
             
             # Hämta ENDAST livsmedel från Open Food Facts (inga recept)
-            food_products = search_food_ingredients(search_term)
+            if limit is not None:
+                page_size = max(1, min(page_size, limit))
+            products = get_default_api().iter_search_products(search_term, page_size, limit, deadline)
+            pipeline = ImportPipeline(self, products, **(pipeline_options or {}))
+            result = pipeline.run()
             
-            # Använd endast food products, INGA recept
-            all_meals = food_products
-            
-            if not all_meals:
+            if not result["total_found"] and not result["cancelled"]:
+                # Ett hämtfel ska synas som felet, inte som en tom sökning
+                if result.get("errors"):
+                    return {"error": f"Importen av '{search_term}' misslyckades: {'; '.join(result['errors'])}",
+                            "errors": result["errors"], "added": 0, "skipped": 0}
                 return {"error": f"Inga måltider hittades för '{search_term}'", "added": 0, "skipped": 0}
             
-            # Importera måltiderna till databasen
-            added = 0
-            skipped = 0
-            errors = []
+            result["search_term"] = search_term
+            result["sources"] = "Open Food Facts"
+            return result
             
-            for meal_data in all_meals:
-                try:
-                    # Kontrollera om måltiden redan finns
-                    existing = self.db.execute(
-                        "SELECT id FROM meals WHERE name = ?",
-                        (meal_data.get("name", ""),)
-                    )
-                    
-                    if existing:
-                        skipped += 1
-                    else:
-                        # Lägg till måltiden
-                        meal_info = {
-                            "name": meal_data.get("name", ""),
-                            "description": meal_data.get("description", ""),
-                            "price": meal_data.get("price", 0.0),
-                            "category": meal_data.get("category", "Huvudrätt")
-                        }
-                        
-                        self.add_meal(meal_info)
-                        added += 1
-                        
-                except Exception as e:
-                    errors.append(f"Fel vid import av {meal_data.get('name', 'okänd måltid')}: {str(e)}")
+        except ImportError:
+            return {"error": "Food API-moduler kunde inte importeras", "added": 0, "skipped": 0}
+        except Exception as e:
+            return {"error": f"Oväntat fel: {str(e)}", "added": 0, "skipped": 0}
+
+    def import_search_terms(self, terms: List[str], limit: Optional[int] = 10, page_size: int = 50,
+                            max_workers: int = 4, deadline: Optional[float] = None,
+                            pipeline_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Importera livsmedel för flera söktermer samtidigt från Open Food Facts
+        
+        Termerna hämtas parallellt men delar en dedupe-mängd (läst från
+        meals-tabellen en gång) och en enda batchad skrivare.
+        
+        Args:
+            terms: Söktermer (dubbletter och tomma termer ignoreras)
+            limit: Max antal produkter per term (None = alla resultatsidor)
+            page_size: Produkter per resultatsida
+            max_workers: Max antal termer som hämtas samtidigt
+            deadline: Max antal sekunder för hämtningen
+            pipeline_options: Extra argument till ImportPipeline (t.ex. batch_size, on_progress)
             
-            result = {
-                "added": added,
-                "skipped": skipped,
-                "search_term": search_term,
-                "total_found": len(all_meals),
-                "sources": "Open Food Facts + TheMealDB"
-            }
+        Returns:
+            Dict med totalt added/skipped/total_found samt per-term-statistik under "terms"
+        """
+        unique_terms = list(dict.fromkeys(term.strip() for term in terms if term and term.strip()))
+        if not unique_terms:
+            return {"error": "Inga söktermer angivna", "added": 0, "skipped": 0}
+        try:
+            from import_pipeline import ImportPipeline, MultiTermProducts, convert_tagged
+            from skolmaten_api import get_default_api
             
-            if errors:
-                result["errors"] = errors
+            products = MultiTermProducts(get_default_api(), unique_terms, page_size, limit, deadline, max_workers)
+            known_names = {row[0] for row in self.db.execute("SELECT name FROM meals")}
+            pipeline = ImportPipeline(self, products, convert=convert_tagged, known_names=known_names,
+                                      group_field="search_term", **(pipeline_options or {}))
+            result = pipeline.run()
             
+            per_term = result.pop("groups")
+            result["terms"] = {}
+            for term in unique_terms:
+                stats = per_term.get(term, {"found": 0, "added": 0, "skipped": 0})
+                if term in products.errors:
+                    stats["error"] = products.errors[term]
+                result["terms"][term] = stats
+            if products.errors:
+                result.setdefault("errors", []).extend(
+                    f"{term}: {error}" for term, error in products.errors.items())
+            if not result["total_found"] and not result["cancelled"]:
+                if result.get("errors"):
+                    result["error"] = f"Importen misslyckades: {'; '.join(result['errors'])}"
+                else:
+                    result["error"] = f"Inga måltider hittades för {', '.join(unique_terms)}"
+            result["sources"] = "Open Food Facts"
             return result
             
         except ImportError:
@@ -0,0 +1,186 @@
+"""
+Månadsfakturering
+Strömmar månadens transaktioner i (student_id, date)-ordning och skriver en
+faktura per elev som CSV eller JSON Lines. Priset läses från transaktionen
+(sparat vid beställning), så ingen join mot meals behövs för beloppen.
+Arbetet kan delas upp på flera processer efter intervall av elev-ID.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import date
+from itertools import groupby
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database_wrapper import SQLiteDB
+
+CSV_FIELDS = ["student_id", "student_name", "month", "orders", "total"]
+
+
+def month_bounds(month: str) -> Tuple[str, str]:
+    """'2025-01' -> ('2025-01-01', '2025-02-01')"""
+    year, month_number = (int(part) for part in month.split("-"))
+    start = date(year, month_number, 1)
+    end = date(year + 1, 1, 1) if month_number == 12 else date(year, month_number + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def iter_invoices(db: SQLiteDB, month: str, first_student_id: Optional[int] = None,
+                  last_student_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Generera en faktura per elev för en månad
+
+    Raderna läses i omgångar i indexordning (student_id, date), så minnet
+    begränsas till en elevs beställningar åt gången.
+    """
+    start, end = month_bounds(month)
+    sql = """SELECT t.student_id, s.name AS student_name, t.date, t.meal_id,
+                    m.name AS meal_name, t.price
+             FROM transactions t
+             LEFT JOIN students s ON s.id = t.student_id
+             LEFT JOIN meals m ON m.id = t.meal_id
+             WHERE t.student_id BETWEEN ? AND ?
+               AND t.date >= ? AND t.date < ?
+             ORDER BY t.student_id, t.date"""
+    params = [
+        first_student_id if first_student_id is not None else -2**63,
+        last_student_id if last_student_id is not None else 2**63 - 1,
+        start, end
+    ]
+
+    rows = db.iterate(sql, params)
+    for student_id, student_rows in groupby(rows, key=lambda row: row["student_id"]):
+        lines = []
+        student_name = None
+        for row in student_rows:
+            student_name = row["student_name"]
+            lines.append({
+                "date": row["date"],
+                "meal_id": row["meal_id"],
+                "meal_name": row["meal_name"],
+                "price": row["price"] or 0.0
+            })
+        yield {
+            "student_id": student_id,
+            "student_name": student_name,
+            "month": month,
+            "orders": len(lines),
+            "total": round(sum(line["price"] for line in lines), 2),
+            "lines": lines
+        }
+
+
+def write_invoices(invoices: Iterator[Dict[str, Any]], output_path: str, output_format: str = "csv") -> Dict[str, Any]:
+    """Skriv fakturor till fil i takt med att de genereras"""
+    count = 0
+    total = 0.0
+    with open(output_path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=CSV_FIELDS, extrasaction="ignore") if output_format == "csv" else None
+        if writer:
+            writer.writeheader()
+        for invoice in invoices:
+            if writer:
+                writer.writerow(invoice)
+            else:
+                file.write(json.dumps(invoice, ensure_ascii=False) + "\n")
+            count += 1
+            total += invoice["total"]
+    return {"path": output_path, "invoices": count, "total": round(total, 2)}
+
+
+def _bill_range(job: Tuple[str, str, Optional[int], Optional[int], str, str]) -> Dict[str, Any]:
+    db_path, month, first_id, last_id, output_path, output_format = job
+    db = SQLiteDB(db_path)
+    try:
+        return write_invoices(iter_invoices(db, month, first_id, last_id), output_path, output_format)
+    finally:
+        db.close()
+
+
+def split_student_ranges(db_path: str, parts: int) -> List[Tuple[int, int]]:
+    """Dela upp elev-ID:n i ungefär lika stora intervall"""
+    db = SQLiteDB(db_path)
+    try:
+        low, high = db.execute("SELECT MIN(student_id), MAX(student_id) FROM transactions")[0]
+    finally:
+        db.close()
+    if low is None:
+        return []
+    parts = max(1, min(parts, high - low + 1))
+    step = (high - low + 1) // parts
+    ranges = []
+    for index in range(parts):
+        first = low + index * step
+        last = high if index == parts - 1 else first + step - 1
+        ranges.append((first, last))
+    return ranges
+
+
+def run_billing(db_path: str, month: str, output_dir: str = "invoices",
+                output_format: str = "csv", workers: int = 1) -> Dict[str, Any]:
+    """
+    Kör månadsfaktureringen
+
+    Args:
+        db_path: Databasfil
+        month: Månad som 'YYYY-MM'
+        output_dir: Katalog för fakturafilerna
+        output_format: 'csv' eller 'json' (JSON Lines med fakturarader)
+        workers: Antal processer; varje process tar ett intervall av elev-ID
+
+    Returns:
+        Dict med filer, antal fakturor och totalsumma
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    extension = "csv" if output_format == "csv" else "jsonl"
+    ranges = split_student_ranges(db_path, workers)
+    if not ranges:
+        ranges = [(None, None)]
+
+    jobs = []
+    for index, (first_id, last_id) in enumerate(ranges):
+        suffix = f"-part{index + 1}" if len(ranges) > 1 else ""
+        output_path = os.path.join(output_dir, f"invoices-{month}{suffix}.{extension}")
+        jobs.append((db_path, month, first_id, last_id, output_path, output_format))
+
+    if len(jobs) == 1:
+        parts = [_bill_range(jobs[0])]
+    else:
+        with Pool(processes=len(jobs)) as pool:
+            parts = pool.map(_bill_range, jobs)
+
+    return {
+        "month": month,
+        "files": [part["path"] for part in parts],
+        "invoices": sum(part["invoices"] for part in parts),
+        "total": round(sum(part["total"] for part in parts), 2)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Monthly billing run for the school lunch system')
+    parser.add_argument('--month', '-m', required=True, help='Billing month (YYYY-MM)')
+    parser.add_argument('--database', '-d', default='test.db', help='Database file path')
+    parser.add_argument('--output-dir', '-o', default='invoices', help='Directory for invoice files')
+    parser.add_argument('--format', '-f', choices=['csv', 'json'], default='csv', help='Invoice file format')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='Number of worker processes')
+
+    args = parser.parse_args()
+
+    try:
+        result = run_billing(args.database, args.month, args.output_dir, args.format, args.workers)
+    except Exception as e:
+        print(f"❌ Faktureringen misslyckades: {e}")
+        sys.exit(1)
+
+    print(f"✅ {result['invoices']} fakturor för {result['month']}, totalt {result['total']:.2f} kr")
+    for path in result["files"]:
+        print(f"   📄 {path}")
+
+
+if __name__ == "__main__":
+    main()
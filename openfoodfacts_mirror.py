@@ -0,0 +1,272 @@
+"""
+Lokal spegel av Open Food Facts
+Läser in Open Food Facts bulk-export (JSONL eller CSV, gärna .gz) rad för
+rad till en SQLite-databas med FTS-index. FoodAPI kan sedan besvara
+sökningar och streckkodsuppslag från spegeln på millisekunder och går
+bara ut på nätet för det som saknas.
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database_wrapper import SQLiteDB
+
+DEFAULT_MIRROR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "openfoodfacts_mirror.db")
+
+# Fälten FoodAPI använder - allt annat i exporten kastas vid inläsningen
+TEXT_FIELDS = ["product_name", "brands", "categories", "ingredients_text", "allergens", "nutrition_grades"]
+NUMBER_FIELDS = ["energy_100g", "sugars_100g", "fat_100g", "proteins_100g", "salt_100g"]
+PRODUCT_FIELDS = TEXT_FIELDS + NUMBER_FIELDS
+
+
+def _open_dump(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_text(value: Any) -> Optional[str]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def _slim_record(record: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    """Plocka ut de fält spegeln sparar; None för poster utan streckkod"""
+    code = _to_text(record.get("code"))
+    if not code:
+        return None
+    # JSONL-exporten har näringsvärden under "nutriments", CSV har dem som kolumner
+    nutriments = record.get("nutriments") or {}
+    numbers = [_to_float(record.get(field, nutriments.get(field))) for field in NUMBER_FIELDS]
+    texts = [_to_text(record.get(field)) for field in TEXT_FIELDS]
+    last_modified = _to_float(record.get("last_modified_t"))
+    return (code.strip(), *texts, *numbers, int(last_modified) if last_modified is not None else None)
+
+
+def iter_dump_records(path: str, dump_format: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Strömma poster ur en exportfil utan att läsa in den i minnet
+
+    Args:
+        path: Sökväg till .jsonl/.json/.csv/.tsv (valfritt .gz)
+        dump_format: "jsonl" eller "csv" (gissas från filnamnet annars)
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    dump_format = dump_format or ("csv" if name.endswith((".csv", ".tsv")) else "jsonl")
+
+    with _open_dump(path) as file:
+        if dump_format == "csv":
+            # Open Food Facts CSV-export är tabbseparerad med mycket långa fält
+            csv.field_size_limit(sys.maxsize)
+            yield from csv.DictReader(file, delimiter="\t", quoting=csv.QUOTE_NONE)
+        else:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+class OpenFoodFactsMirror:
+    """SQLite-spegel av Open Food Facts produkter med fulltextsökning"""
+
+    def __init__(self, db_path: str = DEFAULT_MIRROR_PATH) -> None:
+        self.db: SQLiteDB = SQLiteDB(db_path, journal_mode="WAL")
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"hits": 0, "misses": 0}
+        self.fts: bool = False
+        self._initialize()
+
+    def _initialize(self) -> None:
+        columns = ", ".join(f"{field} TEXT" for field in TEXT_FIELDS)
+        numbers = ", ".join(f"{field} REAL" for field in NUMBER_FIELDS)
+        with self.db.transaction():
+            self.db.execute_write(f"""
+                CREATE TABLE IF NOT EXISTS off_products (
+                    code TEXT PRIMARY KEY,
+                    {columns},
+                    {numbers},
+                    last_modified_t INTEGER
+                )
+            """)
+        try:
+            with self.db.transaction():
+                self.db.execute_write("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS off_products_fts USING fts5(
+                        product_name, brands, categories,
+                        content='off_products', content_rowid='rowid'
+                    )
+                """)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite utan FTS5 - sökning faller tillbaka på LIKE
+            self.fts = False
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        counters["products"] = self.product_count()
+        counters["fts"] = self.fts
+        return counters
+
+    def product_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM off_products")[0][0]
+
+    def ingest(self, path: str, dump_format: Optional[str] = None, batch_size: int = 5000,
+               progress_every: int = 0) -> Dict[str, Any]:
+        """
+        Läs in en exportfil i spegeln (befintliga streckkoder skrivs över)
+
+        Args:
+            path: Exportfil från Open Food Facts
+            dump_format: "jsonl" eller "csv" (gissas från filnamnet annars)
+            batch_size: Rader per transaktion
+            progress_every: Skriv ut förlopp var N:e post (0 = aldrig)
+
+        Returns:
+            Dict med antal lästa, sparade och överhoppade poster
+        """
+        placeholders = ", ".join("?" * (len(PRODUCT_FIELDS) + 2))
+        updates = ", ".join(f"{field} = excluded.{field}" for field in PRODUCT_FIELDS + ["last_modified_t"])
+        sql = (f"INSERT INTO off_products (code, {', '.join(PRODUCT_FIELDS)}, last_modified_t) "
+               f"VALUES ({placeholders}) ON CONFLICT(code) DO UPDATE SET {updates}")
+
+        started = time.perf_counter()
+        read = stored = 0
+        batch: List[Tuple[Any, ...]] = []
+
+        def flush() -> None:
+            nonlocal stored
+            with self.db.transaction():
+                self.db.execute_many(sql, batch)
+            stored += len(batch)
+            batch.clear()
+
+        for record in iter_dump_records(path, dump_format):
+            read += 1
+            row = _slim_record(record)
+            if row is not None:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush()
+            if progress_every and read % progress_every == 0:
+                print(f"   ... {read} poster lästa, {stored + len(batch)} sparade")
+        if batch:
+            flush()
+
+        if self.fts:
+            # Bygg om indexet en gång i stället för att uppdatera det per rad
+            with self.db.transaction():
+                self.db.execute_write("INSERT INTO off_products_fts(off_products_fts) VALUES ('rebuild')")
+
+        return {"read": read, "stored": stored, "skipped": read - stored,
+                "seconds": round(time.perf_counter() - started, 2)}
+
+    def _row_to_product(self, row: sqlite3.Row) -> Dict[str, Any]:
+        product = {"code": row["code"]}
+        for field in PRODUCT_FIELDS + ["last_modified_t"]:
+            if row[field] is not None:
+                product[field] = row[field]
+        return product
+
+    def get_product(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Svar i samma format som api/v0/product/<kod>.json, eller None om koden saknas"""
+        rows = self.db.execute("SELECT * FROM off_products WHERE code = ?", (barcode,))
+        if not rows:
+            self.count("misses")
+            return None
+        self.count("hits")
+        return {"code": barcode, "status": 1, "status_verbose": "product found",
+                "product": self._row_to_product(rows[0])}
+
+    def search(self, search_term: str, page_size: int = 10, page: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        Sök i spegeln, svar i samma format som cgi/search.pl
+
+        Returns:
+            Dict med count/page/page_size/products, eller None om inget matchar
+        """
+        tokens = [token for token in search_term.lower().split() if token]
+        if not tokens:
+            return None
+        offset = (max(1, page) - 1) * page_size
+
+        if self.fts:
+            # Varje ord som prefix, alla ord måste finnas
+            query = " ".join('"' + token.replace('"', '""') + '"*' for token in tokens)
+            where = "rowid IN (SELECT rowid FROM off_products_fts WHERE off_products_fts MATCH ?)"
+            params: List[Any] = [query]
+        else:
+            where = " AND ".join("(product_name LIKE ? OR brands LIKE ? OR categories LIKE ?)" for _ in tokens)
+            params = [f"%{token}%" for token in tokens for _ in range(3)]
+
+        total = self.db.execute(f"SELECT COUNT(*) FROM off_products WHERE {where}", params)[0][0]
+        if not total:
+            self.count("misses")
+            return None
+        self.count("hits")
+        rows = self.db.execute(
+            f"SELECT * FROM off_products WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [page_size, offset]
+        )
+        return {"count": total, "page": page, "page_size": page_size,
+                "products": [self._row_to_product(row) for row in rows]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Bygg en lokal spegel av Open Food Facts från bulk-exporten')
+    parser.add_argument('dump', nargs='?', help='Exportfil (.jsonl/.csv, valfritt .gz)')
+    parser.add_argument('--db', default=DEFAULT_MIRROR_PATH, help='Spegeldatabas')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default=None, help='Filformat (gissas annars)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rader per transaktion')
+    parser.add_argument('--search', default=None, help='Testsök i spegeln efter inläsning')
+
+    args = parser.parse_args()
+    mirror = OpenFoodFactsMirror(args.db)
+
+    if args.dump:
+        print(f"📥 Läser in {args.dump} till {args.db}")
+        result = mirror.ingest(args.dump, args.format, args.batch_size, progress_every=100000)
+        print(f"✅ {result['stored']} produkter sparade ({result['skipped']} utan streckkod) "
+              f"på {result['seconds']}s")
+
+    if args.search:
+        result = mirror.search(args.search, page_size=10)
+        products = result["products"] if result else []
+        print(f"🔍 '{args.search}': {result['count'] if result else 0} träffar")
+        for product in products:
+            print(f"   {product['code']}  {product.get('product_name', '')}")
+
+    print(f"📊 {mirror.product_count()} produkter i spegeln (FTS5: {'ja' if mirror.fts else 'nej'})")
+
+
+if __name__ == "__main__":
+    main()
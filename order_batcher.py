@@ -0,0 +1,189 @@
+"""
+Group commit för beställningar
+Varje förfrågan lägger sin beställning i en kö och väntar. En skrivtråd
+samlar beställningar som kommer inom max_wait sekunder (högst max_batch_size
+st) och sparar dem i en transaktion, så att lunchrusningen kostar en commit
+per batch i stället för en per beställning. Varje väntande förfrågan får
+sitt eget resultat tillbaka.
+
+Om batchen misslyckas (t.ex. en idempotensnyckel som en annan process hann
+spara) sparas beställningarna en och en, så att ett fel bara drabbar den
+beställning som orsakade det.
+
+En förfrågan väntar högst submit_timeout sekunder. Har skrivtråden dött
+startas en ny. Har skrivtråden inte hunnit ta beställningen sparar
+förfrågan den själv; är beställningen redan på väg in i en batch som
+fastnat får förfrågan ett fel (timed_out) och kan försöka igen med samma
+idempotensnyckel.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from lunch_system_database import SchoolLunchDB
+
+
+class _PendingOrder:
+    """En beställning som väntar på sin batch"""
+
+    def __init__(self, order: Dict[str, Any]) -> None:
+        self.order: Dict[str, Any] = order
+        self.result: Dict[str, Any] = {}
+        self.done = threading.Event()
+        # "queued" -> "taken" (skrivtråden) eller "abandoned" (förfrågan gav upp och sparar själv)
+        self.state: str = "queued"
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """Skrivtråden tar beställningen till en batch, om förfrågan inte redan gett upp"""
+        with self._lock:
+            if self.state != "queued":
+                return False
+            self.state = "taken"
+            return True
+
+    def abandon(self) -> bool:
+        """Förfrågan slutar vänta, om skrivtråden inte redan tagit beställningen"""
+        with self._lock:
+            if self.state != "queued":
+                return False
+            self.state = "abandoned"
+            return True
+
+
+class OrderBatcher:
+    """Samlar beställningar från många trådar och sparar dem med en commit per batch"""
+
+    # Hur ofta en väntande förfrågan kontrollerar att skrivtråden lever
+    LIVENESS_CHECK_INTERVAL = 0.5
+
+    def __init__(self, db: SchoolLunchDB, max_batch_size: int = 64, max_wait: float = 0.005,
+                 submit_timeout: float = 10.0) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size måste vara minst 1")
+        self.db: SchoolLunchDB = db
+        self.max_batch_size: int = max_batch_size
+        self.max_wait: float = max_wait
+        self.submit_timeout: float = submit_timeout
+        self._queue: "queue.Queue[Optional[_PendingOrder]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.orders: int = 0
+        self.batches: int = 0
+        self.largest_batch: int = 0
+        self.fallbacks: int = 0
+        self.direct_writes: int = 0
+        self.timeouts: int = 0
+
+    def _ensure_started(self) -> None:
+        # Skrivtråden startas vid första beställningen (inte i Flask-debuggerns föräldraprocess)
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="order-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, student_id: int, meal_id: int, date: str,
+               idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Spara en beställning och vänta tills dess batch är committad
+
+        Returns:
+            transaction_id, student_id, meal_id och replayed - eller {"error": ...}
+            ({"error": ..., "timed_out": True} om batchen inte blev klar inom submit_timeout)
+        """
+        self._ensure_started()
+        pending = _PendingOrder({"student_id": student_id, "meal_id": meal_id, "date": date,
+                                 "external_transaction_id": idempotency_key})
+        self._queue.put(pending)
+        deadline = time.monotonic() + self.submit_timeout
+        while not pending.done.wait(min(self.LIVENESS_CHECK_INTERVAL, max(0.0, deadline - time.monotonic()))):
+            if time.monotonic() >= deadline:
+                break
+            # En död skrivtråd ersätts - beställningar som står kvar i kön tas av den nya
+            self._ensure_started()
+        if pending.done.is_set():
+            return pending.result
+
+        if pending.abandon():
+            # Skrivtråden hann aldrig ta den - spara direkt i den här tråden
+            self.direct_writes += 1
+            try:
+                return self.db.record_transactions_bulk([pending.order])[0]
+            except Exception as e:
+                return {"error": str(e)}
+        self.timeouts += 1
+        return {"error": f"Beställningen sparades inte inom {self.submit_timeout:g} s - försök igen med samma "
+                         "idempotensnyckel", "timed_out": True}
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            # Beställningar som förfrågan redan gett upp (och sparat själv) hoppas över
+            batch = [pending for pending in batch if pending.take()]
+            if batch:
+                try:
+                    self._commit(batch)
+                except Exception as e:
+                    # Skrivtråden ska inte dö - och ingen förfrågan ska vänta på ett svar som aldrig kommer
+                    for pending in batch:
+                        if not pending.done.is_set():
+                            pending.result = {"error": str(e)}
+                            pending.done.set()
+            if stopping:
+                return
+
+    def _commit(self, batch: List[_PendingOrder]) -> None:
+        try:
+            results = self.db.record_transactions_bulk([pending.order for pending in batch])
+        except Exception:
+            # Batchen rullades tillbaka - spara var för sig så bara den felande beställningen misslyckas
+            self.fallbacks += 1
+            results = []
+            for pending in batch:
+                try:
+                    results.extend(self.db.record_transactions_bulk([pending.order]))
+                except Exception as e:
+                    results.append({"error": str(e)})
+
+        self.orders += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for pending, result in zip(batch, results):
+            pending.result = result
+            pending.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "orders": self.orders,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "average_batch": round(self.orders / self.batches, 1) if self.batches else 0,
+            "fallbacks": self.fallbacks,
+            "direct_writes": self.direct_writes,
+            "timeouts": self.timeouts
+        }
+
+    def close(self) -> None:
+        """Spara det som står i kön och stoppa skrivtråden"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
@@ -0,0 +1,153 @@
+"""
+Kompilerad nyckelordsklassificering av livsmedel
+Regeltabellen nedan (mål, värde, nyckelord) kompileras en gång till ett
+enda reguljärt uttryck, så varje text skannas en gång i stället för en
+any(...)-kedja per regel.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# (mål, värde, nyckelord) i prioritetsordning per mål.
+# "category" matchas mot kategorier + produktnamn, "price_bonus" bara mot kategorier.
+CLASSIFICATION_RULES: List[Tuple[str, Any, Sequence[str]]] = [
+    ("category", "Kött", ["kött", "meat", "beef", "pork"]),
+    ("category", "Fisk & Skaldjur", ["fisk", "fish", "seafood"]),
+    ("category", "Kyckling", ["chicken", "kyckling", "poultry"]),
+    ("category", "Vegetariskt", ["vegetarian", "vegetarisk", "vegan", "vegansk"]),
+    ("category", "Pasta", ["pasta", "noodles"]),
+    ("category", "Soppa", ["soup", "soppa"]),
+    ("category", "Efterrätt", ["dessert", "efterrätt", "sweet"]),
+    ("price_bonus", 25.0, ["kött", "meat", "beef", "pork", "lamb"]),
+    ("price_bonus", 22.0, ["fisk", "fish", "seafood", "salmon"]),
+    ("price_bonus", 18.0, ["chicken", "kyckling", "poultry"]),
+    ("price_bonus", 12.0, ["organic", "ekologisk"]),
+    ("price_bonus", 10.0, ["cheese", "ost", "dairy"]),
+    ("price_bonus", 5.0, ["pasta", "bread", "cereals"]),
+]
+
+DEFAULT_CATEGORY = "Huvudrätt"
+DEFAULT_PRICE_BONUS = 0.0
+
+# Tak för hur många sammansatta alternativ överlappande nyckelord får ge
+MAX_ALTERNATIVES = 1000
+
+
+def _overlap_closure(keywords: Iterable[str], limit: int = MAX_ALTERNATIVES) -> Optional[Set[str]]:
+    """
+    Lägg till sammanslagningar av nyckelord som överlappar (t.ex. "soppa" +
+    "pasta" -> "soppasta"). Med dem som längre alternativ kan en vanlig,
+    icke-överlappande findall inte missa något nyckelord. None om mängden
+    växer förbi taket.
+    """
+    words = set(keywords)
+    alternatives = set(words)
+    pending = list(words)
+    while pending:
+        merged = pending.pop()
+        for word in words:
+            for length in range(1, len(word)):
+                if merged.endswith(word[:length]) and word not in merged:
+                    candidate = merged + word[length:]
+                    if candidate not in alternatives:
+                        if len(alternatives) >= limit:
+                            return None
+                        alternatives.add(candidate)
+                        pending.append(candidate)
+    return alternatives
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """
+    Regex som ett prefixträd (t.ex. "c(?:heese|hicken)") - Pythons re testar
+    annars varje alternativ på varje position. Giriga valfria grenar gör att
+    längsta ordet vinner på varje position.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordClassifier:
+    """Klassificerar produkter med alla regler i ett enda regex"""
+
+    def __init__(self, rules: Sequence[Tuple[str, Any, Sequence[str]]] = CLASSIFICATION_RULES,
+                 default_category: str = DEFAULT_CATEGORY,
+                 default_price_bonus: float = DEFAULT_PRICE_BONUS) -> None:
+        self.default_category: str = default_category
+        self.default_price_bonus: float = default_price_bonus
+        self._categories: List[str] = []
+        self._bonuses: List[float] = []
+        rule_ids: Dict[str, Set[Tuple[str, int]]] = {}
+
+        for target, value, keywords in rules:
+            values = self._categories if target == "category" else self._bonuses
+            values.append(value)
+            for keyword in keywords:
+                rule_ids.setdefault(keyword, set()).add((target, len(values) - 1))
+
+        alternatives = _overlap_closure(rule_ids)
+        if alternatives is None:
+            # För många överlapp: lookahead ger alla träffar men är långsammare
+            alternatives = set(rule_ids)
+            template = "(?=({}))"
+        else:
+            template = "{}"
+
+        # Varje alternativ får bästa (lägsta) regelindex bland nyckelorden det innehåller
+        self._no_match: int = len(rules)
+        self._category_rank: Dict[str, int] = {}
+        self._bonus_rank: Dict[str, int] = {}
+        for alternative in alternatives:
+            hits = [hit for keyword, ids in rule_ids.items() if keyword in alternative for hit in ids]
+            self._category_rank[alternative] = min(
+                (index for target, index in hits if target == "category"), default=self._no_match)
+            self._bonus_rank[alternative] = min(
+                (index for target, index in hits if target != "category"), default=self._no_match)
+
+        self._pattern = re.compile(template.format(_trie_pattern(alternatives)))
+
+    def classify_text(self, categories: str, name: str = "") -> Tuple[str, float]:
+        """
+        Args:
+            categories: Produktens kategorier (gemener)
+            name: Produktens namn (gemener)
+
+        Returns:
+            (kategori, prisbonus)
+        """
+        return self.category_for(categories, name), self.price_bonus_for(categories)
+
+    def category_for(self, categories: str, name: str = "") -> str:
+        rank = min(map(self._category_rank.__getitem__, self._pattern.findall(categories + name)),
+                   default=self._no_match)
+        return self._categories[rank] if rank < self._no_match else self.default_category
+
+    def price_bonus_for(self, categories: str) -> float:
+        rank = min(map(self._bonus_rank.__getitem__, self._pattern.findall(categories)),
+                   default=self._no_match)
+        return self._bonuses[rank] if rank < self._no_match else self.default_price_bonus
+
+    def classify(self, product: Dict[str, Any]) -> Tuple[str, float]:
+        """Kategori och prisbonus för en Open Food Facts-produkt"""
+        categories = (product.get('categories') or '').lower()
+        name = (product.get('product_name') or '').lower()
+        return self.classify_text(categories, name)
+
+    def classify_batch(self, products: Iterable[Dict[str, Any]]) -> List[Tuple[str, float]]:
+        return [self.classify(product) for product in products]
+
+
+DEFAULT_CLASSIFIER = KeywordClassifier()
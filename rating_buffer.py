@@ -0,0 +1,297 @@
+"""
+Write-behind för betyg
+Betyg tas emot i en minnesbuffert och kvitteras direkt. En bakgrundstråd
+summerar dem per måltid och sparar allt i en transaktion var flush_interval:e
+sekund eller när max_pending betyg väntar, så den populäraste måltidens rad
+inte skrivs om en gång per klick.
+
+Hållbarhet (durability):
+- "memory": bara i minnet - betyg som inte hunnit sparas försvinner vid krasch
+- "spool":  varje betyg läggs även till i en spool-fil (tål att processen kraschar)
+- "fsync":  som "spool" men fsync efter varje betyg (tål även strömavbrott)
+
+Varje betyg får ett löpnummer. Högsta sparade löpnumret skrivs i
+rating_flush_state i samma transaktion som betygen, så spool-filen kan
+spelas upp efter en krasch utan att något betyg räknas två gånger.
+
+Flera processer (t.ex. WSGI-workers) mot samma databas får var sin plats:
+start() låser första lediga platsen, där plats 0 är spool_path/name och
+plats N är "<spool>.N<ändelse>"/"<name>.N". Ingen process skriver över en
+annan process spool eller löpnummer. En plats vars process dött (låset
+släppt) tas över av nästa process som startar: den egna platsen spelas upp
+som vanligt och andra övergivna platser sparas direkt och töms.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from lunch_system_database import SchoolLunchDB
+
+DEFAULT_SPOOL_PATH = "ratings.spool"
+DURABILITY_MODES = ("memory", "spool", "fsync")
+
+
+def _try_lock(path: str) -> Optional[IO]:
+    """Lås filen utan att vänta; returnerar den öppna filen (håller låset) eller None om någon annan har det"""
+    file = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        file.close()
+        return None
+    # Låset släpps när filen stängs - eller när processen dör
+    return file
+
+
+class RatingBuffer:
+    """Buffrar betyg och sparar dem i omgångar (write-behind)"""
+
+    def __init__(self, db: SchoolLunchDB, spool_path: str = DEFAULT_SPOOL_PATH, durability: str = "spool",
+                 flush_interval: float = 0.2, max_pending: int = 500, name: str = "ratings") -> None:
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Okänd durability: '{durability}' (välj {', '.join(DURABILITY_MODES)})")
+        self.db: SchoolLunchDB = db
+        self.base_spool_path: str = spool_path
+        self.base_name: str = name
+        # Sätts om av start() till den plats processen fick
+        self.spool_path: str = spool_path
+        self.name: str = name
+        self.slot: Optional[int] = None
+        self.durability: str = durability
+        self.flush_interval: float = flush_interval
+        self.max_pending: int = max_pending
+        self._pending: List[Tuple[int, int, float]] = []  # (seq, meal_id, rating)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._spool: Optional[Any] = None
+        self._slot_lock: Optional[IO] = None
+        self._next_seq: int = 1
+        self.submitted: int = 0
+        self.flushed: int = 0
+        self.flushes: int = 0
+        self.replayed: int = 0
+        self.adopted: int = 0
+        self.errors: List[str] = []
+        self._initialize()
+
+    def _initialize(self) -> None:
+        with self.db.db.transaction():
+            self.db.db.execute_write("""
+                CREATE TABLE IF NOT EXISTS rating_flush_state (
+                    name TEXT PRIMARY KEY,
+                    last_seq INTEGER NOT NULL DEFAULT 0,
+                    flushed_at REAL
+                )
+            """)
+
+    def _slot_paths(self, slot: int) -> Tuple[str, str]:
+        """(spool-fil, namn i rating_flush_state) för en plats"""
+        if slot == 0:
+            return self.base_spool_path, self.base_name
+        root, ext = os.path.splitext(self.base_spool_path)
+        return f"{root}.{slot}{ext}", f"{self.base_name}.{slot}"
+
+    def _existing_slots(self) -> List[int]:
+        root, ext = os.path.splitext(self.base_spool_path)
+        slots = {0}
+        for path in glob.glob(f"{glob.escape(root)}.*{ext}"):
+            middle = path[len(root) + 1:len(path) - len(ext)]
+            if middle.isdigit():
+                slots.add(int(middle))
+        return sorted(slots)
+
+    def _claim_slot(self) -> None:
+        """Lås första lediga platsen så att ingen annan process delar spool-fil och löpnummer"""
+        slot = 0
+        while True:
+            spool_path, name = self._slot_paths(slot)
+            lock = _try_lock(spool_path + ".lock")
+            if lock is not None:
+                self._slot_lock, self.slot, self.spool_path, self.name = lock, slot, spool_path, name
+                return
+            slot += 1
+
+    def _adopt_orphans(self) -> int:
+        """Spara betygen i platser vars process dött och töm deras spool; returnerar antal betyg"""
+        adopted = 0
+        for slot in self._existing_slots():
+            spool_path, name = self._slot_paths(slot)
+            if slot == self.slot or not os.path.exists(spool_path):
+                continue
+            lock = _try_lock(spool_path + ".lock")
+            if lock is None:
+                continue  # En levande process äger platsen
+            try:
+                last_seq = self._last_flushed_seq(name)
+                entries = [entry for entry in self._read_spool(spool_path) if entry[0] > last_seq]
+                if entries:
+                    self._apply(entries, name)
+                    adopted += len(entries)
+                os.remove(spool_path)
+            except Exception as e:
+                self.errors.append(f"Övertagandet av {spool_path} misslyckades: {e}")
+            finally:
+                lock.close()
+        return adopted
+
+    def _last_flushed_seq(self, name: Optional[str] = None) -> int:
+        rows = self.db.db.execute("SELECT last_seq FROM rating_flush_state WHERE name = ?", (name or self.name,))
+        return rows[0][0] if rows else 0
+
+    def _read_spool(self, spool_path: Optional[str] = None) -> List[Tuple[int, int, float]]:
+        entries = []
+        try:
+            with open(spool_path or self.spool_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        entries.append((int(entry["seq"]), int(entry["meal_id"]), float(entry["rating"])))
+                    except (ValueError, KeyError, TypeError):
+                        # Avbruten sista rad efter en krasch - betyget kvitterades aldrig
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def start(self) -> int:
+        """Lås en plats, spela upp osparade betyg från dess spool-fil och starta flush-tråden;
+        returnerar antal uppspelade"""
+        self._claim_slot()
+        if self.durability != "memory":
+            self.adopted = self._adopt_orphans()
+        last_seq = self._last_flushed_seq()
+        entries = self._read_spool() if self.durability != "memory" else []
+        with self._lock:
+            self._pending = [entry for entry in entries if entry[0] > last_seq]
+            self.replayed = len(self._pending)
+            self._next_seq = max([last_seq] + [entry[0] for entry in entries]) + 1
+            if self.durability != "memory":
+                self._rewrite_spool()
+        self._thread = threading.Thread(target=self._run, name="rating-flusher", daemon=True)
+        self._thread.start()
+        return self.replayed
+
+    def submit(self, meal_id: int, rating: float) -> int:
+        """Ta emot ett betyg (1-5) och returnera dess löpnummer; sparas av flush-tråden"""
+        if not 1 <= rating <= 5:
+            raise ValueError("Rating must be between 1 and 5")
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            if self._spool is not None:
+                self._spool.write(json.dumps({"seq": seq, "meal_id": meal_id, "rating": rating}) + "\n")
+                self._spool.flush()
+                if self.durability == "fsync":
+                    os.fsync(self._spool.fileno())
+            self._pending.append((seq, meal_id, rating))
+            self.submitted += 1
+            if len(self._pending) >= self.max_pending:
+                self._wakeup.notify()
+        return seq
+
+    def flush(self) -> int:
+        """Spara alla väntande betyg i en transaktion; returnerar antal sparade betyg"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = []
+            if not batch:
+                return 0
+
+            try:
+                self._apply(batch, self.name)
+            except Exception as e:
+                # Tillbaka i kön (och kvar i spool-filen) - nästa flush försöker igen
+                with self._lock:
+                    self._pending = batch + self._pending
+                self.errors.append(f"Flush av {len(batch)} betyg misslyckades: {e}")
+                return 0
+
+            with self._lock:
+                self.flushed += len(batch)
+                self.flushes += 1
+                if self.durability != "memory":
+                    # Spool-filen behöver bara de betyg som fortfarande väntar
+                    self._rewrite_spool()
+            return len(batch)
+
+    def _apply(self, batch: List[Tuple[int, int, float]], name: str) -> None:
+        """Summera per måltid och spara tillsammans med högsta löpnumret i en transaktion"""
+        totals: Dict[int, Tuple[float, int]] = {}
+        for _, meal_id, rating in batch:
+            total, count = totals.get(meal_id, (0.0, 0))
+            totals[meal_id] = (total + rating, count + 1)
+        last_seq = max(seq for seq, _, _ in batch)
+        with self.db.db.transaction():
+            self.db.rate_meals_bulk(totals)
+            self.db.db.execute_write("""
+                INSERT INTO rating_flush_state (name, last_seq, flushed_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET last_seq = excluded.last_seq, flushed_at = excluded.flushed_at
+            """, (name, last_seq, time.time()))
+
+    def _rewrite_spool(self) -> None:
+        # Anropas med self._lock hållet
+        if self._spool is not None:
+            self._spool.close()
+        temp_path = self.spool_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            for seq, meal_id, rating in self._pending:
+                file.write(json.dumps({"seq": seq, "meal_id": meal_id, "rating": rating}) + "\n")
+            file.flush()
+            if self.durability == "fsync":
+                os.fsync(file.fileno())
+        os.replace(temp_path, self.spool_path)
+        self._spool = open(self.spool_path, "a", encoding="utf-8")
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            with self._lock:
+                if len(self._pending) < self.max_pending:
+                    self._wakeup.wait(self.flush_interval)
+            self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "durability": self.durability,
+                "slot": self.slot,
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "flushed": self.flushed,
+                "flushes": self.flushes,
+                "replayed": self.replayed,
+                "adopted": self.adopted,
+                "errors": self.errors[-5:] or None
+            }
+
+    def close(self) -> None:
+        """Stoppa flush-tråden och spara det som väntar"""
+        self._stopped.set()
+        with self._lock:
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+            if self._slot_lock is not None:
+                self._slot_lock.close()
+                self._slot_lock = None
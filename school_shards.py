@@ -0,0 +1,107 @@
+"""
+Flera skolor - en databasfil per skola
+Varje skola får en egen SchoolLunchDB så att skrivningar på olika skolor
+inte köar bakom samma lås. Rapporter över alla skolor körs parallellt.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from lunch_system_database import SchoolLunchDB
+
+SCHOOL_KEY_PATTERN = re.compile(r"^[a-z0-9_-]+$")
+
+
+class SchoolShardRouter:
+    """Skickar varje operation till rätt skolas databas"""
+
+    def __init__(self, shard_dir: str = "schools", max_workers: Optional[int] = None,
+                 journal_mode: Optional[str] = None) -> None:
+        self.shard_dir: str = shard_dir
+        self.max_workers: Optional[int] = max_workers
+        self.journal_mode: Optional[str] = journal_mode
+        self._shards: Dict[str, SchoolLunchDB] = {}
+        self._lock = threading.Lock()
+        os.makedirs(shard_dir, exist_ok=True)
+
+    def normalize_key(self, school_key: str) -> str:
+        key = (school_key or "").strip().lower()
+        if not SCHOOL_KEY_PATTERN.match(key):
+            raise ValueError(f"Ogiltig skolnyckel: '{school_key}'")
+        return key
+
+    def shard_path(self, school_key: str) -> str:
+        return os.path.join(self.shard_dir, f"{self.normalize_key(school_key)}.db")
+
+    def for_school(self, school_key: str, create: bool = True) -> SchoolLunchDB:
+        """Hämta (eller skapa) databasen för en skola; create=False ger ValueError för okända skolor"""
+        key = self.normalize_key(school_key)
+        with self._lock:
+            if key not in self._shards:
+                path = self.shard_path(key)
+                if not create and not os.path.exists(path):
+                    raise ValueError(f"Okänd skola: '{school_key}'")
+                self._shards[key] = SchoolLunchDB(path, journal_mode=self.journal_mode)
+            return self._shards[key]
+
+    def school_keys(self) -> List[str]:
+        """Alla skolor som har en databasfil"""
+        keys = set(self._shards)
+        for filename in os.listdir(self.shard_dir):
+            stem, ext = os.path.splitext(filename)
+            if ext == ".db" and SCHOOL_KEY_PATTERN.match(stem):
+                keys.add(stem)
+        return sorted(keys)
+
+    def _fan_out(self, operation: Callable[[SchoolLunchDB], Any]) -> Dict[str, Any]:
+        """Kör operationen mot alla skolor parallellt och returnera per skola"""
+        keys = self.school_keys()
+        if not keys:
+            return {}
+        shards = [self.for_school(key) for key in keys]
+        with ThreadPoolExecutor(max_workers=self.max_workers or len(keys)) as pool:
+            results = list(pool.map(operation, shards))
+        return dict(zip(keys, results))
+
+    # --- CROSS-SCHOOL REPORTS ---
+
+    def get_report_totals(self) -> Dict[str, Any]:
+        per_school = self._fan_out(lambda shard: shard.get_report_totals())
+        totals = {"students": 0, "meals": 0, "transactions": 0, "revenue": 0.0}
+        for school_totals in per_school.values():
+            for field in totals:
+                totals[field] += school_totals.get(field) or 0
+        totals["schools"] = per_school
+        return totals
+
+    def get_meal_popularity(self, limit: int = 10) -> List[Dict[str, Any]]:
+        per_school = self._fan_out(lambda shard: shard.get_meal_popularity(limit=None))
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for school_rows in per_school.values():
+            for row in school_rows:
+                key = (row["name"], row["category"])
+                if key not in merged:
+                    merged[key] = {"name": row["name"], "category": row["category"], "orders": 0}
+                merged[key]["orders"] += row["orders"]
+        ranked = sorted(merged.values(), key=lambda item: (-item["orders"], item["name"]))
+        return ranked[:limit]
+
+    def search_meals(self, search_term: str, limit: int = 50) -> List[Dict[str, Any]]:
+        per_school = self._fan_out(lambda shard: shard.search_meals(search_term, limit))
+        matches = []
+        for school_key, rows in per_school.items():
+            for row in rows:
+                meal = dict(row)
+                meal["school"] = school_key
+                matches.append(meal)
+        matches.sort(key=lambda meal: (meal["name"], meal["school"]))
+        return matches[:limit]
+
+    def close(self) -> None:
+        with self._lock:
+            for shard in self._shards.values():
+                shard.db.close()
+            self._shards.clear()
@@ -5,53 +5,265 @@ Implementerar extern data-hämtning enligt kurskrav med requests och json module
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Dict, List, Optional, Any
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import random
 
-class FoodAPI:
-    """API-klass för att hämta livsmedelsdata från Open Food Facts och TheMealDB"""
+from food_api_fixtures import DEFAULT_FIXTURE_DIR, MODES as FIXTURE_MODES, FixtureStore
+from http_cache import DEFAULT_CACHE_PATH, ResponseCache
+from openfoodfacts_mirror import OpenFoodFactsMirror
+from product_classifier import DEFAULT_CLASSIFIER
+from upstream_resilience import UpstreamGuard
+
+OPENFOODFACTS_URL = "https://world.openfoodfacts.org"
+THEMEALDB_URL = "https://www.themealdb.com/api/json/v1/1"
+DEFAULT_HEADERS = {
+    'User-Agent': 'SchoolLunchSystem/1.0 (Educational Project)',
+    'Accept': 'application/json'
+}
+
+class SearchPageError(requests.exceptions.RequestException):
+    """En resultatsida kunde inte hämtas under en sidad sökning"""
+
+class SingleFlight:
+    """Slår ihop samtidiga identiska anrop så att bara ett går till servern"""
     
     def __init__(self) -> None:
-        self.openfoodfacts_url: str = "https://world.openfoodfacts.org"
-        self.themealdb_url: str = "https://www.themealdb.com/api/json/v1/1"
-        self.headers: Dict[str, str] = {
-            'User-Agent': 'SchoolLunchSystem/1.0 (Educational Project)',
-            'Accept': 'application/json'
-        }
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+        
+        if not leader:
+            return call.result()
+        
+        try:
+            call.set_result(fn())
+        except BaseException as e:
+            # Även KeyboardInterrupt/SystemExit - annars väntar följarna för alltid
+            call.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return call.result()
+
+class FoodAPI:
+    """API-klass för att hämta livsmedelsdata från Open Food Facts och TheMealDB"""
     
-    def search_food_products(self, search_term: str, page_size: int = 10) -> Dict[str, Any]:
+    # En gemensam session per process - återanvänder TCP/TLS-anslutningar
+    _shared_session: Optional[requests.Session] = None
+    _session_lock = threading.Lock()
+    
+    def __init__(self, openfoodfacts_url: str = OPENFOODFACTS_URL, themealdb_url: str = THEMEALDB_URL,
+                 session: Optional[requests.Session] = None, cache: Optional[ResponseCache] = None,
+                 guard: Optional[UpstreamGuard] = None, fixtures: Optional[FixtureStore] = None,
+                 mirror: Optional[OpenFoodFactsMirror] = None) -> None:
+        self.openfoodfacts_url: str = openfoodfacts_url
+        self.themealdb_url: str = themealdb_url
+        self.headers: Dict[str, str] = dict(DEFAULT_HEADERS)
+        self.session: requests.Session = session or FoodAPI.get_shared_session()
+        self.cache: Optional[ResponseCache] = cache
+        self._inflight = SingleFlight()
+        # Retry, rate limit och circuit breaker per värd
+        self.guard: UpstreamGuard = guard or UpstreamGuard()
+        # Inspelade svar för tester och benchmarks utan internet
+        self.fixtures: Optional[FixtureStore] = fixtures if fixtures and fixtures.mode != "off" else None
+        # Lokal spegel av Open Food Facts - frågas före nätet
+        self.mirror: Optional[OpenFoodFactsMirror] = mirror
+    
+    @classmethod
+    def get_shared_session(cls, pool_size: int = 16) -> requests.Session:
+        """
+        Hämta processens delade keep-alive session (skapas vid första anropet)
+        
+        Args:
+            pool_size: Max antal öppna anslutningar per värd
+        """
+        with cls._session_lock:
+            if cls._shared_session is None:
+                session = requests.Session()
+                session.headers.update(DEFAULT_HEADERS)
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                cls._shared_session = session
+            return cls._shared_session
+    
+    @classmethod
+    def close_shared_session(cls) -> None:
+        """Stäng den delade sessionen (nästa anrop skapar en ny)"""
+        with cls._session_lock:
+            if cls._shared_session is not None:
+                cls._shared_session.close()
+                cls._shared_session = None
+    
+    def _send(self, url: str, headers: Dict[str, str], params: Optional[Dict[str, Any]],
+              timeout: float) -> requests.Response:
+        return self.guard.call(
+            url, lambda: self.session.get(url, headers=headers, params=params, timeout=timeout)
+        )
+    
+    def upstream_stats(self) -> Dict[str, Any]:
+        """Räknare för retry, rate limiter, circuit breaker och cache"""
+        stats = self.guard.stats()
+        if self.cache:
+            stats["cache"] = self.cache.stats()
+        if self.mirror:
+            stats["mirror"] = self.mirror.stats()
+        return stats
+    
+    def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None, timeout: float = 10,
+                  endpoint: str = "default") -> Any:
+        """
+        Gemensam GET för alla anrop - kastar requests-fel och JSONDecodeError
+        
+        I replay-läge serveras inspelade svar från disk utan nätverk,
+        i record-läge sparas varje svar som fixture.
+        """
+        if self.fixtures and self.fixtures.mode == "replay":
+            return self.fixtures.load(url, params)
+        data = self._fetch_json(url, params, timeout, endpoint)
+        if self.fixtures and self.fixtures.mode == "record":
+            self.fixtures.save(url, params, data)
+        return data
+    
+    def _fetch_json(self, url: str, params: Optional[Dict[str, Any]], timeout: float, endpoint: str) -> Any:
+        """
+        Hämta från nätet - med cache: färska svar läses från disk, inaktuella revalideras med
+        If-None-Match/If-Modified-Since innan de hämtas om.
+        """
+        ttl = self.cache.ttl_for(endpoint) if self.cache else 0
+        if not ttl:
+            response = self._send(url, self.headers, params, timeout)
+            response.raise_for_status()
+            return response.json()
+        
+        key = ResponseCache.make_key("GET", url, params)
+        cached = self.cache.get(key)
+        headers = dict(self.headers)
+        if cached and cached["fresh"]:
+            self.cache.count("hits")
+            return json.loads(cached["body"])
+        if cached:
+            self.cache.count("stale")
+            if cached["etag"]:
+                headers['If-None-Match'] = cached["etag"]
+            if cached["last_modified"]:
+                headers['If-Modified-Since'] = cached["last_modified"]
+        else:
+            self.cache.count("misses")
+        
+        response = self._send(url, headers, params, timeout)
+        if cached and response.status_code == 304:
+            self.cache.count("revalidated")
+            self.cache.refresh(key, ttl)
+            return json.loads(cached["body"])
+        response.raise_for_status()
+        data = response.json()
+        self.cache.store(key, url, response.content, ttl,
+                         response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return data
+    
+    def search_food_products(self, search_term: str, page_size: int = 10, page: int = 1) -> Dict[str, Any]:
         """
         Sök livsmedel via Open Food Facts API
         
         Args:
             search_term: Sökterm (t.ex. "pasta", "kyckling", "potatis")
             page_size: Antal produkter att hämta
+            page: Sidnummer (1 = första sidan)
             
         Returns:
             Dict med produkter eller felmeddelande
         """
         try:
+            if self.mirror:
+                local = self.mirror.search(search_term, page_size, page)
+                if local is not None:
+                    return local
+            
             url = f"{self.openfoodfacts_url}/cgi/search.pl"
             params = {
                 'search_terms': search_term,
                 'json': 1,
                 'page_size': page_size,
-                'fields': 'product_name,brands,categories,ingredients_text,allergens,nutrition_grades,energy_100g,sugars_100g,fat_100g,proteins_100g,salt_100g'
+                'fields': 'code,last_modified_t,product_name,brands,categories,ingredients_text,allergens,nutrition_grades,energy_100g,sugars_100g,fat_100g,proteins_100g,salt_100g'
             }
+            if page > 1:
+                params['page'] = page
             
-            response = requests.get(url, headers=self.headers, params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
-            
-            return data
+            return self._get_json(url, params=params, timeout=15, endpoint="search")
             
         except requests.exceptions.RequestException as e:
             return {"error": f"Kunde inte söka livsmedel: {e}"}
         except json.JSONDecodeError:
             return {"error": "Ogiltigt JSON-svar från Open Food Facts"}
     
+    def iter_search_products(self, search_term: str, page_size: int = 50, limit: Optional[int] = None,
+                             deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Gå igenom alla resultatsidor för en sökning, en produkt i taget
+        
+        Nästa sida hämtas i bakgrunden medan den aktuella bearbetas, så högst
+        två sidor finns i minnet samtidigt.
+        
+        Args:
+            search_term: Sökterm
+            page_size: Produkter per sida
+            limit: Max antal produkter totalt
+            deadline: Max antal sekunder för hela genomgången
+            
+        Raises:
+            SearchPageError: Om en sida inte kunde hämtas
+        """
+        stop_at = time.monotonic() + deadline if deadline is not None else None
+        executor = ThreadPoolExecutor(max_workers=1)
+        produced = 0
+        page = 1
+        try:
+            pending = executor.submit(self.search_food_products, search_term, page_size, page)
+            while pending is not None:
+                remaining = None if stop_at is None else stop_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return
+                try:
+                    result = pending.result(timeout=remaining)
+                except FuturesTimeoutError:
+                    return
+                if "error" in result:
+                    raise SearchPageError(result["error"])
+                
+                products = result.get('products') or []
+                total = int(result.get('count') or 0)
+                seen = (page - 1) * page_size + len(products)
+                more = len(products) == page_size and (not total or seen < total)
+                if limit is not None and produced + len(products) >= limit:
+                    more = False
+                
+                # Förhämta nästa sida innan den här lämnas ut
+                page += 1
+                pending = executor.submit(self.search_food_products, search_term, page_size, page) if more else None
+                
+                for product in products:
+                    if limit is not None and produced >= limit:
+                        return
+                    yield product
+                    produced += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
     def get_product_by_barcode(self, barcode: str) -> Dict[str, Any]:
         """
         Hämta specifik produkt via streckkod
@@ -63,44 +275,98 @@ class FoodAPI:
             Dict med produktinformation
         """
         try:
-            url = f"{self.openfoodfacts_url}/api/v0/product/{barcode}.json"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            if self.mirror:
+                local = self.mirror.get_product(barcode)
+                if local is not None:
+                    return local
             
-            return response.json()
+            url = f"{self.openfoodfacts_url}/api/v0/product/{barcode}.json"
+            # Samtidiga uppslag av samma streckkod delar på ett anrop
+            return self._inflight.do(url, lambda: self._get_json(url, timeout=10, endpoint="product"))
             
         except requests.exceptions.RequestException as e:
             return {"error": f"Kunde inte hämta produkt: {e}"}
         except json.JSONDecodeError:
             return {"error": "Ogiltigt JSON-svar"}
     
-    def get_random_meals_themealdb(self, count: int = 5) -> Dict[str, Any]:
+    def get_products_by_barcodes(self, barcodes: List[str], max_workers: int = 8,
+                                 deadline: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Hämta många produkter på en gång, t.ex. en hel leveranslista
+        
+        Args:
+            barcodes: Streckkoder (dubbletter slås ihop)
+            max_workers: Max antal samtidiga anrop
+            deadline: Total tidsgräns i sekunder
+            
+        Returns:
+            Dict streckkod -> svar från get_product_by_barcode
+        """
+        unique_barcodes = list(dict.fromkeys(code.strip() for code in barcodes if code and code.strip()))
+        calls = [lambda code=code: self.get_product_by_barcode(code) for code in unique_barcodes]
+        
+        products = {}
+        for code, (result, error) in zip(unique_barcodes, self._fan_out(calls, max_workers, deadline)):
+            products[code] = result if error is None else {"error": f"Kunde inte hämta produkt: {error}"}
+        return products
+    
+    def _fan_out(self, calls: List[Callable[[], Any]], max_workers: int = 8,
+                 deadline: Optional[float] = None) -> List[Tuple[Any, Optional[Exception]]]:
+        """
+        Kör flera anrop parallellt med begränsat antal trådar
+        
+        Args:
+            calls: Funktioner utan argument som ska köras
+            max_workers: Max antal samtidiga anrop
+            deadline: Total tidsgräns i sekunder för hela omgången
+            
+        Returns:
+            Lista med (resultat, fel) i samma ordning som calls
+        """
+        if not calls:
+            return []
+        
+        outcomes: List[Tuple[Any, Optional[Exception]]] = [(None, None)] * len(calls)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(calls))))
+        futures = {executor.submit(call): index for index, call in enumerate(calls)}
+        try:
+            done, not_done = wait(futures, timeout=deadline)
+            for future in done:
+                error = future.exception()
+                outcomes[futures[future]] = (None, error) if error else (future.result(), None)
+            for future in not_done:
+                future.cancel()
+                outcomes[futures[future]] = (None, TimeoutError(f"Tidsgränsen på {deadline}s överskreds"))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return outcomes
+    
+    def get_random_meals_themealdb(self, count: int = 5, max_workers: int = 5,
+                                   deadline: Optional[float] = 15.0) -> Dict[str, Any]:
         """
         Hämta slumpmässiga måltider från TheMealDB som komplement
         
         Args:
             count: Antal måltider att hämta
+            max_workers: Max antal samtidiga anrop
+            deadline: Total tidsgräns i sekunder för alla anrop
             
         Returns:
             Dict med måltider eller felmeddelande
         """
+        url = f"{self.themealdb_url}/random.php"
+        calls = [lambda: self._get_json(url, timeout=10, endpoint="random") for _ in range(count)]
+        
         meals = []
         errors = []
         
-        for i in range(count):
-            try:
-                url = f"{self.themealdb_url}/random.php"
-                response = requests.get(url, headers=self.headers, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data and 'meals' in data and data['meals']:
-                    meals.extend(data['meals'])
-                
-            except requests.exceptions.RequestException as e:
-                errors.append(f"TheMealDB anrop {i+1}: {str(e)}")
-            except json.JSONDecodeError:
+        for i, (data, error) in enumerate(self._fan_out(calls, max_workers, deadline)):
+            if isinstance(error, json.JSONDecodeError):
                 errors.append(f"TheMealDB anrop {i+1}: Ogiltigt JSON-svar")
+            elif error is not None:
+                errors.append(f"TheMealDB anrop {i+1}: {str(error)}")
+            elif data and 'meals' in data and data['meals']:
+                meals.extend(data['meals'])
         
         return {
             "meals": meals,
@@ -108,6 +374,31 @@ class FoodAPI:
             "errors": errors if errors else None
         }
     
+    def _get_themealdb(self, path: str, params: Dict[str, Any], error_message: str) -> Dict[str, Any]:
+        """GET mot TheMealDB med samma felhantering som övriga anrop"""
+        try:
+            return self._get_json(f"{self.themealdb_url}/{path}", params=params, timeout=10, endpoint="catalog")
+        except requests.exceptions.RequestException as e:
+            return {"error": f"{error_message}: {e}"}
+        except json.JSONDecodeError:
+            return {"error": "Ogiltigt JSON-svar från TheMealDB"}
+    
+    def list_meals_by_letter(self, letter: str) -> Dict[str, Any]:
+        """Alla måltider (fullständiga) vars namn börjar på en bokstav"""
+        return self._get_themealdb("search.php", {'f': letter}, "Kunde inte lista måltider")
+    
+    def list_meal_categories(self) -> Dict[str, Any]:
+        """TheMealDB:s kategorier"""
+        return self._get_themealdb("categories.php", {}, "Kunde inte hämta kategorier")
+    
+    def list_meals_by_category(self, category: str) -> Dict[str, Any]:
+        """Måltider i en kategori (bara idMeal, namn och bild)"""
+        return self._get_themealdb("filter.php", {'c': category}, "Kunde inte lista kategori")
+    
+    def lookup_meal(self, meal_id: str) -> Dict[str, Any]:
+        """Fullständig måltid via idMeal"""
+        return self._get_themealdb("lookup.php", {'i': meal_id}, "Kunde inte hämta måltid")
+    
     def convert_openfoodfacts_to_local(self, openfood_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Konvertera Open Food Facts data till vårt lokala format
@@ -139,11 +430,11 @@ class FoodAPI:
             if not description:
                 description = f"Livsmedel: {name}"
             
-            # Beräkna pris baserat på näringsinnehåll och kategori
-            estimated_price = self._estimate_price_from_nutrition(product)
+            # Kategori och prisbonus i ett pass över kategorier + namn
+            category, category_bonus = DEFAULT_CLASSIFIER.classify(product)
             
-            # Kategorisera baserat på Open Food Facts kategorier
-            category = self._categorize_from_openfoodfacts(product)
+            # Beräkna pris baserat på näringsinnehåll och kategori
+            estimated_price = self._estimate_price_from_nutrition(product, category_bonus)
             
             local_meal = {
                 "name": name,
@@ -152,15 +443,19 @@ class FoodAPI:
                 "category": category,
                 "source": "Open Food Facts",
                 "allergens": product.get('allergens', ''),
+                "ingredients": ingredients,
                 "nutrition_grade": self._get_nutrition_grade_description(product.get('nutrition_grades', 'N/A')),
-                "energy_100g": product.get('energy_100g', 0)
+                "energy_100g": product.get('energy_100g', 0),
+                "product_code": product.get('code'),
+                "source_last_modified": product.get('last_modified_t')
             }
             
             local_meals.append(local_meal)
         
         return local_meals
     
-    def _estimate_price_from_nutrition(self, product: Dict[str, Any]) -> float:
+    def _estimate_price_from_nutrition(self, product: Dict[str, Any],
+                                       category_bonus: Optional[float] = None) -> float:
         """
         Uppskatta pris baserat på näringsinnehåll och produkttyp med match-case
         Demonstrerar Python 3.10+ pattern matching funktionalitet
@@ -187,30 +482,15 @@ class FoodAPI:
             case _:
                 protein_bonus = 0.0   # Mycket lågt/okänt protein
         
-        # Kategorisera produkttyp med match-case
-        categories = product.get('categories', '').lower()
-        category_bonus = self._get_category_price_bonus(categories)
+        # Kategorisera produkttyp om bonusen inte redan är beräknad
+        if category_bonus is None:
+            category_bonus = self._get_category_price_bonus((product.get('categories') or '').lower())
             
         return round(base_price + protein_bonus + category_bonus, 2)
     
     def _get_category_price_bonus(self, categories: str) -> float:
-        """Beräkna prisbonus baserat på produktkategori med match-case"""
-        # Använd match-case för kategoriprishantering
-        match categories:
-            case cat if any(word in cat for word in ['kött', 'meat', 'beef', 'pork', 'lamb']):
-                return 25.0  # Kött - dyrast
-            case cat if any(word in cat for word in ['fisk', 'fish', 'seafood', 'salmon']):
-                return 22.0  # Fisk & skaldjur
-            case cat if any(word in cat for word in ['chicken', 'kyckling', 'poultry']):
-                return 18.0  # Kyckling - billigare än rött kött
-            case cat if 'organic' in cat or 'ekologisk' in cat:
-                return 12.0  # Ekologiskt - premium men inte kött
-            case cat if any(word in cat for word in ['cheese', 'ost', 'dairy']):
-                return 10.0  # Mejeriprodukter
-            case cat if any(word in cat for word in ['pasta', 'bread', 'cereals']):
-                return 5.0   # Kolhydrater - basvaror
-            case _:
-                return 0.0   # Okänd kategori - ingen bonus
+        """Beräkna prisbonus baserat på produktkategori (se product_classifier.py)"""
+        return DEFAULT_CLASSIFIER.price_bonus_for(categories)
     
     def _get_nutrition_grade_description(self, grade: str) -> str:
         """
@@ -237,27 +517,8 @@ class FoodAPI:
                 return f'{normalized_grade.lower()}'  # Fallback för okända grades
     
     def _categorize_from_openfoodfacts(self, product: Dict[str, Any]) -> str:
-        """Kategorisera produkt baserat på Open Food Facts kategorier"""
-        categories = product.get('categories', '').lower()
-        name = product.get('product_name', '').lower()
-        
-        # Svensk kategorisering
-        if any(word in categories + name for word in ['kött', 'meat', 'beef', 'pork']):
-            return 'Kött'
-        elif any(word in categories + name for word in ['fisk', 'fish', 'seafood']):
-            return 'Fisk & Skaldjur'  
-        elif any(word in categories + name for word in ['chicken', 'kyckling', 'poultry']):
-            return 'Kyckling'
-        elif any(word in categories + name for word in ['vegetarian', 'vegetarisk', 'vegan', 'vegansk']):
-            return 'Vegetariskt'
-        elif any(word in categories + name for word in ['pasta', 'noodles']):
-            return 'Pasta'
-        elif any(word in categories + name for word in ['soup', 'soppa']):
-            return 'Soppa'
-        elif any(word in categories + name for word in ['dessert', 'efterrätt', 'sweet']):
-            return 'Efterrätt'
-        else:
-            return 'Huvudrätt'
+        """Kategorisera produkt baserat på Open Food Facts kategorier (se product_classifier.py)"""
+        return DEFAULT_CLASSIFIER.classify(product)[0]
     
     def convert_themealdb_to_local(self, mealdb_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -365,13 +626,16 @@ class FoodAPI:
             
             # Uppskatta pris baserat på ingredienser
             estimated_price = self._estimate_price_from_ingredients(meal)
+            ingredients = [meal[f'strIngredient{i}'].strip() for i in range(1, 21)
+                           if meal.get(f'strIngredient{i}') and meal[f'strIngredient{i}'].strip()]
             
             local_meal = {
                 "name": name,
                 "description": description,
                 "price": estimated_price,
                 "category": category_swedish,
-                "source": "TheMealDB"
+                "source": "TheMealDB",
+                "ingredients": ", ".join(ingredients)
             }
             
             local_meals.append(local_meal)
@@ -419,15 +683,46 @@ class FoodAPI:
             return base_price         # Mycket enkel
     
 # Hjälpfunktioner för enkel användning
-def search_food_ingredients(search_term: str = "pasta") -> List[Dict[str, Any]]:
+_default_api: Optional[FoodAPI] = None
+_default_api_lock = threading.Lock()
+
+def get_default_api() -> FoodAPI:
+    """Delad FoodAPI-instans för hjälpfunktionerna (och Flask-processen)"""
+    global _default_api
+    with _default_api_lock:
+        if _default_api is None:
+            cache_path = os.environ.get('FOOD_API_CACHE', DEFAULT_CACHE_PATH)
+            fixture_mode = os.environ.get('FOOD_API_FIXTURES', 'off').strip().lower() or 'off'
+            if fixture_mode not in FIXTURE_MODES:
+                # Kontrolleras en gång här - ett ValueError skulle annars komma vid varje anrop
+                print(f"⚠️ FOOD_API_FIXTURES='{fixture_mode}' är ogiltigt (välj {', '.join(FIXTURE_MODES)}) "
+                      f"- kör utan fixtures")
+                fixture_mode = 'off'
+            mirror_path = os.environ.get('FOOD_API_MIRROR', '')
+            _default_api = FoodAPI(
+                openfoodfacts_url=os.environ.get('OPENFOODFACTS_URL', OPENFOODFACTS_URL),
+                themealdb_url=os.environ.get('THEMEALDB_URL', THEMEALDB_URL),
+                cache=ResponseCache(cache_path) if cache_path else None,
+                fixtures=FixtureStore(os.environ.get('FOOD_API_FIXTURE_DIR', DEFAULT_FIXTURE_DIR), fixture_mode),
+                mirror=OpenFoodFactsMirror(mirror_path) if mirror_path and os.path.exists(mirror_path) else None
+            )
+        return _default_api
+
+def is_recipe_like(meal: Dict[str, Any]) -> bool:
+    """Sant om beskrivningen verkar vara instruktioner eller recept"""
+    desc = meal.get('description', '').lower()
+    recipe_indicators = ['step', 'cook for', 'preheat', 'mix in', 'add the', 'heat the', 'bake for', 'fry for']
+    return any(indicator in desc for indicator in recipe_indicators)
+
+def search_food_ingredients(search_term: str = "pasta", page_size: int = 10) -> List[Dict[str, Any]]:
     """
     Sök livsmedel från Open Food Facts (ENDAST PRODUKTER - INGA RECEPT)
     Huvudfunktion för att hämta extern data enligt kurskrav
     """
-    api = FoodAPI()
+    api = get_default_api()
     
     # Hämta produkter från Open Food Facts
-    result = api.search_food_products(search_term, page_size=10)
+    result = api.search_food_products(search_term, page_size=page_size)
     
     if "error" in result or not result.get('products'):
         return []
@@ -436,25 +731,25 @@ def search_food_ingredients(search_term: str = "pasta") -> List[Dict[str, Any]]:
     meals = api.convert_openfoodfacts_to_local(result)
     
     # Extra filter för att garantera att inga recept kommer med
-    product_meals = []
-    for meal in meals:
-        desc = meal.get('description', '').lower()
-        name = meal.get('name', '').lower()
-        
-        # Skippa om det verkar vara instruktioner eller recept
-        recipe_indicators = ['step', 'cook for', 'preheat', 'mix in', 'add the', 'heat the', 'bake for', 'fry for']
-        is_recipe = any(indicator in desc for indicator in recipe_indicators)
-        
-        if not is_recipe:
-            product_meals.append(meal)
+    return [meal for meal in meals if not is_recipe_like(meal)]
+
+def iter_food_ingredients(search_term: str, page_size: int = 50, limit: Optional[int] = None,
+                          deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Som search_food_ingredients men över alla resultatsidor, lat och med förhämtning
+    """
+    api = get_default_api()
     
-    return product_meals
+    for product in api.iter_search_products(search_term, page_size, limit, deadline):
+        for meal in api.convert_openfoodfacts_to_local({"products": [product]}):
+            if not is_recipe_like(meal):
+                yield meal
 
 def fetch_random_recipes(count: int = 3) -> List[Dict[str, Any]]:
     """
     Hämta slumpmässiga recept från TheMealDB som komplement
     """
-    api = FoodAPI()
+    api = get_default_api()
     
     # Hämta recept från TheMealDB
     result = api.get_random_meals_themealdb(count)
@@ -469,10 +764,21 @@ def get_product_info_by_barcode(barcode: str) -> Dict[str, Any]:
     """
     Hämta detaljerad produktinformation via streckkod
     """
-    api = FoodAPI()
+    api = get_default_api()
     
     result = api.get_product_by_barcode(barcode)
+    return _product_info(result)
+
+def get_products_info_by_barcodes(barcodes: List[str], max_workers: int = 8) -> Dict[str, Dict[str, Any]]:
+    """
+    Hämta produktinformation för en hel lista streckkoder parallellt
+    """
+    api = get_default_api()
     
+    results = api.get_products_by_barcodes(barcodes, max_workers=max_workers)
+    return {barcode: _product_info(result) for barcode, result in results.items()}
+
+def _product_info(result: Dict[str, Any]) -> Dict[str, Any]:
     if "error" in result:
         return result
     
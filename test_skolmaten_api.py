@@ -2,136 +2,124 @@
 """
 Test av Skolmaten.se API integration
 Verifierar att API-anropen fungerar och data kan importeras
+
+Körs mot inspelade svar i fixtures/food_api/ (ingen internetanslutning behövs).
+FOOD_API_FIXTURES=record spelar in nya svar, FOOD_API_FIXTURES=off kör mot
+det riktiga API:et.
 """
 
 import sys
 import os
+import tempfile
+from contextlib import contextmanager
 
 # Lägg till projektets root-katalog till Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from skolmaten_api import FoodAPI, search_food_ingredients
+import skolmaten_api
+from food_api_fixtures import DEFAULT_FIXTURE_DIR, FixtureStore
+from skolmaten_api import FoodAPI, OPENFOODFACTS_URL, THEMEALDB_URL, search_food_ingredients
 from lunch_system_database import SchoolLunchDB
 
+FIXTURE_MODE = os.environ.get('FOOD_API_FIXTURES', 'replay')
+
+@contextmanager
+def fixture_api():
+    """Byt den delade FoodAPI:n mot en som spelar upp (eller in) svaren i fixtures/food_api/"""
+    api = FoodAPI(
+        openfoodfacts_url=os.environ.get('OPENFOODFACTS_URL', OPENFOODFACTS_URL),
+        themealdb_url=os.environ.get('THEMEALDB_URL', THEMEALDB_URL),
+        fixtures=FixtureStore(os.environ.get('FOOD_API_FIXTURE_DIR', DEFAULT_FIXTURE_DIR), FIXTURE_MODE)
+    )
+    previous, skolmaten_api._default_api = skolmaten_api._default_api, api
+    try:
+        yield api
+    finally:
+        skolmaten_api._default_api = previous
+
 def test_api_connection():
     """Test grundläggande API-anslutning till Open Food Facts"""
     print("🔗 Testar API-anslutning till Open Food Facts...")
-    
-    try:
-        api = FoodAPI()
+
+    with fixture_api() as api:
         result = api.search_food_products("pasta", page_size=3)
-        
-        if "error" in result:
-            print(f"❌ API-fel: {result['error']}")
-            return False
-        
-        products = result.get('products', [])
-        print(f"✅ Hittade {len(products)} produkter för 'pasta'")
-        
-        if products:
-            first_product = products[0]
-            print(f"   Första produkten: {first_product.get('product_name', 'Okänt namn')}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Anslutningsfel: {e}")
-        return False
+
+    assert "error" not in result, f"API-fel: {result.get('error')}"
+    products = result.get('products', [])
+    assert products, "Inga produkter för 'pasta'"
+    print(f"✅ Hittade {len(products)} produkter för 'pasta'")
+    print(f"   Första produkten: {products[0].get('product_name', 'Okänt namn')}")
 
 def test_food_search():
     """Test hämtning av livsmedel"""
     print("\n🍽️  Testar sökning av livsmedel...")
-    
-    try:
+
+    with fixture_api():
         meals = search_food_ingredients("chicken")
-        
-        if not meals:
-            print("❌ Inga livsmedel kunde hämtas")
-            return False
-        
-        print(f"✅ Hämtade {len(meals)} livsmedel")
-        
-        # Visa första 3 produkter
-        for i, meal in enumerate(meals[:3], 1):
-            nutrition = meal.get('nutrition_grade', 'N/A')
-            print(f"   {i}. {meal['name']} - {meal['price']}kr ({meal['category']}) [Näring: {nutrition}]")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Fel vid hämtning: {e}")
-        return False
+
+    assert meals, "Inga livsmedel kunde hämtas"
+    print(f"✅ Hämtade {len(meals)} livsmedel")
+
+    # Visa första 3 produkter
+    for i, meal in enumerate(meals[:3], 1):
+        nutrition = meal.get('nutrition_grade', 'N/A')
+        print(f"   {i}. {meal['name']} - {meal['price']}kr ({meal['category']}) [Näring: {nutrition}]")
 
 def test_database_import():
     """Test import till databas"""
     print("\n💾 Testar import till databas...")
-    
-    try:
-        # Kontrollera om databas finns
-        if not os.path.exists('test.db'):
-            print("❌ Ingen test.db hittades. Kör 'python create_sample_database.py' först")
-            return False
-        
-        # Skapa databasanslutning
-        db = SchoolLunchDB('test.db')
-        
-        # Räkna måltider före import
-        meals_before = db.get_all_meals()
-        count_before = len(meals_before) if meals_before else 0
-        
+
+    # En tillfällig databas - testet ska inte ändra test.db
+    with tempfile.TemporaryDirectory() as workdir, fixture_api():
+        db = SchoolLunchDB(os.path.join(workdir, 'import.db'))
+        count_before = len(db.get_all_meals() or [])
+
         # Importera från Open Food Facts
         result = db.import_meals_from_openfoodfacts("pasta")
-        
-        if "error" in result:
-            print(f"❌ Import-fel: {result['error']}")
-            return False
-        
-        # Räkna måltider efter import  
-        meals_after = db.get_all_meals()
-        count_after = len(meals_after) if meals_after else 0
-        
-        print(f"✅ Import slutförd!")
-        print(f"   Sökterm: {result.get('search_term', 'pasta')}")
-        print(f"   Källor: {result.get('sources', 'API')}")
-        print(f"   Måltider före: {count_before}")
-        print(f"   Måltider efter: {count_after}")
-        print(f"   Nya måltider: {result.get('added', 0)}")
-        print(f"   Hoppade över: {result.get('skipped', 0)}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Databasfel: {e}")
-        return False
+        count_after = len(db.get_all_meals() or [])
+        db.db.close()
+
+    assert "error" not in result, f"Import-fel: {result.get('error')}"
+    assert result.get('added', 0) > 0 and count_after == count_before + result['added'], result
+    print(f"✅ Import slutförd!")
+    print(f"   Sökterm: {result.get('search_term', 'pasta')}")
+    print(f"   Källor: {result.get('sources', 'API')}")
+    print(f"   Måltider före: {count_before}")
+    print(f"   Måltider efter: {count_after}")
+    print(f"   Nya måltider: {result.get('added', 0)}")
+    print(f"   Hoppade över: {result.get('skipped', 0)}")
 
 def main():
     """Huvudfunktion för tester"""
     print("🧪 TESTAR OPEN FOOD FACTS API INTEGRATION")
+    print(f"   Fixtures: {FIXTURE_MODE}")
     print("=" * 50)
-    
+
     tests = [
         ("API-anslutning", test_api_connection),
         ("Livsmedels-sökning", test_food_search),
         ("Databas-import", test_database_import)
     ]
-    
+
     passed = 0
     total = len(tests)
-    
+
     for test_name, test_func in tests:
         print(f"\n📋 Test: {test_name}")
-        if test_func():
+        try:
+            test_func()
             passed += 1
-        else:
+        except Exception as e:
+            print(f"❌ {e}")
             print(f"💥 Test '{test_name}' misslyckades")
-    
+
     print(f"\n📊 RESULTAT: {passed}/{total} tester lyckades")
-    
+
     if passed == total:
         print("🎉 Alla tester lyckades! API:et är redo att användas.")
     else:
-        print("⚠️  Vissa tester misslyckades. Kontrollera internetanslutning och beroenden.")
-    
+        print("⚠️  Vissa tester misslyckades. Saknas fixtures? Spela in med FOOD_API_FIXTURES=record.")
+
     return passed == total
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-call latency of FoodAPI with a fresh connection per call
+versus the shared keep-alive session, against the local stub server
+"""
+
+import os
+import sys
+import time
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from food_api_stub_server import StubServer
+from skolmaten_api import FoodAPI
+from upstream_resilience import UpstreamGuard
+
+
+class FreshConnectionSession(requests.Session):
+    """Behaves like the old module-level requests.get: new connection every call"""
+
+    def get(self, url, **kwargs):
+        with requests.Session() as session:
+            return session.get(url, **kwargs)
+
+
+def time_calls(api: FoodAPI, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        api.get_product_by_barcode(str(1000 + i))
+    return (time.perf_counter() - started) / calls * 1000
+
+
+def main() -> None:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+    print("⏱️  FoodAPI per-call latency against local stub")
+    print("=" * 50)
+
+    with StubServer() as server:
+        # No rate limit - we want raw connection cost
+        fresh_api = FoodAPI(server.openfoodfacts_url, server.themealdb_url, session=FreshConnectionSession(),
+                            guard=UpstreamGuard(rate_per_second=None))
+        pooled_api = FoodAPI(server.openfoodfacts_url, server.themealdb_url,
+                             guard=UpstreamGuard(rate_per_second=None))
+
+        # Warm up both paths
+        time_calls(fresh_api, 10)
+        time_calls(pooled_api, 10)
+
+        fresh_ms = time_calls(fresh_api, calls)
+        pooled_ms = time_calls(pooled_api, calls)
+
+    print(f"   Fresh connection per call: {fresh_ms:.2f} ms/call")
+    print(f"   Shared keep-alive session: {pooled_ms:.2f} ms/call")
+    print(f"   Speed-up: {fresh_ms / pooled_ms:.1f}x ({calls} calls)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Offline, reproducible benchmark of the Open Food Facts import path
+
+Starts the local stand-in server, points the shared FoodAPI at it and
+imports a list of search terms into a temporary database, one term at a
+time or (--parallel) all terms at once via SchoolLunchDB.import_search_terms.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from food_api_stub_server import StubServer
+
+DEFAULT_TERMS = ["pasta", "chicken", "fish", "beef", "soup", "vegan", "dessert", "cheese", "bread", "organic"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Offline import throughput benchmark')
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub latency per request (seconds)')
+    parser.add_argument('--products', type=int, default=2000, help='Synthetic catalog size')
+    parser.add_argument('--limit', type=int, default=10, help='Products per term (0 = all result pages)')
+    parser.add_argument('--fixtures', default=None, help='Serve recorded fixtures from this directory')
+    parser.add_argument('--parallel', action='store_true', help='Import all terms concurrently in one run')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent terms with --parallel')
+    parser.add_argument('terms', nargs='*', default=DEFAULT_TERMS, help='Search terms to import')
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency, seed=1, product_count=args.products,
+                    fixture_dir=args.fixtures) as server, tempfile.TemporaryDirectory() as workdir:
+        # Must be set before the shared FoodAPI is created
+        os.environ['OPENFOODFACTS_URL'] = server.openfoodfacts_url
+        os.environ['THEMEALDB_URL'] = server.themealdb_url
+        os.environ['FOOD_API_CACHE'] = ''
+
+        from lunch_system_database import SchoolLunchDB
+        from skolmaten_api import get_default_api
+        get_default_api().guard.rate_per_second = None
+
+        db = SchoolLunchDB(os.path.join(workdir, 'benchmark.db'))
+
+        print(f"⏱️  Importing {len(args.terms)} terms (stub latency {args.latency * 1000:.0f} ms)")
+        print("=" * 50)
+        started = time.perf_counter()
+        added = 0
+        if args.parallel:
+            result = db.import_search_terms(args.terms, limit=args.limit or None, max_workers=args.workers)
+            added = result.get('added', 0)
+            for term, stats in result.get('terms', {}).items():
+                print(f"   {term:<10} +{stats['added']:<4} ({stats['skipped']} skipped)")
+        else:
+            for term in args.terms:
+                term_started = time.perf_counter()
+                result = db.import_meals_from_openfoodfacts(term, limit=args.limit or None)
+                added += result.get('added', 0)
+                print(f"   {term:<10} +{result.get('added', 0):<4} {time.perf_counter() - term_started:.3f}s")
+        elapsed = time.perf_counter() - started
+
+        print(f"\n📊 {added} meals in {elapsed:.2f}s ({added / elapsed:.1f} meals/s, "
+              f"{server.request_count} upstream requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark logins per second at "8:00" load: the old lookup (new connection
+plus LOWER(name) scan per attempt) vs the indexed lookup through the shared
+connection, with and without the name cache, and full POST /login requests
+from several threads
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web_interface'))
+
+import flask_test_env  # Servern pekas mot en temporär databas, inte test.db
+import flask_server
+from lunch_system_database import SchoolLunchDB
+
+
+def legacy_lookup(db_path: str, username: str):
+    """The lookup as it was: a fresh connection and a LOWER() scan per login"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT id, name FROM students WHERE LOWER(name) = LOWER(?)", (username,)).fetchone()
+    finally:
+        conn.close()
+
+
+def rate(label: str, count: int, work) -> None:
+    started = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - started
+    print(f"   {label:<28} {count / elapsed:10.0f} logins/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Login throughput benchmark')
+    parser.add_argument('--students', type=int, default=5000, help='Students in the school')
+    parser.add_argument('--logins', type=int, default=5000, help='Login attempts per case')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent clients for POST /login')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'benchmark.db')
+        db = SchoolLunchDB(db_path, journal_mode='WAL')
+        with db.db.transaction():
+            for index in range(args.students):
+                db.add_student({"name": f"Elev {index:05d} Svensson", "grade": str(7 + index % 3)})
+        rng = random.Random(1)
+        names = [f"elev {rng.randrange(args.students):05d} SVENSSON" for _ in range(args.logins)]
+
+        print(f"🔐 {args.logins} logins among {args.students} students")
+        print("=" * 50)
+        rate("Old: connect + LOWER() scan", len(names), lambda: [legacy_lookup(db_path, name) for name in names])
+
+        def uncached():
+            for name in names:
+                db._clear_student_cache()
+                db.find_student_by_name(name)
+        rate("Indexed, no cache", len(names), uncached)
+        rate("Indexed + name cache", len(names), lambda: [db.find_student_by_name(name) for name in names])
+
+        def post_logins(chunk):
+            client = flask_server.app.test_client()
+            for name in chunk:
+                client.post('/login', data={'username': name})
+
+        chunks = [names[index::args.threads] for index in range(args.threads)]
+
+        def concurrent():
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                list(pool.map(post_logins, chunks))
+
+        with flask_test_env.serving(db=db):
+            flask_server.app.config['TESTING'] = True
+            rate(f"POST /login, {args.threads} threads", len(names), concurrent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/meals on a large catalog: the full array vs the first page
+of the paginated API, uncompressed and gzip, cold and from the version cache
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web_interface'))
+
+import flask_test_env  # Servern pekas mot en temporär databas, inte test.db
+from lunch_system_database import SchoolLunchDB
+
+
+def timed(client, url: str, headers=None):
+    started = time.perf_counter()
+    response = client.get(url, headers=headers or {})
+    return time.perf_counter() - started, len(response.data)
+
+
+def run_cases(client, page_size: int) -> None:
+    gzip_header = {'Accept-Encoding': 'gzip'}
+    page_url = f'/api/meals?limit={page_size}'
+    cases = [
+        ("Full list, cold", '/api/meals', None),
+        ("Full list, cached", '/api/meals', None),
+        ("Full list, gzip", '/api/meals', gzip_header),
+        ("First page, cold", page_url, None),
+        ("First page, gzip", page_url, gzip_header),
+        ("Next page (cursor)", None, None),
+    ]
+
+    print("=" * 50)
+    for label, url, headers in cases:
+        if url is None:
+            cursor = client.get(page_url).json['next_cursor']
+            url = f'{page_url}&cursor={cursor}'
+        elapsed, size = timed(client, url, headers)
+        print(f"   {label:<20} {elapsed * 1000:8.1f} ms {size / 1024:10.1f} KiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='/api/meals first paint benchmark')
+    parser.add_argument('--meals', type=int, default=50000, help='Catalog size')
+    parser.add_argument('--page-size', type=int, default=30, help='Meals per page (dashboard uses 30)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        lunch_db = SchoolLunchDB(os.path.join(workdir, 'benchmark.db'), journal_mode='WAL')
+        print(f"🍽️  Creating {args.meals} meals...")
+        lunch_db.add_meals_bulk([{
+            "name": f"Maträtt {index:06d}",
+            "description": "Pasta (vete) med tomatsås, basilika och riven parmesan (mjölk)",
+            "price": 30.0 + index % 60,
+            "category": ["Pasta", "Soppa", "Kött", "Vegetariskt"][index % 4]
+        } for index in range(args.meals)])
+
+        with flask_test_env.serving(db=lunch_db) as client:
+            with client.session_transaction() as session:
+                session['username'] = 'Benchmark'
+            run_cases(client, args.page_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark orders per second during the lunch rush: one INSERT and commit per
+order (the old /api/order path) vs group commit through OrderBatcher, from
+many threads, with and without idempotency keys, and full POST /api/order
+requests
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web_interface'))
+
+import flask_test_env  # Servern pekas mot en temporär databas, inte test.db
+import flask_server
+from lunch_system_database import SchoolLunchDB
+from order_batcher import OrderBatcher
+
+
+def make_db(path: str, students: int) -> SchoolLunchDB:
+    lunch_db = SchoolLunchDB(path, journal_mode="WAL")  # Som webbservern
+    lunch_db.add_meals_bulk([{"name": f"Rätt {index}", "price": 45.0, "category": "Lunch"} for index in range(10)])
+    with lunch_db.db.transaction():
+        for index in range(students):
+            lunch_db.add_student({"name": f"Elev {index:05d}"})
+    return lunch_db
+
+
+def rate(label: str, count: int, threads: int, order) -> None:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(order, range(count)))
+    elapsed = time.perf_counter() - started
+    print(f"   {label:<34} {count / elapsed:10.0f} orders/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Order throughput benchmark')
+    parser.add_argument('--orders', type=int, default=3000, help='Orders per case')
+    parser.add_argument('--threads', type=int, default=32, help='Concurrent request threads')
+    parser.add_argument('--students', type=int, default=500, help='Students in the school')
+    parser.add_argument('--batch-size', type=int, default=64, help='OrderBatcher max_batch_size')
+    parser.add_argument('--max-wait-ms', type=float, default=5, help='OrderBatcher max_wait in milliseconds')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        lunch_db = make_db(os.path.join(workdir, 'benchmark.db'), args.students)
+        today = "2026-10-19"
+
+        def student(index):
+            return 1 + index % args.students
+
+        print(f"🍽️  {args.orders} orders from {args.threads} threads "
+              f"(batch size {args.batch_size}, max wait {args.max_wait_ms} ms)")
+        print("=" * 60)
+        rate("Old: commit per order", args.orders, args.threads,
+             lambda index: lunch_db.record_transaction(student(index), 1 + index % 10, today))
+        rate("Old: commit per order + key", args.orders, args.threads,
+             lambda index: lunch_db.record_transaction_once(student(index), 1 + index % 10, today, uuid.uuid4().hex))
+
+        batcher = OrderBatcher(lunch_db, max_batch_size=args.batch_size, max_wait=args.max_wait_ms / 1000)
+        rate("Group commit", args.orders, args.threads,
+             lambda index: batcher.submit(student(index), 1 + index % 10, today))
+        rate("Group commit + key", args.orders, args.threads,
+             lambda index: batcher.submit(student(index), 1 + index % 10, today, uuid.uuid4().hex))
+        stats = batcher.stats()
+        batcher.close()
+        print(f"   ({stats['batches']} batches, average {stats['average_batch']}, largest {stats['largest_batch']})")
+
+        def post_order(index):
+            client = flask_server.app.test_client()
+            with client.session_transaction() as session:
+                session['username'] = 'Benchmark'
+                session['student_id'] = student(index)
+            client.post('/api/order', json={'meal_id': 1 + index % 10}, headers={'Idempotency-Key': uuid.uuid4().hex})
+
+        # Det gamla flödet, som /api/order var innan batchern
+        class DirectOrders:
+            def submit(self, student_id, meal_id, date, idempotency_key=None):
+                transaction, replayed = lunch_db.record_transaction_once(student_id, meal_id, date, idempotency_key)
+                return {"transaction_id": transaction['id'], "student_id": transaction['student_id'],
+                        "meal_id": transaction['meal_id'], "replayed": replayed}
+
+        flask_server.app.config['TESTING'] = True
+        with flask_test_env.serving(db=lunch_db, order_batcher=DirectOrders()):
+            rate("POST /api/order, old", args.orders, args.threads, post_order)
+        web_batcher = OrderBatcher(lunch_db, max_batch_size=args.batch_size, max_wait=args.max_wait_ms / 1000)
+        with flask_test_env.serving(db=lunch_db, order_batcher=web_batcher):
+            rate("POST /api/order, group commit", args.orders, args.threads, post_order)
+        web_batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Shared pytest fixtures: the project root on sys.path and temp databases
+that never touch the repo's test.db
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, 'web_interface')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from lunch_system_database import SchoolLunchDB
+
+
+@pytest.fixture
+def make_lunch_db(tmp_path):
+    """
+    Factory for SchoolLunchDB files in the test's temp directory
+
+    make_lunch_db(name="lunch.db", meals=0, students=0, journal_mode=None):
+    meals is a count ("Rätt 0", "Rätt 1", ... at 40 kr) or a list of meal
+    dicts, students a count ("Elev 0", "Elev 1", ...)
+    """
+    opened = []
+
+    def make(name: str = "lunch.db", meals=0, students: int = 0, journal_mode=None) -> SchoolLunchDB:
+        lunch_db = SchoolLunchDB(os.path.join(tmp_path, name), journal_mode=journal_mode)
+        if isinstance(meals, int):
+            meals = [{"name": f"Rätt {index}", "price": 40.0, "category": "Test"} for index in range(meals)]
+        if meals:
+            lunch_db.add_meals_bulk(meals)
+        for index in range(students):
+            lunch_db.add_student({"name": f"Elev {index}"})
+        opened.append(lunch_db)
+        return lunch_db
+
+    yield make
+    for lunch_db in opened:
+        lunch_db.db.close()
@@ -0,0 +1,36 @@
+"""
+Throwaway environment for tests that use flask_server: importing this module
+points the server's database and rating spool at a temp directory (never the
+repo's test.db), and serving() swaps module globals for one block and puts
+them back afterwards
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+
+TEST_DIR = tempfile.mkdtemp(prefix="lunch-flask-test-")
+atexit.register(shutil.rmtree, TEST_DIR, True)
+os.environ["LUNCH_DB_PATH"] = os.path.join(TEST_DIR, "test.db")
+os.environ["RATING_SPOOL_PATH"] = os.path.join(TEST_DIR, "ratings.spool")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web_interface'))
+
+import flask_server
+
+
+@contextmanager
+def serving(**replacements):
+    """Swap flask_server globals (db, rating_buffer, order_batcher) and yield a test client"""
+    saved = {name: getattr(flask_server, name) for name in replacements}
+    for name, value in replacements.items():
+        setattr(flask_server, name, value)
+    try:
+        yield flask_server.app.test_client()
+    finally:
+        for name, value in saved.items():
+            setattr(flask_server, name, value)
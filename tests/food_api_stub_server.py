@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Open Food Facts and TheMealDB endpoints used by FoodAPI
+
+Mimics cgi/search.pl (search terms + paging), api/v0/product/<code>.json,
+random.php and TheMealDB's catalog endpoints (search.php?f=, categories.php,
+filter.php?c=, lookup.php?i=) over a deterministic synthetic catalog, with
+configurable latency and error rate. With a fixture directory it serves recorded responses
+(see food_api_fixtures.py) before falling back to the synthetic catalog.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, parse_qsl, urlparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from food_api_fixtures import FixtureMissing, FixtureStore
+
+PRODUCT_TEMPLATES = [
+    ("Spaghetti", "Pasta, Dry pasta", "Durum wheat semolina, water"),
+    ("Kycklingfilé", "Chicken, Poultry, Meats", "Kyckling 98%, salt"),
+    ("Laxfilé", "Fish, Seafood, Salmon", "Lax (fisk) 100%"),
+    ("Nötfärs", "Meat, Beef", "Nötkött 100%"),
+    ("Tomatsoppa", "Soups, Tomato soup", "Tomater, vatten, grädde (mjölk), salt"),
+    ("Vegansk burgare", "Vegan, Vegetarian, Meat alternatives", "Sojaprotein, vatten, rapsolja"),
+    ("Chokladpudding", "Desserts, Sweet snacks", "Mjölk, socker, kakao, majsstärkelse"),
+    ("Präst ost", "Cheese, Dairy", "Pastöriserad mjölk, salt, ostkultur"),
+    ("Fullkornsbröd", "Bread, Cereals", "Vetemjöl, rågmjöl, vatten, jäst, salt"),
+    ("Ekologiska morötter", "Organic, Vegetables", "Morötter"),
+]
+
+MEAL_TEMPLATES = [
+    ("Teriyaki Chicken Casserole", "Chicken", "Japanese"),
+    ("Spaghetti Bolognese", "Beef", "Italian"),
+    ("Baked Salmon with Fennel", "Seafood", "British"),
+    ("Vegetable Lasagne", "Vegetarian", "Italian"),
+    ("Apple Frangipan Tart", "Dessert", "British"),
+    ("Lamb Tagine", "Lamb", "Moroccan"),
+    ("Pork Cassoulet", "Pork", "French"),
+    ("Chickpea Fajitas", "Vegan", "Mexican"),
+]
+
+
+def build_products(count: int) -> List[Dict[str, Any]]:
+    products = []
+    for index in range(count):
+        name, categories, ingredients = PRODUCT_TEMPLATES[index % len(PRODUCT_TEMPLATES)]
+        products.append({
+            "code": str(7300000000000 + index),
+            "product_name": f"{name} {index}",
+            "brands": f"Stub {index % 7}",
+            "categories": categories,
+            "ingredients_text": ingredients,
+            "allergens": "",
+            "nutrition_grades": "abcde"[index % 5],
+            "energy_100g": 200 + (index * 37) % 1800,
+            "proteins_100g": (index * 7) % 30,
+            "last_modified_t": 1700000000 + index
+        })
+    return products
+
+
+def build_meals(count: int) -> List[Dict[str, Any]]:
+    meals = []
+    for index in range(count):
+        name, category, area = MEAL_TEMPLATES[index % len(MEAL_TEMPLATES)]
+        meal = {
+            "idMeal": str(52000 + index),
+            "strMeal": f"{name} {index}" if index >= len(MEAL_TEMPLATES) else name,
+            "strCategory": category,
+            "strArea": area,
+            "strInstructions": "Preheat oven to 180 degrees. Cook for 30 minutes.",
+        }
+        for number in range(1, 21):
+            meal[f"strIngredient{number}"] = f"ingredient {number}" if number <= 3 + index % 15 else ""
+        meals.append(meal)
+    return meals
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def setup(self) -> None:
+        # One handler per TCP connection; keep-alive requests reuse it
+        super().setup()
+        with self.server.lock:
+            self.server.connection_count += 1
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+        # Fault injection: configurable latency and error rate
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and server.random.random() < server.error_rate:
+            self._send_json(server.error_status, {"error": "injected fault"})
+            return
+
+        parsed = urlparse(self.path)
+
+        if server.fixtures:
+            try:
+                self._send_json(200, server.fixtures.load(parsed.path, dict(parse_qsl(parsed.query))))
+                return
+            except FixtureMissing:
+                pass
+
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+
+        if parsed.path.endswith("/cgi/search.pl"):
+            self._send_json(200, self._search(params))
+        elif "/api/v0/product/" in parsed.path:
+            barcode = parsed.path.rsplit("/", 1)[-1].replace(".json", "")
+            product = server.products_by_code.get(barcode)
+            if product:
+                self._send_json(200, {"code": barcode, "status": 1, "product": product})
+            else:
+                self._send_json(200, {"code": barcode, "status": 0, "status_verbose": "product not found"})
+        elif parsed.path.endswith("/random.php"):
+            with server.lock:
+                meal = server.random.choice(server.meals)
+            self._send_json(200, {"meals": [meal]})
+        elif parsed.path.endswith("/search.php"):
+            letter = params.get("f", "").lower()
+            meals = [meal for meal in server.meals if meal["strMeal"].lower().startswith(letter)] if letter else []
+            self._send_json(200, {"meals": meals or None})
+        elif parsed.path.endswith("/categories.php"):
+            categories = sorted({meal["strCategory"] for meal in server.meals})
+            self._send_json(200, {"categories": [{"idCategory": str(index + 1), "strCategory": category}
+                                                 for index, category in enumerate(categories)]})
+        elif parsed.path.endswith("/filter.php"):
+            meals = [{"idMeal": meal["idMeal"], "strMeal": meal["strMeal"]}
+                     for meal in server.meals if meal["strCategory"] == params.get("c")]
+            self._send_json(200, {"meals": meals or None})
+        elif parsed.path.endswith("/lookup.php"):
+            meal = server.meals_by_id.get(params.get("i", ""))
+            self._send_json(200, {"meals": [meal] if meal else None})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _search(self, params: Dict[str, str]) -> Dict[str, Any]:
+        term = params.get("search_terms", "").lower()
+        page = max(1, int(params.get("page", "1")))
+        page_size = max(1, int(params.get("page_size", "24")))
+        matches = [product for product in self.server.products
+                   if term in product["product_name"].lower() or term in product["categories"].lower()]
+        start = (page - 1) * page_size
+        return {"count": len(matches), "page": page, "page_size": page_size,
+                "products": matches[start:start + page_size]}
+
+
+class StubServer:
+    """Runs the stub on a background thread; use as a context manager"""
+
+    def __init__(self, port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, seed: Optional[int] = None, product_count: int = 500,
+                 meal_count: int = 40, fixture_dir: Optional[str] = None) -> None:
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.request_count = 0
+        self.httpd.connection_count = 0
+        self.httpd.random = random.Random(seed)
+        self.httpd.products = build_products(product_count)
+        self.httpd.products_by_code = {product["code"]: product for product in self.httpd.products}
+        self.httpd.meals = build_meals(meal_count)
+        self.httpd.meals_by_id = {meal["idMeal"]: meal for meal in self.httpd.meals}
+        self.httpd.fixtures = FixtureStore(fixture_dir, "replay") if fixture_dir else None
+        self.configure(latency, error_rate, error_status)
+        self._thread: Optional[threading.Thread] = None
+
+    def configure(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503) -> None:
+        """Change the injected faults while the server is running"""
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.error_status = error_status
+
+    @property
+    def request_count(self) -> int:
+        return self.httpd.request_count
+
+    @property
+    def connection_count(self) -> int:
+        return self.httpd.connection_count
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    @property
+    def openfoodfacts_url(self) -> str:
+        return self.base_url
+
+    @property
+    def themealdb_url(self) -> str:
+        return f"{self.base_url}/api/json/v1/1"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Local stand-in for the food APIs')
+    parser.add_argument('--port', '-p', type=int, default=8099, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of delay per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    parser.add_argument('--products', type=int, default=500, help='Size of the synthetic product catalog')
+    parser.add_argument('--fixtures', default=None, help='Serve recorded fixtures from this directory first')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for faults and random.php')
+
+    args = parser.parse_args()
+    server = StubServer(args.port, latency=args.latency, error_rate=args.error_rate, seed=args.seed,
+                        product_count=args.products, fixture_dir=args.fixtures)
+    print(f"🧪 Stub food API on {server.base_url} (Ctrl+C to stop)")
+    print(f"   OPENFOODFACTS_URL={server.openfoodfacts_url} THEMEALDB_URL={server.themealdb_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test allergen tagging: the lexicon on Swedish/English ingredient text,
+tags stored by add_meal/add_meals_bulk/update_meal, filter queries and
+backfill of databases created before the meal_allergens table
+"""
+
+import os
+import sqlite3
+
+from allergen_tagging import DEFAULT_TAGGER, parse_allergen_list
+
+
+def test_lexicon():
+    cases = {
+        "Lasagneplattor (vete), tomatsås, mozzarella (mjölk)": ["gluten", "milk"],
+        "Räkor, sojasås (soja, vete), sesamfrön": ["gluten", "sesame", "shellfish", "soy"],
+        "jordnötter, hasselnötter": ["nuts", "peanuts"],
+        "en:milk,en:eggs,en:fish": ["egg", "fish", "milk"],
+        # Sammansatta ord som inte är allergenet de innehåller
+        "Nötfärs 100%": [],
+        "kokosmjölk, bovete, muskotnöt": [],
+        "havremjölk": ["gluten"],
+        "Eggplant and goats cheese": ["milk"],
+    }
+    for text, expected in cases.items():
+        assert DEFAULT_TAGGER.tag(text) == expected, (text, DEFAULT_TAGGER.tag(text))
+    assert parse_allergen_list("milk, Gluten,okänt,") == ["milk", "gluten"]
+
+
+def test_tags_stored_and_filtered(make_lunch_db):
+    db = make_lunch_db("allergens.db")
+    lasagne = db.add_meal({"name": "Lasagne", "description": "Lasagneplattor (vete), mozzarella (mjölk)",
+                           "price": 45.0})
+    salmon, salad = db.add_meals_bulk([
+        {"name": "Laxfilé", "description": "Med potatis", "price": 55.0,
+         "ingredients": "Lax (fisk), salt", "allergens": "en:fish"},
+        {"name": "Grönsallad", "description": "Sallad, gurka, tomat", "price": 30.0},
+    ])
+    stored_columns = [row[1] for row in db.db.execute("PRAGMA table_info(meals)")]
+
+    assert db.get_meal_allergens(lasagne) == ["gluten", "milk"]
+    assert db.get_meal_allergens(salmon) == ["fish"]
+    assert db.get_meal_allergens(salad) == []
+    assert "ingredients" in stored_columns and "source_allergens" in stored_columns
+    assert "allergens" not in stored_columns
+    assert [row["name"] for row in db.get_meals_free_from(["milk", "fish"])] == ["Grönsallad"]
+    assert [row["name"] for row in db.get_meals_with_allergen("fish")] == ["Laxfilé"]
+    assert db.get_allergens_by_meal() == {lasagne: ["gluten", "milk"], salmon: ["fish"]}
+
+    # Ny beskrivning -> nya taggar; pris påverkar inte
+    db.update_meal(salad, {"description": "Sallad med fetaost och valnötter"})
+    db.update_meal(lasagne, {"price": 49.0})
+    assert db.get_meal_allergens(salad) == ["milk", "nuts"]
+    assert db.get_meal_allergens(lasagne) == ["gluten", "milk"]
+    plan = " ".join(row[3] for row in db.db.execute(
+        "EXPLAIN QUERY PLAN SELECT meal_id FROM meal_allergens WHERE allergen = 'milk'"))
+    assert "idx_meal_allergens_allergen" in plan or "COVERING INDEX" in plan, plan
+
+
+def test_existing_database_is_backfilled(make_lunch_db):
+    lunch_db = make_lunch_db("old.db")
+    lunch_db.add_meal({"name": "Pannkakor", "description": "Mjölk, ägg, vetemjöl", "price": 25.0})
+    conn = sqlite3.connect(lunch_db.db.db_path)
+    conn.execute("DROP TABLE meal_allergens")
+    conn.commit()
+    conn.close()
+
+    reopened = make_lunch_db("old.db")
+    assert reopened.get_allergens_by_meal() == {1: ["egg", "gluten", "milk"]}
+
+
+def test_retag_keeps_ingredient_and_upstream_tags(make_lunch_db):
+    db = make_lunch_db("allergens.db")
+    gratin = db.add_meal({"name": "Potatisgratäng", "description": "Klassisk", "price": 40.0,
+                          "ingredients": "Potatis, grädde, mjölk", "allergens": ["en:mustard"]})
+    after_insert = db.get_meal_allergens(gratin)
+    db.retag_allergens()
+    after_retag = db.get_meal_allergens(gratin)
+    db.update_meal(gratin, {"name": "Gratäng"})
+    after_rename = db.get_meal_allergens(gratin)
+    db.update_meal(gratin, {"ingredients": "Potatis, havredryck"})
+    after_new_ingredients = db.get_meal_allergens(gratin)
+    free_from_milk = [row["name"] for row in db.get_meals_free_from(["milk"])]
+
+    assert after_insert == after_retag == after_rename == ["milk", "mustard"], (after_retag, after_rename)
+    assert after_new_ingredients == ["gluten", "mustard"], after_new_ingredients
+    assert free_from_milk == ["Gratäng"]
+
+
+def test_legacy_tags_survive_retag(tmp_path, make_lunch_db):
+    path = os.path.join(tmp_path, "old.db")
+    conn = sqlite3.connect(path)
+    # Databas från innan källtexten sparades: taggen kom från ingredienser som inte finns kvar
+    conn.execute("CREATE TABLE meals (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+                 "description TEXT, price REAL NOT NULL DEFAULT 0.0, category TEXT, "
+                 "rating REAL DEFAULT 0.0, rating_count INTEGER DEFAULT 0)")
+    conn.execute("INSERT INTO meals (name, description, price) VALUES ('Fiskgratäng', 'Ugnsbakad', 50.0)")
+    conn.execute("CREATE TABLE meal_allergens (meal_id INTEGER NOT NULL, allergen TEXT NOT NULL, "
+                 "PRIMARY KEY (meal_id, allergen)) WITHOUT ROWID")
+    conn.execute("INSERT INTO meal_allergens VALUES (1, 'fish'), (1, 'milk')")
+    conn.commit()
+    conn.close()
+
+    reopened = make_lunch_db("old.db")
+    reopened.retag_allergens()
+    tags = reopened.get_meal_allergens(1)
+    assert tags == ["fish", "milk"], tags
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test incremental catalog sync against the local stub server: only stale
+products are checked, only changed columns are written, errors are retried,
+and the scheduler thread survives a sync that raises
+"""
+
+import io
+import time
+from contextlib import redirect_stdout
+
+from catalog_sync import CatalogSync, CatalogSyncScheduler
+from food_api_stub_server import StubServer
+from import_pipeline import ImportPipeline
+from skolmaten_api import FoodAPI
+from upstream_resilience import RetryPolicy, UpstreamGuard
+
+
+def setup(server: StubServer, make_lunch_db):
+    db = make_lunch_db("sync.db")
+    guard = UpstreamGuard(RetryPolicy(max_attempts=1), rate_per_second=None, failure_threshold=1000)
+    api = FoodAPI(server.openfoodfacts_url, server.themealdb_url, guard=guard)
+    ImportPipeline(db, api.iter_search_products("pasta", page_size=50)).run()
+    return db, api
+
+
+def test_only_changed_columns_are_updated(make_lunch_db):
+    with StubServer(product_count=200) as server:
+        db, api = setup(server, make_lunch_db)
+        imported = db.db.execute("SELECT COUNT(*) FROM meals WHERE product_code IS NOT NULL")[0][0]
+
+        products = server.httpd.products_by_code
+        products["7300000000000"].update(product_name="Spaghetti Deluxe 0", last_modified_t=1800000000)
+        products["7300000000010"].update(last_modified_t=1800000000)  # nyare men inga ändrade fält
+        del products["7300000000020"]
+        before = db.latest_change_seq()
+
+        result = CatalogSync(db, api, max_age_hours=24, batch_size=7).sync()
+        changes = db.changes_since(before)
+        renamed = db.db.execute("SELECT name, source_last_modified FROM meals WHERE product_code = ?",
+                                ("7300000000000",))[0]
+        again = CatalogSync(db, api, max_age_hours=24).sync()
+
+    assert imported == 20 and result["checked"] == 20, result
+    assert result["updated"] == 1 and result["missing"] == 1 and result["unchanged"] == 18, result
+    assert result["fields_changed"] == {"name": 1}
+    assert tuple(renamed) == ("Spaghetti Deluxe 0", 1800000000)
+    assert [change["data"] for change in changes] == [
+        {"name": "Spaghetti Deluxe 0", "source_last_modified": 1800000000},
+        {"source_last_modified": 1800000000}
+    ]
+    assert again["checked"] == 0
+
+
+def test_errors_are_retried_next_run(make_lunch_db):
+    with StubServer(product_count=200) as server:
+        db, api = setup(server, make_lunch_db)
+        server.configure(error_rate=1.0)
+        failed = CatalogSync(db, api).sync()
+        server.configure(error_rate=0.0)
+        retried = CatalogSync(db, api).sync()
+
+    assert failed["errors"] == 20 and retried["checked"] == 20 and retried["errors"] == 0, (failed, retried)
+
+
+class FlakySync:
+    """Kastar vid första och tredje körningen, som en låst databas"""
+
+    def __init__(self) -> None:
+        self.runs = 0
+
+    def sync(self):
+        self.runs += 1
+        if self.runs in (1, 3):
+            raise RuntimeError("database is locked")
+        return {"checked": self.runs}
+
+
+def test_scheduler_survives_errors():
+    flaky = FlakySync()
+    scheduler = CatalogSyncScheduler(flaky, interval_seconds=0.01)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        scheduler.start()
+        for _ in range(500):
+            if flaky.runs >= 4:
+                break
+            time.sleep(0.01)
+        scheduler.stop()
+        scheduler.join(5)
+
+    assert flaky.runs >= 4 and scheduler.failures == 2, (flaky.runs, scheduler.failures)
+    assert not scheduler.is_alive() and "checked" in scheduler.last_result, scheduler.last_result
+    assert output.getvalue().count("database is locked") == 2, output.getvalue()
+
+
+def test_scheduler_keeps_last_error():
+    flaky = FlakySync()
+    scheduler = CatalogSyncScheduler(flaky, interval_seconds=60)
+    with redirect_stdout(io.StringIO()):
+        scheduler.start()
+        for _ in range(500):
+            if scheduler.last_result:
+                break
+            time.sleep(0.01)
+        alive = scheduler.is_alive()
+        scheduler.stop()
+        scheduler.join(5)
+
+    assert alive and "database is locked" in scheduler.last_result["error"], scheduler.last_result
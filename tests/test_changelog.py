@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test the change feed and nested transactions: changes_since order and
+limit, pruning after consumer checkpoints, a bounded changelog without
+consumers, no pruning of changes a slow consumer has not seen, and that an
+inner transaction() which fails is rolled back even when the outer block
+catches the exception
+"""
+
+from lunch_system_database import SchoolLunchDB
+
+
+def meal_names(lunch_db: SchoolLunchDB):
+    return [row["name"] for row in lunch_db.db.execute("SELECT name FROM meals ORDER BY id")]
+
+
+def test_changes_since_order_and_limit(make_lunch_db):
+    lunch_db = make_lunch_db("feed.db")
+    start = lunch_db.latest_change_seq()
+    meal_id = lunch_db.add_meal({"name": "Pannkakor", "price": 35.0})
+    lunch_db.update_meal(meal_id, {"price": 38.0})
+    lunch_db.add_student({"name": "Elev Ett"})
+
+    changes = lunch_db.changes_since(start)
+    first_two = lunch_db.changes_since(start, limit=2)
+    after_first = lunch_db.changes_since(changes[0]["seq"])
+
+    assert [change["seq"] for change in changes] == sorted(change["seq"] for change in changes)
+    assert [(change["table_name"], change["operation"]) for change in changes] == \
+        [("meals", "insert"), ("meals", "update"), ("students", "insert")], changes
+    assert changes[0]["row_id"] == meal_id and changes[0]["data"]["name"] == "Pannkakor"
+    assert changes[1]["data"]["price"] == 38.0
+    assert first_two == changes[:2] and after_first == changes[1:]
+
+
+def test_checkpoint_prunes_what_all_consumers_have_seen(make_lunch_db):
+    lunch_db = make_lunch_db("feed.db")
+    lunch_db.register_consumer("kassa")
+    lunch_db.register_consumer("statistik")
+    lunch_db.add_meals_bulk([{"name": f"Rätt {index}", "price": 40.0} for index in range(10)])
+    latest = lunch_db.latest_change_seq()
+
+    kept_for_slow = lunch_db.checkpoint_consumer("kassa", latest)
+    remaining_after_one = len(lunch_db.changes_since(0, limit=1000))
+    pruned = lunch_db.checkpoint_consumer("statistik", latest - 3)
+    remaining = lunch_db.changes_since(0, limit=1000)
+    # En checkpoint bakåt flyttar inte tillbaka konsumenten
+    lunch_db.checkpoint_consumer("kassa", 1)
+    last_seq = lunch_db.db.execute("SELECT last_seq FROM changelog_consumers WHERE name = 'kassa'")[0][0]
+
+    assert kept_for_slow == 0 and remaining_after_one == latest, (kept_for_slow, remaining_after_one)
+    assert pruned == latest - 3 and [change["seq"] for change in remaining] == list(range(latest - 2, latest + 1))
+    assert last_seq == latest
+
+
+def test_changelog_is_bounded_without_consumers(make_lunch_db):
+    lunch_db = make_lunch_db("feed.db")
+    lunch_db.CHANGELOG_MAX_ROWS = 50
+    lunch_db.CHANGELOG_PRUNE_EVERY = 20
+    for index in range(200):
+        lunch_db.add_meal({"name": f"Rätt {index}", "price": 40.0})
+    rows = lunch_db.db.execute("SELECT COUNT(*) FROM changelog")[0][0]
+    latest = lunch_db.latest_change_seq()
+    oldest = lunch_db.oldest_change_seq()
+
+    # En konsument som står still får inte tappa ändringar - allt efter dess checkpoint sparas
+    lunch_db.register_consumer("står-still", latest)
+    for index in range(100):
+        lunch_db.add_meal({"name": f"Extra {index}", "price": 40.0})
+    rows_with_stalled = lunch_db.db.execute("SELECT COUNT(*) FROM changelog")[0][0]
+    unseen = lunch_db.changes_since(latest, limit=1000)
+    # Tas den bort gäller gränsen igen
+    lunch_db.unregister_consumer("står-still")
+    rows_after_unregister = lunch_db.db.execute("SELECT COUNT(*) FROM changelog")[0][0]
+
+    assert latest == 200 and rows < 50 + 20, rows
+    assert oldest == latest - rows + 1
+    assert [change["seq"] for change in unseen] == list(range(201, 301)), len(unseen)
+    assert rows_with_stalled == 100 and rows_after_unregister == 50, (rows_with_stalled, rows_after_unregister)
+
+
+def test_failed_inner_transaction_is_rolled_back(make_lunch_db):
+    lunch_db = make_lunch_db("nested.db")
+    callbacks = []
+    with lunch_db.db.transaction():
+        lunch_db.add_meal({"name": "Före", "price": 40.0})
+        try:
+            with lunch_db.db.transaction():
+                lunch_db.db.execute_write("INSERT INTO meals (name, price) VALUES ('Halvklar', 1.0)")
+                lunch_db.db.after_commit(lambda: callbacks.append("inre"))
+                raise ValueError("avbryt inre blocket")
+        except ValueError:
+            pass
+        lunch_db.db.after_commit(lambda: callbacks.append("yttre"))
+        lunch_db.add_meal({"name": "Efter", "price": 40.0})
+
+    names = meal_names(lunch_db)
+    changes = [change["data"].get("name") for change in lunch_db.changes_since(0, limit=1000)]
+
+    assert names == ["Före", "Efter"], names
+    assert "Halvklar" not in changes and callbacks == ["yttre"], (changes, callbacks)
+
+
+def test_inner_block_does_not_commit_outer_early(make_lunch_db):
+    lunch_db = make_lunch_db("nested.db")
+    other = make_lunch_db("nested.db")
+    try:
+        with lunch_db.db.transaction():
+            # Första skrivningen sker i ett inre block - dess RELEASE får inte committa
+            with lunch_db.db.transaction():
+                lunch_db.add_meal({"name": "Inre", "price": 40.0})
+            visible_before_commit = meal_names(other)
+            raise RuntimeError("yttre blocket misslyckas")
+    except RuntimeError:
+        pass
+    names = meal_names(lunch_db)
+
+    assert visible_before_commit == [] and names == [], (visible_before_commit, names)
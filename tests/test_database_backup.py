@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test online backups: a consistent copy while another thread keeps writing,
+unique file names for backups in the same second, rotation of the oldest
+files, errors for a missing database, the scheduler (which keeps running
+after a failed backup), growing steps instead of one long lock without WAL,
+and that opening a database no longer switches it to WAL
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from database_backup import BackupScheduler, backup_database, rotate_backups
+
+MEALS = 200
+
+
+def test_backup_while_writing(tmp_path, make_lunch_db):
+    lunch_db = make_lunch_db(meals=MEALS, journal_mode="WAL")
+    db_path = lunch_db.db.db_path
+    stop = threading.Event()
+
+    def keep_writing():
+        while not stop.is_set():
+            lunch_db.add_meal({"name": "Under backup", "price": 10.0})
+
+    writer = threading.Thread(target=keep_writing)
+    writer.start()
+    try:
+        result = backup_database(db_path, os.path.join(tmp_path, "backups"), pages_per_step=4,
+                                 sleep_seconds=0.001)
+    finally:
+        stop.set()
+        writer.join()
+    conn = sqlite3.connect(result["path"])
+    copied = conn.execute("SELECT COUNT(*) FROM meals").fetchone()[0]
+    conn.close()
+
+    assert "error" not in result and result["integrity"] == "ok", result
+    assert result["steps"] > 1 and copied >= MEALS, (result, copied)
+
+
+def test_backup_without_wal_keeps_stepping(tmp_path, make_lunch_db):
+    lunch_db = make_lunch_db(meals=MEALS)
+    db_path = lunch_db.db.db_path
+    stop = threading.Event()
+
+    def keep_writing():
+        while not stop.is_set():
+            lunch_db.add_meal({"name": "Under backup", "price": 10.0})
+            time.sleep(0.002)
+
+    writer = threading.Thread(target=keep_writing)
+    writer.start()
+    try:
+        result = backup_database(db_path, os.path.join(tmp_path, "backups"), pages_per_step=1,
+                                 sleep_seconds=0.005, max_restarts=1)
+    finally:
+        stop.set()
+        writer.join()
+
+    assert "error" not in result and result["restarts"] > 1, result
+    # Ingen backup i ett steg utan WAL - den skulle låsa ute skrivarna hela tiden
+    assert not result["single_step"] and result["pages_per_step"] > 1, result
+
+
+def test_same_second_backups_and_rotation(tmp_path, make_lunch_db):
+    db_path = make_lunch_db(meals=MEALS).db.db_path
+    backup_dir = os.path.join(tmp_path, "backups")
+    results = [backup_database(db_path, backup_dir, sleep_seconds=0, keep=10) for _ in range(3)]
+    paths = [result["path"] for result in results]
+    before_rotation = sorted(os.listdir(backup_dir))
+
+    removed = rotate_backups(db_path, backup_dir, keep=2)
+    left = sorted(os.listdir(backup_dir))
+    rotated = backup_database(db_path, backup_dir, sleep_seconds=0, keep=2)
+
+    assert len(set(paths)) == 3 and len(before_rotation) == 3, before_rotation
+    assert removed == paths[:1], (removed, paths)
+    assert left == sorted(os.path.basename(path) for path in paths[1:])
+    assert rotated["removed"] == [paths[1]], rotated
+
+
+def test_missing_database_and_scheduler(tmp_path, make_lunch_db):
+    missing = backup_database(os.path.join(tmp_path, "finns-inte.db"), os.path.join(tmp_path, "backups"))
+
+    db_path = make_lunch_db(meals=MEALS).db.db_path
+    scheduler = BackupScheduler(db_path, interval_seconds=60, backup_dir=os.path.join(tmp_path, "backups"),
+                                sleep_seconds=0)
+    scheduler.start()
+    for _ in range(200):
+        if scheduler.last_result:
+            break
+        time.sleep(0.01)
+    scheduler.stop()
+    scheduler.join(5)
+    files = os.listdir(os.path.join(tmp_path, "backups"))
+
+    assert "error" in missing
+    assert scheduler.last_result and "path" in scheduler.last_result and not scheduler.is_alive()
+    assert len(files) == 1, files
+
+
+def test_scheduler_survives_failed_backup(tmp_path, make_lunch_db):
+    db_path = make_lunch_db(meals=MEALS).db.db_path
+    # En fil där backupkatalogen ska ligga - os.makedirs kastar varje gång
+    backup_dir = os.path.join(tmp_path, "backups")
+    with open(backup_dir, "w") as file:
+        file.write("ingen katalog")
+    scheduler = BackupScheduler(db_path, interval_seconds=0.01, backup_dir=backup_dir, sleep_seconds=0)
+    scheduler.start()
+    for _ in range(200):
+        if scheduler.failures >= 2:
+            break
+        time.sleep(0.01)
+    failed = dict(scheduler.last_result or {})
+    os.remove(backup_dir)
+    for _ in range(200):
+        if scheduler.last_result and "path" in scheduler.last_result:
+            break
+        time.sleep(0.01)
+    recovered = dict(scheduler.last_result or {})
+    alive = scheduler.is_alive()
+    scheduler.stop()
+    scheduler.join(5)
+
+    assert scheduler.failures >= 2 and failed["error"].startswith("Backup misslyckades"), failed
+    assert alive and "path" in recovered, recovered
+
+
+def test_opening_does_not_switch_to_wal(tmp_path, make_lunch_db):
+    plain_path = os.path.join(tmp_path, "plain.db")
+    wal_path = os.path.join(tmp_path, "wal.db")
+    make_lunch_db("plain.db", meals=MEALS)
+    make_lunch_db("wal.db", meals=MEALS, journal_mode="WAL")
+    modes = []
+    for path in (plain_path, wal_path):
+        conn = sqlite3.connect(path)
+        modes.append(conn.execute("PRAGMA journal_mode").fetchone()[0])
+        conn.close()
+
+    assert modes == ["delete", "wal"], modes
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Test FoodAPI behaviour against the local stub server (no internet needed):
+one shared keep-alive session, fan-out that keeps call order and reports
+errors per call, batch barcode lookups where concurrent callers of the same
+barcode share one request, and paged search that stops at the last page
+or the limit, and an invalid FOOD_API_FIXTURES reported once instead of
+failing every call
+"""
+
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+import skolmaten_api
+from food_api_stub_server import StubServer
+from skolmaten_api import FoodAPI, SearchPageError, SingleFlight
+from upstream_resilience import RetryPolicy, UpstreamGuard
+
+
+def make_api(server: StubServer, **options) -> FoodAPI:
+    guard = UpstreamGuard(RetryPolicy(max_attempts=1), rate_per_second=None, failure_threshold=1000)
+    return FoodAPI(server.openfoodfacts_url, server.themealdb_url, guard=guard, **options)
+
+
+def test_shared_session_reuses_connections():
+    FoodAPI.close_shared_session()
+    with StubServer() as server:
+        first, second = make_api(server), make_api(server)
+        for index in range(10):
+            first.get_product_by_barcode(str(7300000000000 + index))
+            second.get_product_by_barcode(str(7300000000000 + index))
+        sequential = server.connection_count
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda index: first.get_product_by_barcode(str(7300000000000 + index)), range(80)))
+        concurrent = server.connection_count
+
+    assert first.session is second.session is FoodAPI.get_shared_session()
+    assert server.request_count == 100 and sequential == 1, (server.request_count, sequential)
+    assert concurrent <= 1 + 8, concurrent
+
+
+def test_fan_out_keeps_order_and_per_call_errors():
+    api = FoodAPI("http://127.0.0.1:9", "http://127.0.0.1:9")
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call(index):
+        def run():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                # Senare anrop blir klara först
+                time.sleep(0.01 * (8 - index))
+                if index == 2:
+                    raise ValueError("trasigt svar")
+                return index * 10
+            finally:
+                with lock:
+                    running[0] -= 1
+        return run
+
+    outcomes = api._fan_out([call(index) for index in range(8)], max_workers=3)
+
+    assert [result for result, _ in outcomes] == [0, 10, None, 30, 40, 50, 60, 70], outcomes
+    assert isinstance(outcomes[2][1], ValueError) and all(error is None for index, (_, error)
+                                                          in enumerate(outcomes) if index != 2)
+    assert peak[0] <= 3, peak
+    assert api._fan_out([]) == []
+
+
+def test_fan_out_deadline():
+    api = FoodAPI("http://127.0.0.1:9", "http://127.0.0.1:9")
+    started = time.monotonic()
+    outcomes = api._fan_out([lambda: "snabb", lambda: time.sleep(1.0) or "långsam"], deadline=0.2)
+    elapsed = time.monotonic() - started
+
+    assert outcomes[0] == ("snabb", None) and isinstance(outcomes[1][1], TimeoutError), outcomes
+    assert elapsed < 0.8, elapsed
+
+
+def test_random_meals_report_each_failed_call():
+    with StubServer(error_rate=0.5, seed=3) as server:
+        result = make_api(server).get_random_meals_themealdb(count=12, max_workers=4)
+
+    errors = result["errors"] or []
+    assert result["count"] == len(result["meals"]) and result["count"] + len(errors) == 12, result
+    assert errors and all(error.startswith("TheMealDB anrop ") for error in errors), errors
+
+
+def run_together(count: int, work):
+    """Starta count trådar samtidigt och returnera (resultat, fel) per tråd"""
+    barrier = threading.Barrier(count)
+    outcomes = [None] * count
+
+    def run(index):
+        barrier.wait()
+        try:
+            outcomes[index] = (work(), None)
+        except BaseException as e:
+            outcomes[index] = (None, e)
+
+    # Daemon-trådar: en följare som aldrig släpps ska ge ett fel, inte ett test som hänger
+    threads = [threading.Thread(target=run, args=(index,), daemon=True) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return outcomes, any(thread.is_alive() for thread in threads)
+
+
+def test_single_flight_shares_result_and_exception():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow(value):
+        def fn():
+            calls.append(value)
+            release.wait(2)
+            if isinstance(value, BaseException):
+                raise value
+            return value
+        return fn
+
+    threading.Timer(0.2, release.set).start()
+    shared, _ = run_together(6, lambda: flight.do("pasta", slow("svar")))
+    shared_calls = len(calls)
+
+    release.clear()
+    calls.clear()
+    threading.Timer(0.2, release.set).start()
+    failed, _ = run_together(6, lambda: flight.do("pasta", slow(ConnectionError("nere"))))
+    failed_calls = len(calls)
+
+    # KeyboardInterrupt ärver inte Exception - följarna ska ändå släppas
+    release.clear()
+    calls.clear()
+    threading.Timer(0.2, release.set).start()
+    interrupted, stuck = run_together(4, lambda: flight.do("pasta", slow(KeyboardInterrupt())))
+    after = flight.do("pasta", lambda: "ny omgång")
+
+    assert shared_calls == 1 and shared == [("svar", None)] * 6, (shared_calls, shared)
+    assert failed_calls == 1 and all(isinstance(error, ConnectionError) for _, error in failed), failed
+    assert len({id(error) for _, error in failed}) == 1
+    assert not stuck and all(isinstance(error, KeyboardInterrupt) for _, error in interrupted), interrupted
+    assert after == "ny omgång"
+
+
+def test_products_by_barcodes():
+    with StubServer(latency=0.05) as server:
+        api = make_api(server)
+        codes = ["7300000000001", " 7300000000002 ", "7300000000001", "", "0000000000000"]
+        products = api.get_products_by_barcodes(codes, max_workers=4)
+        batch_requests = server.request_count
+
+        # Samtidiga uppslag av samma streckkod från olika trådar går som ett anrop
+        shared, _ = run_together(8, lambda: api.get_product_by_barcode("7300000000005"))
+        shared_requests = server.request_count - batch_requests
+
+        server.configure(error_rate=1.0)
+        failing = api.get_products_by_barcodes(["7300000000003", "7300000000004"])
+
+    assert list(products) == ["7300000000001", "7300000000002", "0000000000000"], list(products)
+    assert products["7300000000001"]["product"]["code"] == "7300000000001"
+    assert products["0000000000000"]["status"] == 0 and batch_requests == 3
+    assert shared_requests == 1 and all(result["status"] == 1 for result, _ in shared), shared
+    assert all("error" in result for result in failing.values()), failing
+
+
+def test_paged_search_pages_and_limit():
+    with StubServer() as server:
+        api = make_api(server)
+        expected = [product["code"] for product in server.httpd.products if "pasta" in product["categories"].lower()]
+
+        def search(**options):
+            before = server.request_count
+            codes = [product["code"] for product in api.iter_search_products("pasta", **options)]
+            return codes, server.request_count - before
+
+        uneven, uneven_requests = search(page_size=7)
+        even, even_requests = search(page_size=10)
+        limited, limited_requests = search(page_size=7, limit=10)
+        exact, exact_requests = search(page_size=7, limit=14)
+
+        # Att sluta läsa tidigt lämnar inga fler anrop efter sig
+        iterator = api.iter_search_products("pasta", page_size=7)
+        next(iterator)
+        iterator.close()
+        time.sleep(0.1)
+        abandoned_requests = server.request_count
+
+        server.configure(error_rate=1.0)
+        try:
+            list(api.iter_search_products("pasta", page_size=7))
+            page_error = None
+        except SearchPageError as e:
+            page_error = e
+
+    assert len(expected) == 50 and uneven == expected and even == expected, (len(expected), len(uneven))
+    # 50 produkter: 8 sidor om 7 och 5 om 10 - ingen extra tom sida när count är känt
+    assert (uneven_requests, even_requests) == (8, 5), (uneven_requests, even_requests)
+    assert limited == expected[:10] and limited_requests == 2, (limited, limited_requests)
+    assert exact == expected[:14] and exact_requests == 2, exact_requests
+    assert abandoned_requests - (8 + 5 + 2 + 2) <= 2, abandoned_requests
+    assert page_error is not None
+
+
+def test_invalid_fixture_mode_is_reported_once():
+    saved_env = {name: os.environ.get(name) for name in ("FOOD_API_FIXTURES", "FOOD_API_CACHE")}
+    previous = skolmaten_api._default_api
+    os.environ["FOOD_API_FIXTURES"] = "replya"
+    os.environ["FOOD_API_CACHE"] = ""
+    skolmaten_api._default_api = None
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output):
+            first = skolmaten_api.get_default_api()
+            second = skolmaten_api.get_default_api()
+    finally:
+        skolmaten_api._default_api = previous
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    assert first is second and first.fixtures is None
+    assert output.getvalue().count("FOOD_API_FIXTURES='replya'") == 1, output.getvalue()
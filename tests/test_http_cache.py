@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test the HTTP response cache: reads do not write to the database, access
+times are flushed in one batch and still decide which entries are evicted,
+the running size total matches the table, and FoodAPI serves repeated
+lookups from the cache against the stub server
+"""
+
+import os
+
+from food_api_stub_server import StubServer
+from http_cache import ResponseCache
+from skolmaten_api import FoodAPI
+from upstream_resilience import RetryPolicy, UpstreamGuard
+
+
+def table_bytes(cache: ResponseCache) -> int:
+    return cache.db.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache")[0][0]
+
+
+def test_reads_do_not_write(tmp_path):
+    cache = ResponseCache(os.path.join(tmp_path, "cache.db"))
+    cache.store("a", "http://x/a", b"{}", ttl=60)
+    conn = cache.db._get_connection()
+    before = conn.total_changes
+    hits = [cache.get("a") for _ in range(100)]
+    after_reads = conn.total_changes
+    stored_access = cache.db.execute("SELECT last_access FROM http_cache WHERE key = 'a'")[0][0]
+    flushed = cache.flush_access_times()
+    after_flush = conn.total_changes
+    new_access = cache.db.execute("SELECT last_access FROM http_cache WHERE key = 'a'")[0][0]
+    cache.close()
+
+    assert all(hit["fresh"] and hit["body"] == b"{}" for hit in hits)
+    assert after_reads == before, (before, after_reads)
+    assert flushed == 1 and after_flush == before + 1 and new_access > stored_access
+
+
+def test_batched_access_times_still_drive_eviction(tmp_path):
+    cache = ResponseCache(os.path.join(tmp_path, "cache.db"), max_bytes=1000)
+    for key in "abcd":
+        cache.store(key, f"http://x/{key}", b"x" * 240, ttl=60)
+    # "a" läses och ska därför överleva; bara den väntande åtkomsttiden visar det
+    cache.get("a")
+    cache.store("e", "http://x/e", b"x" * 240, ttl=60)
+    left = sorted(row[0] for row in cache.db.execute("SELECT key FROM http_cache"))
+    stats = cache.stats()
+    cache.close()
+
+    # 5 x 240 = 1200 > 1000 -> ner till 900: de två äldsta olästa ("b", "c") försvinner
+    assert left == ["a", "d", "e"], left
+    assert stats["evictions"] == 2 and stats["bytes"] == 720 and stats["pending_access"] == 0, stats
+
+
+def test_running_total_matches_table(tmp_path):
+    db_path = os.path.join(tmp_path, "cache.db")
+    cache = ResponseCache(db_path, max_bytes=10_000)
+    cache.store("a", "http://x/a", b"x" * 500, ttl=60)
+    cache.store("a", "http://x/a", b"x" * 200, ttl=60)  # Ersätter, räknas inte två gånger
+    cache.store("b", "http://x/b", b"x" * 300, ttl=60)
+    running = cache._total_bytes
+    cache.close()
+
+    # En ny instans läser in summan en gång; en annan process kan ha fyllt på under tiden
+    reopened = ResponseCache(db_path, max_bytes=1000)
+    reopened.TOTAL_RESYNC_STORES = 3
+    other = ResponseCache(db_path, max_bytes=10_000)
+    other.store("c", "http://x/c", b"x" * 900, ttl=60)
+    reopened.store("d", "http://x/d", b"x" * 10, ttl=60)
+    before_resync = (reopened._total_bytes, table_bytes(reopened))
+    reopened.store("e", "http://x/e", b"x" * 10, ttl=60)
+    reopened.store("f", "http://x/f", b"x" * 10, ttl=60)
+    after_evict = (reopened._total_bytes, table_bytes(reopened))
+    reopened.clear()
+    cleared = reopened._total_bytes
+    reopened.close()
+    other.close()
+
+    assert running == 200 + 300, running
+    assert before_resync == (510, 1410), before_resync
+    assert after_evict[0] == after_evict[1] <= 900, after_evict
+    assert cleared == 0
+
+
+def test_food_api_serves_repeats_from_cache(tmp_path):
+    with StubServer() as server:
+        cache = ResponseCache(os.path.join(tmp_path, "cache.db"))
+        guard = UpstreamGuard(RetryPolicy(max_attempts=1), rate_per_second=None, failure_threshold=1000)
+        api = FoodAPI(server.openfoodfacts_url, server.themealdb_url, guard=guard, cache=cache)
+        first = [api.get_product_by_barcode(str(7300000000000 + index)) for index in range(20)]
+        requests_after_first = server.request_count
+        again = [api.get_product_by_barcode(str(7300000000000 + index)) for index in range(20)]
+        stats = cache.stats()
+        cache.close()
+
+    assert first == again and requests_after_first == 20 and server.request_count == 20
+    assert stats["hits"] == 20 and stats["entries"] == 20, stats
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test the persistent import job queue: dedupe of concurrent submits,
+progress and result, failures, resuming jobs after a restart, no requeue
+of jobs another live process is running, and no job left running when it
+cannot even start
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database_wrapper import SQLiteDB
+from import_jobs import ImportJobQueue
+
+
+def wait_for(queue: ImportJobQueue, job_id: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Jobbet {job_id} blev inte klart")
+
+
+def test_concurrent_submits_are_deduplicated(tmp_path):
+    queue = ImportJobQueue(SQLiteDB(os.path.join(tmp_path, "jobs.db")), progress_interval=0)
+    release = threading.Event()
+    runs = []
+
+    def handler(params, report):
+        runs.append(params)
+        report({"added": 1})
+        release.wait(5)
+        return {"added": 3, "search_term": params["search_term"]}
+
+    queue.register("import", handler)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        submitted = list(pool.map(lambda _: queue.submit("import", {"search_term": "pasta"}, "import:pasta"),
+                                  range(10)))
+    job_ids = {job["id"] for job, _ in submitted}
+    time.sleep(0.1)
+    running = queue.get(job_ids.pop())
+    release.set()
+    job = wait_for(queue, running["id"])
+
+    # Klart jobb -> nästa klick startar ett nytt
+    again, deduplicated = queue.submit("import", {"search_term": "pasta"}, "import:pasta")
+    wait_for(queue, again["id"])
+    queue.shutdown()
+
+    assert not job_ids, "alla tio klick ska ge samma jobb"
+    assert sum(dedup for _, dedup in submitted) == 9
+    assert running["status"] == "running" and running["progress"] == {"added": 1}
+    assert job["status"] == "succeeded" and job["result"]["added"] == 3
+    assert not deduplicated and again["id"] != job["id"] and len(runs) == 2
+
+
+def test_failures_are_recorded(tmp_path):
+    queue = ImportJobQueue(SQLiteDB(os.path.join(tmp_path, "jobs.db")))
+    queue.register("error", lambda params, report: {"error": "Inga måltider hittades"})
+    queue.register("crash", lambda params, report: 1 / 0)
+    error_job = wait_for(queue, queue.submit("error", {})[0]["id"])
+    crash_job = wait_for(queue, queue.submit("crash", {})[0]["id"])
+    queue.shutdown()
+
+    assert error_job["status"] == "failed" and error_job["error"] == "Inga måltider hittades"
+    assert crash_job["status"] == "failed" and "division" in crash_job["error"]
+
+
+def test_resume_after_restart(tmp_path):
+    db_path = os.path.join(tmp_path, "jobs.db")
+    first = ImportJobQueue(SQLiteDB(db_path), max_workers=1)
+    block = threading.Event()
+    first.register("import", lambda params, report: block.wait(5) and {"added": 0, "search_term": "gammal"})
+    blocker, _ = first.submit("import", {"search_term": "a"})
+    waiting, _ = first.submit("import", {"search_term": "b"})
+    time.sleep(0.1)
+    # "Processen dör": ingen heartbeat längre, jobb a är markerat som igång och b väntar
+    first._stopped.set()
+    time.sleep(0.3)
+
+    second = ImportJobQueue(SQLiteDB(db_path), stale_after=0.2)
+    second.register("import", lambda params, report: {"added": 1, "search_term": params["search_term"]})
+    resumed = second.resume_pending()
+    jobs = [wait_for(second, blocker["id"]), wait_for(second, waiting["id"])]
+    # Den gamla tråden blir klar till slut men får inte skriva över den nya ägarens resultat
+    block.set()
+    first.shutdown()
+    second.shutdown()
+    final = second.get(blocker["id"])
+
+    assert resumed == 2
+    assert [job["result"]["search_term"] for job in jobs] == ["a", "b"]
+    assert final["result"]["search_term"] == "a" and final["claimed_by"] == second.owner, final
+
+
+def test_live_claims_are_not_requeued(tmp_path):
+    db_path = os.path.join(tmp_path, "jobs.db")
+    first = ImportJobQueue(SQLiteDB(db_path), max_workers=1, heartbeat_interval=0.05)
+    block = threading.Event()
+    runs = []
+
+    def slow(params, report):
+        runs.append(params["search_term"])
+        block.wait(5)
+        return {"added": 1}
+
+    first.register("import", slow)
+    running, _ = first.submit("import", {"search_term": "a"})
+    time.sleep(0.5)
+
+    # En andra worker startar medan den första lever och skickar heartbeat
+    second = ImportJobQueue(SQLiteDB(db_path), stale_after=0.3)
+    second.register("import", slow)
+    resumed = second.resume_pending()
+    time.sleep(0.2)
+    block.set()
+    job = wait_for(first, running["id"])
+    first.shutdown()
+    second.shutdown()
+
+    assert resumed == 0 and runs == ["a"], (resumed, runs)
+    assert job["status"] == "succeeded" and job["claimed_by"] == first.owner
+
+
+def test_job_that_cannot_start_fails(tmp_path):
+    db_path = os.path.join(tmp_path, "jobs.db")
+    first = ImportJobQueue(SQLiteDB(db_path))
+    first.register("export", lambda params, report: {"added": 0})
+    first.shutdown()
+    SQLiteDB(db_path).execute_write(
+        "INSERT INTO import_jobs (id, kind, dedupe_key, created_at) VALUES ('x', 'export', 'export:x', 0)")
+
+    # En process som inte känner till jobbtypen - jobbet ska inte fastna som igång
+    second = ImportJobQueue(SQLiteDB(db_path))
+    second.register("import", lambda params, report: {"added": 0})
+    second.resume_pending()
+    job = wait_for(second, "x")
+    second.shutdown()
+
+    assert job["status"] == "failed" and "export" in job["error"], job
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test the streaming import pipeline against the local stub server:
+complete import with dedupe, bounded queues under a slow writer, cancellation,
+several search terms imported concurrently through one writer, fetch errors
+reported as errors, and a failed batch that does not block later retries
+"""
+
+import os
+import threading
+import time
+
+from food_api_stub_server import StubServer
+import skolmaten_api
+from import_pipeline import ImportPipeline
+from lunch_system_database import SchoolLunchDB
+from skolmaten_api import FoodAPI
+from upstream_resilience import RetryPolicy, UpstreamGuard
+
+
+def make_api(server: StubServer) -> FoodAPI:
+    return FoodAPI(server.openfoodfacts_url, server.themealdb_url, guard=UpstreamGuard(rate_per_second=None))
+
+
+def test_import_all_pages(make_lunch_db):
+    with StubServer(product_count=1000, latency=0.01) as server:
+        db = make_lunch_db("import.db")
+        api = make_api(server)
+        result = ImportPipeline(db, api.iter_search_products("pasta", page_size=25), batch_size=20).run()
+        again = ImportPipeline(db, api.iter_search_products("pasta", page_size=25)).run()
+        count = db.db.execute("SELECT COUNT(*) FROM meals")[0][0]
+
+    assert result["added"] == 100 and count == 100, (result["added"], count)
+    assert again["added"] == 0 and again["skipped"] == 100
+    assert all(stage["done"] for stage in result["stages"].values())
+
+
+def test_bounded_queues_apply_backpressure(make_lunch_db):
+    with StubServer(product_count=1000) as server:
+        db = make_lunch_db("import.db")
+        api = make_api(server)
+
+        def slow_convert(product):
+            time.sleep(0.002)
+            return [{"name": product["product_name"], "price": 10.0}]
+
+        pipeline = ImportPipeline(db, api.iter_search_products("", page_size=100), convert=slow_convert,
+                                  queue_size=5, batch_size=10)
+        result = pipeline.run()
+
+    assert result["added"] == 1000
+    assert result["queues"]["raw"]["max_depth"] <= 5 and result["queues"]["meals"]["max_depth"] <= 5
+
+
+def test_cancel_mid_run(make_lunch_db):
+    with StubServer(product_count=1000, latency=0.05) as server:
+        db = make_lunch_db("import.db")
+        pipeline = ImportPipeline(db, make_api(server).iter_search_products("", page_size=20), batch_size=10)
+        threading.Timer(0.3, pipeline.cancel).start()
+        started = time.monotonic()
+        result = pipeline.run()
+        elapsed = time.monotonic() - started
+        count = db.db.execute("SELECT COUNT(*) FROM meals")[0][0]
+
+    assert result["cancelled"] and elapsed < 1.5, elapsed
+    assert 0 < result["added"] < 1000 and count == result["added"]
+
+
+def test_multi_term_import_shares_dedupe(make_lunch_db):
+    with StubServer(product_count=400, latency=0.02) as server:
+        db = make_lunch_db("import.db")
+        db.add_meal({"name": "Spaghetti 0", "price": 10.0})
+        previous, skolmaten_api._default_api = skolmaten_api._default_api, make_api(server)
+        try:
+            result = db.import_search_terms(["pasta", "dry pasta", "chicken", "pasta ", ""], limit=20,
+                                            max_workers=3, pipeline_options={"batch_size": 10})
+        finally:
+            skolmaten_api._default_api = previous
+        count = db.db.execute("SELECT COUNT(*) FROM meals")[0][0]
+        names = db.db.execute("SELECT COUNT(DISTINCT name) FROM meals")[0][0]
+
+    terms = result["terms"]
+    assert list(terms) == ["pasta", "dry pasta", "chicken"], list(terms)
+    assert sum(stats["added"] for stats in terms.values()) == result["added"]
+    assert sum(stats["found"] for stats in terms.values()) == result["total_found"] == 60
+    # "pasta" och "dry pasta" ger samma produkter; en av dem fanns redan i databasen
+    assert terms["pasta"]["added"] + terms["dry pasta"]["added"] == 19, terms
+    assert terms["chicken"]["added"] == 20
+    assert count == names == result["added"] + 1
+
+
+def test_fetch_error_is_returned(make_lunch_db):
+    with StubServer(error_rate=1.0) as server:
+        db = make_lunch_db("import.db")
+        guard = UpstreamGuard(RetryPolicy(max_attempts=1), rate_per_second=None, failure_threshold=1000)
+        previous = skolmaten_api._default_api
+        skolmaten_api._default_api = FoodAPI(server.openfoodfacts_url, server.themealdb_url, guard=guard)
+        try:
+            single = db.import_meals_from_openfoodfacts("pasta")
+            multi = db.import_search_terms(["pasta", "chicken"])
+        finally:
+            skolmaten_api._default_api = previous
+
+    assert "misslyckades" in single["error"] and "Inga måltider" not in single["error"], single
+    assert single["errors"] and "503" in single["error"], single
+    assert "misslyckades" in multi["error"] and len(multi["errors"]) == 2, multi
+
+
+class FailingOnceDB(SchoolLunchDB):
+    """Första skrivningen misslyckas, som en låst databas"""
+
+    failed = False
+
+    def add_meals_bulk(self, meals):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("database is locked")
+        return super().add_meals_bulk(meals)
+
+
+def test_failed_batch_does_not_poison_dedupe(tmp_path):
+    db = FailingOnceDB(os.path.join(tmp_path, "import.db"))
+    products = [{"name": name} for name in ("Soppa", "Pasta", "Soppa", "Pasta", "Gröt")]
+    convert = lambda product: [dict(product, price=10.0)]
+    result = ImportPipeline(db, products, convert=convert, batch_size=2).run()
+    shared_names = set()
+    again = ImportPipeline(db, [{"name": "Sallad"}, {"name": "Sallad"}], convert=convert,
+                           known_names=shared_names).run()
+    names = sorted(row[0] for row in db.db.execute("SELECT name FROM meals"))
+
+    # Första omgången (Soppa, Pasta) misslyckas; dubbletterna i nästa omgång sparas i stället
+    assert names == ["Gröt", "Pasta", "Sallad", "Soppa"], names
+    assert result["added"] == 3 and len(result["errors"]) == 1, result
+    assert again["added"] == 1 and again["skipped"] == 1 and shared_names == {"Sallad"}, again
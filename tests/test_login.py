@@ -5,6 +5,8 @@ Test login functionality with database users
 
 import sys
 import os
+import shutil
+import tempfile
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from lunch_system_database import SchoolLunchDB
@@ -15,11 +17,16 @@ def test_login():
     print("🔐 School Lunch System - Login Test")
     print("=" * 60)
     
-    # Initialize database
-    db = SchoolLunchDB('test.db')
-    
-    # Get all students
-    students = db.get_all_students()
+    # Initialize database - a copy, since opening runs the schema migrations and the
+    # tracked test.db should stay as it is
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'test.db')
+        shutil.copy('test.db', db_path)
+        db = SchoolLunchDB(db_path)
+        
+        # Get all students
+        students = db.get_all_students()
+        db.db.close()
     
     if not students:
         print("❌ No students found in database!")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test conditional /api/meals responses: ETag from the catalog version,
+304 without touching the database, per-version body cache, and version
+bumps from add_meal, rate_meal and imports only after commit, and a new
+version after writes from another process
+"""
+
+import sqlite3
+import subprocess
+import sys
+from contextlib import contextmanager
+
+import flask_test_env
+from lunch_system_database import SchoolLunchDB
+
+
+class CountingDB:
+    """Wraps SQLiteDB.execute to count queries made by a request"""
+
+    def __init__(self, lunch_db: SchoolLunchDB) -> None:
+        self.queries = 0
+        self._execute = lunch_db.db.execute
+        lunch_db.db.execute = self.execute
+
+    def execute(self, *args, **kwargs):
+        self.queries += 1
+        return self._execute(*args, **kwargs)
+
+
+@contextmanager
+def make_client(lunch_db: SchoolLunchDB):
+    with flask_test_env.serving(db=lunch_db) as client:
+        with client.session_transaction() as session:
+            session['username'] = 'Test Elev'
+            session['student_id'] = 1
+        yield client
+
+
+def test_not_modified_without_db_access(make_lunch_db):
+    lunch_db = make_lunch_db("etag.db")
+    meal_id = lunch_db.add_meal({"name": "Fiskgratäng", "description": "Torsk, grädde", "price": 40.0})
+    with make_client(lunch_db) as client:
+        first = client.get('/api/meals')
+        etag = first.headers['ETag']
+        counter = CountingDB(lunch_db)
+        cached = client.get('/api/meals')
+        not_modified = client.get('/api/meals', headers={'If-None-Match': etag})
+        since = client.get('/api/meals', headers={'If-Modified-Since': first.headers['Last-Modified']})
+        queries = counter.queries
+
+        lunch_db.rate_meal(meal_id, 5)
+        after_rating = client.get('/api/meals', headers={'If-None-Match': etag})
+
+    assert first.status_code == 200 and first.json[0]["allergens"] == ["fish", "milk"]
+    assert "no-cache" in first.headers['Cache-Control']
+    assert cached.status_code == 200 and cached.data == first.data
+    assert not_modified.status_code == 304 and not_modified.headers['ETag'] == etag
+    assert since.status_code == 304
+    assert queries == 0, f"{queries} frågor för oförändrad katalog"
+    assert after_rating.status_code == 200 and after_rating.headers['ETag'] != etag
+    assert after_rating.json[0]["rating"] == 5.0
+
+
+def test_version_bumps_after_commit(make_lunch_db):
+    lunch_db = make_lunch_db("etag.db")
+    start = lunch_db.catalog_version
+    with lunch_db.db.transaction():
+        lunch_db.add_meal({"name": "Pannkakor", "price": 25.0})
+        inside = lunch_db.catalog_version
+    committed = lunch_db.catalog_version
+
+    try:
+        with lunch_db.db.transaction():
+            lunch_db.add_meals_bulk([{"name": "Soppa", "price": 20.0}])
+            raise RuntimeError("avbruten import")
+    except RuntimeError:
+        pass
+    rolled_back = lunch_db.catalog_version
+    restarted = make_lunch_db("etag.db").catalog_version
+
+    assert inside == start, "versionen får inte ändras före commit"
+    assert committed != start
+    assert rolled_back == committed, "rollback ska inte ändra versionen"
+    assert restarted != committed, "en omstart ska ge en ny version"
+
+
+def test_writes_from_another_process(make_lunch_db):
+    lunch_db = make_lunch_db("etag.db")
+    db_path = lunch_db.db.db_path
+    lunch_db.add_meal({"name": "Fiskgratäng", "price": 40.0})
+    with make_client(lunch_db) as client:
+        first = client.get('/api/meals')
+        etag = first.headers['ETag']
+        # Som admin_menu.py: en egen process som skriver i samma databasfil
+        subprocess.run([sys.executable, "-c",
+                        "import sqlite3, sys; conn = sqlite3.connect(sys.argv[1]); "
+                        "conn.execute('UPDATE meals SET price = 45.0'); conn.commit()", db_path], check=True)
+        after_admin = client.get('/api/meals', headers={'If-None-Match': etag})
+        # En annan anslutning i samma process räknas likadant
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE meals SET price = 50.0")
+        conn.commit()
+        conn.close()
+        after_direct = client.get('/api/meals', headers={'If-None-Match': after_admin.headers['ETag']})
+        unchanged = client.get('/api/meals', headers={'If-None-Match': after_direct.headers['ETag']})
+
+    assert first.json[0]["price"] == 40.0
+    assert after_admin.status_code == 200 and after_admin.json[0]["price"] == 45.0, after_admin.status_code
+    assert after_direct.status_code == 200 and after_direct.json[0]["price"] == 50.0, after_direct.status_code
+    assert unchanged.status_code == 304
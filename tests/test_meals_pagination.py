@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test /api/meals pagination and filters: keyset cursor through the whole
+catalog, category/price/rating/allergen filters, field selection, gzip
+above the size threshold and the plain array when no page is requested
+"""
+
+import gzip
+import json
+from contextlib import contextmanager
+
+import flask_test_env
+from lunch_system_database import SchoolLunchDB
+
+CATEGORIES = ["Pasta", "Soppa", "Fisk & Skaldjur", "Efterrätt"]
+
+
+def make_catalog(make_lunch_db, count: int) -> SchoolLunchDB:
+    lunch_db = make_lunch_db("meals.db", meals=[{
+        "name": f"Rätt {index % 37:02d}",  # Samma namn flera gånger - cursorn måste ta id som tiebreak
+        "description": "Med grädde (mjölk)" if index % 3 == 0 else "Grönsaker",
+        "price": 20.0 + index % 50,
+        "category": CATEGORIES[index % len(CATEGORIES)]
+    } for index in range(count)])
+    for meal_id in range(1, count + 1, 5):
+        lunch_db.rate_meal(meal_id, 1 + (meal_id // 5) % 5)
+    return lunch_db
+
+
+@contextmanager
+def make_client(lunch_db: SchoolLunchDB):
+    with flask_test_env.serving(db=lunch_db) as client:
+        with client.session_transaction() as session:
+            session['username'] = 'Test Elev'
+        yield client
+
+
+def fetch_all(client, query: str):
+    meals, cursor, pages = [], None, 0
+    while True:
+        response = client.get(f"/api/meals?{query}" + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200, response.data
+        page = response.json
+        meals.extend(page["meals"])
+        pages += 1
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            return meals, pages
+        cursor = page["next_cursor"]
+
+
+def test_cursor_walks_whole_catalog(make_lunch_db):
+    lunch_db = make_catalog(make_lunch_db, 500)
+    with make_client(lunch_db) as client:
+        meals, pages = fetch_all(client, "limit=60")
+        everything = client.get("/api/meals").json
+        plan = " ".join(row[3] for row in lunch_db.db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM meals WHERE (name, id) > ('Rätt 05', 10) ORDER BY name, id LIMIT 61"))
+
+    keys = [(meal["name"], meal["id"]) for meal in meals]
+    assert len(meals) == 500 and len(set(keys)) == 500 and keys == sorted(keys)
+    assert pages == 9
+    assert [meal["id"] for meal in everything] == [meal["id"] for meal in meals], "arrayen utan limit ska vara oförändrad"
+    assert "TEMP B-TREE" not in plan, plan
+
+
+def test_filters_and_fields(make_lunch_db):
+    with make_client(make_catalog(make_lunch_db, 300)) as client:
+        pasta, _ = fetch_all(client, "limit=50&category=Pasta&min_price=30&max_price=40")
+        rated, _ = fetch_all(client, "limit=50&min_rating=4")
+        no_milk, _ = fetch_all(client, "limit=50&exclude_allergens=milk")
+        slim = client.get("/api/meals?limit=5&fields=id,name").json["meals"]
+        bad_field = client.get("/api/meals?limit=5&fields=id,secret")
+        bad_cursor = client.get("/api/meals?limit=5&cursor=not-a-cursor")
+        bad_price = client.get("/api/meals?limit=5&min_price=cheap")
+
+    assert pasta and all(meal["category"] == "Pasta" and 30 <= meal["price"] <= 40 for meal in pasta)
+    assert rated and all(meal["rating"] >= 4 for meal in rated)
+    assert len(no_milk) == 200 and all("milk" not in meal["allergens"] for meal in no_milk)
+    assert all(set(meal) == {"id", "name"} for meal in slim)
+    assert bad_field.status_code == bad_cursor.status_code == bad_price.status_code == 400
+
+
+def test_gzip_above_threshold(make_lunch_db):
+    with make_client(make_catalog(make_lunch_db, 200)) as client:
+        plain = client.get("/api/meals?limit=100")
+        compressed = client.get("/api/meals?limit=100", headers={"Accept-Encoding": "gzip"})
+        again = client.get("/api/meals?limit=100", headers={"Accept-Encoding": "gzip"})
+        small = client.get("/api/meals?limit=1&fields=id", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in compressed.headers["Vary"]
+    assert json.loads(gzip.decompress(compressed.data)) == plain.json
+    assert again.data == compressed.data
+    assert "Content-Encoding" not in small.headers
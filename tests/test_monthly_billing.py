@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test monthly billing: one invoice per student with the price stored on the
+transaction (not today's menu price), only the billed month, and the same
+totals with one or several worker processes, as CSV or JSON Lines
+"""
+
+import csv
+import json
+import os
+
+from lunch_system_database import SchoolLunchDB
+from monthly_billing import iter_invoices, month_bounds, run_billing, split_student_ranges
+
+
+def make_db(make_lunch_db) -> SchoolLunchDB:
+    lunch_db = make_lunch_db("billing.db", meals=[{"name": "Pasta", "price": 40.0},
+                                                  {"name": "Soppa", "price": 32.5}])
+    for index in range(6):
+        lunch_db.add_student({"name": f"Elev {index + 1}"})
+    for student_id in range(1, 7):
+        for day in range(1, student_id + 1):
+            lunch_db.record_transaction(student_id, 1 + day % 2, f"2026-10-{day:02d}")
+    # Prishöjning efter beställningarna - fakturan ska använda priset vid beställning
+    lunch_db.update_meal(1, {"price": 99.0})
+    lunch_db.record_transaction(1, 1, "2026-09-30")
+    lunch_db.record_transaction(1, 1, "2026-11-01")
+    return lunch_db
+
+
+def expected_total(student_id: int) -> float:
+    return sum(40.0 if (1 + day % 2) == 1 else 32.5 for day in range(1, student_id + 1))
+
+
+def test_invoice_totals_use_stored_prices(make_lunch_db):
+    lunch_db = make_db(make_lunch_db)
+    invoices = list(iter_invoices(lunch_db.db, "2026-10"))
+    some = list(iter_invoices(lunch_db.db, "2026-10", first_student_id=2, last_student_id=3))
+
+    assert [invoice["student_id"] for invoice in invoices] == [1, 2, 3, 4, 5, 6]
+    for invoice in invoices:
+        assert invoice["orders"] == invoice["student_id"], invoice
+        assert invoice["total"] == expected_total(invoice["student_id"]), invoice
+        assert invoice["student_name"] == f"Elev {invoice['student_id']}"
+        assert [line["date"] for line in invoice["lines"]] == sorted(line["date"] for line in invoice["lines"])
+    assert [invoice["student_id"] for invoice in some] == [2, 3]
+    assert month_bounds("2026-12") == ("2026-12-01", "2027-01-01")
+
+
+def test_workers_give_same_totals(tmp_path, make_lunch_db):
+    db_path = make_db(make_lunch_db).db.db_path
+    single = run_billing(db_path, "2026-10", os.path.join(tmp_path, "one"), "csv", workers=1)
+    split = run_billing(db_path, "2026-10", os.path.join(tmp_path, "three"), "json", workers=3)
+    ranges = split_student_ranges(db_path, 3)
+    with open(single["files"][0], encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    lines = []
+    for path in split["files"]:
+        with open(path, encoding="utf-8") as file:
+            lines.extend(json.loads(line) for line in file)
+    empty = run_billing(db_path, "2025-01", os.path.join(tmp_path, "empty"))
+
+    grand_total = round(sum(expected_total(student_id) for student_id in range(1, 7)), 2)
+    assert single["invoices"] == split["invoices"] == 6 and single["total"] == split["total"] == grand_total
+    assert ranges == [(1, 2), (3, 4), (5, 6)] and len(split["files"]) == 3, (ranges, split)
+    assert [float(row["total"]) for row in rows] == [expected_total(student_id) for student_id in range(1, 7)]
+    assert sorted(line["student_id"] for line in lines) == [1, 2, 3, 4, 5, 6]
+    assert empty["invoices"] == 0 and empty["total"] == 0
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test the local Open Food Facts mirror: ingest a JSONL.gz and a CSV dump,
+search and barcode lookups, and FoodAPI falling back to the network on misses
+"""
+
+import csv
+import gzip
+import json
+import os
+
+from food_api_stub_server import StubServer, build_products
+from openfoodfacts_mirror import NUMBER_FIELDS, OpenFoodFactsMirror
+from skolmaten_api import FoodAPI
+
+
+def write_jsonl_dump(path: str, products: list) -> None:
+    """Same shape as the real export: nutrition values nested under "nutriments" plus unused fields"""
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        for product in products:
+            record = {key: value for key, value in product.items() if key not in NUMBER_FIELDS}
+            record["nutriments"] = {field: product[field] for field in NUMBER_FIELDS if field in product}
+            record["images"] = {"front": {"sizes": {"400": {"h": 400, "w": 300}}}}
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        file.write("{broken line\n")
+        file.write(json.dumps({"product_name": "Utan streckkod"}) + "\n")
+
+
+def write_csv_dump(path: str, products: list) -> None:
+    fields = ["code", "product_name", "categories", "brands", "proteins_100g", "energy_100g", "url"]
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fields, delimiter="\t", extrasaction="ignore")
+        writer.writeheader()
+        for product in products:
+            writer.writerow(dict(product, url="https://example.org"))
+
+
+def test_ingest_and_lookup(tmp_path):
+    dump = os.path.join(tmp_path, "products.jsonl.gz")
+    write_jsonl_dump(dump, build_products(300))
+    mirror = OpenFoodFactsMirror(os.path.join(tmp_path, "mirror.db"))
+    result = mirror.ingest(dump, batch_size=64)
+
+    assert result["stored"] == 300 and result["skipped"] == 1, result
+    product = mirror.get_product("7300000000003")["product"]
+    assert product["product_name"] == "Nötfärs 3" and product["proteins_100g"] == 21.0
+    assert mirror.get_product("123") is None
+
+    page = mirror.search("pasta", page_size=10, page=2)
+    assert page["count"] == 30 and len(page["products"]) == 10, page["count"]
+    assert mirror.search("finns inte") is None
+
+    # Ny inläsning skriver över i stället för att duplicera
+    mirror.ingest(dump)
+    assert mirror.product_count() == 300
+
+
+def test_csv_dump(tmp_path):
+    dump = os.path.join(tmp_path, "products.csv")
+    write_csv_dump(dump, build_products(50))
+    mirror = OpenFoodFactsMirror(os.path.join(tmp_path, "mirror.db"))
+    result = mirror.ingest(dump)
+    assert result["stored"] == 50, result
+    assert mirror.search("kyckling")["count"] == 5
+    assert mirror.get_product("7300000000001")["product"]["proteins_100g"] == 7.0
+
+
+def test_food_api_uses_mirror_first(tmp_path):
+    with StubServer(product_count=500) as server:
+        dump = os.path.join(tmp_path, "products.jsonl.gz")
+        write_jsonl_dump(dump, build_products(100))
+        mirror = OpenFoodFactsMirror(os.path.join(tmp_path, "mirror.db"))
+        mirror.ingest(dump)
+        api = FoodAPI(server.openfoodfacts_url, server.themealdb_url, mirror=mirror)
+
+        assert api.get_product_by_barcode("7300000000010")["status"] == 1
+        assert len(api.search_food_products("pasta", page_size=5)["products"]) == 5
+        assert server.request_count == 0
+
+        # Streckkod utanför spegeln hämtas från nätet
+        assert api.get_product_by_barcode("7300000000400")["status"] == 1
+        assert server.request_count == 1
+        assert api.upstream_stats()["mirror"]["hits"] == 2
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Test group commit for orders: many threads share a few transactions and
+each gets its own transaction id, idempotency keys replay within and across
+batches, a failing batch falls back to one order at a time, a stalled or
+dead writer thread never leaves a request waiting forever, and /api/order
+goes through the batcher
+"""
+
+import sqlite3
+import threading
+
+import flask_test_env
+from lunch_system_database import SchoolLunchDB
+from order_batcher import OrderBatcher
+
+
+def make_db(make_lunch_db) -> SchoolLunchDB:
+    meals = [{"name": f"Rätt {index}", "price": 40.0 + index, "category": "Test"} for index in range(3)]
+    return make_lunch_db("orders.db", meals=meals, students=20)
+
+
+def run_threads(count: int, work):
+    results = [None] * count
+
+    def run(index):
+        results[index] = work(index)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_orders_share_commits(make_lunch_db):
+    lunch_db = make_db(make_lunch_db)
+    batcher = OrderBatcher(lunch_db, max_batch_size=16, max_wait=0.02)
+    results = run_threads(60, lambda index: batcher.submit(1 + index % 20, 1 + index % 3, "2026-10-19"))
+    stats = batcher.stats()
+    batcher.close()
+    rows = {row["id"]: row for row in lunch_db.db.execute("SELECT * FROM transactions")}
+
+    ids = [result["transaction_id"] for result in results]
+    assert len(set(ids)) == 60 and len(rows) == 60, results
+    for index, result in enumerate(results):
+        row = rows[result["transaction_id"]]
+        assert (row["student_id"], row["meal_id"]) == (1 + index % 20, 1 + index % 3)
+        assert row["price"] == 40.0 + index % 3 and not result["replayed"]
+    assert stats["batches"] < 60 and stats["largest_batch"] <= 16, stats
+
+
+def test_idempotency_keys_in_and_across_batches(make_lunch_db):
+    lunch_db = make_db(make_lunch_db)
+    batcher = OrderBatcher(lunch_db, max_batch_size=32, max_wait=0.05)
+    same_batch = run_threads(10, lambda index: batcher.submit(1, 2, "2026-10-19", "klick-1"))
+    later = batcher.submit(1, 2, "2026-10-19", "klick-1")
+    batcher.close()
+    stored = lunch_db.db.execute("SELECT COUNT(*) FROM transactions")[0][0]
+
+    assert stored == 1
+    assert len({result["transaction_id"] for result in same_batch + [later]}) == 1
+    assert sum(not result["replayed"] for result in same_batch) == 1 and later["replayed"]
+
+
+class FailingOnceDB(SchoolLunchDB):
+    """Första batchen med fler än en beställning krockar, som när en annan process hinner före"""
+
+    failed = False
+
+    def record_transactions_bulk(self, orders):
+        if len(orders) > 1 and not self.failed:
+            self.failed = True
+            raise sqlite3.IntegrityError("UNIQUE constraint failed")
+        if any(order["meal_id"] == 999 for order in orders):
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+        return super().record_transactions_bulk(orders)
+
+
+def test_failed_batch_falls_back_per_order(make_lunch_db):
+    lunch_db = make_db(make_lunch_db)
+    db_path = lunch_db.db.db_path
+    failing = FailingOnceDB(db_path)
+    batcher = OrderBatcher(failing, max_batch_size=8, max_wait=0.05)
+    results = run_threads(4, lambda index: batcher.submit(1, 999 if index == 0 else 1, "2026-10-19"))
+    stats = batcher.stats()
+    batcher.close()
+    stored = lunch_db.db.execute("SELECT COUNT(*) FROM transactions")[0][0]
+
+    assert stats["fallbacks"] == 1, stats
+    assert "error" in results[0] and all("transaction_id" in result for result in results[1:]), results
+    assert stored == 3
+
+
+class StallingDB(SchoolLunchDB):
+    """Writer-tråden fastnar i sin första batch tills release sätts"""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.release = threading.Event()
+        self.writer_calls = 0
+
+    def record_transactions_bulk(self, orders):
+        if threading.current_thread().name == "order-batcher":
+            self.writer_calls += 1
+            if self.writer_calls == 1:
+                self.release.wait(5)
+        return super().record_transactions_bulk(orders)
+
+
+def test_stalled_writer_times_out(make_lunch_db):
+    db_path = make_db(make_lunch_db).db.db_path
+    stalling = StallingDB(db_path)
+    batcher = OrderBatcher(stalling, max_wait=0.01, submit_timeout=0.3)
+    stuck = {}
+    first = threading.Thread(target=lambda: stuck.update(batcher.submit(1, 1, "2026-10-19", "nyckel-1")))
+    first.start()
+    threading.Event().wait(0.1)
+    # Skrivtråden sitter fast med den första beställningen - den andra står kvar i kön
+    direct = batcher.submit(2, 2, "2026-10-19", "nyckel-2")
+    first.join()
+    stalling.release.set()
+    after = batcher.submit(3, 1, "2026-10-19")
+    stats = batcher.stats()
+    batcher.close()
+    keys = [row[0] for row in stalling.db.execute(
+        "SELECT external_transaction_id FROM transactions ORDER BY id")]
+
+    assert stuck.get("timed_out") and "error" in stuck, stuck
+    assert "transaction_id" in direct and not direct["replayed"], direct
+    assert "transaction_id" in after, after
+    # Den kvarlämnade beställningen i kön sparas inte en gång till av skrivtråden
+    assert keys == ["nyckel-2", "nyckel-1", None], keys
+    assert stats["timeouts"] == 1 and stats["direct_writes"] == 1, stats
+
+
+class DyingDB(SchoolLunchDB):
+    """Skrivtråden dör mitt i sin första batch"""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.died = False
+
+    def record_transactions_bulk(self, orders):
+        if not self.died and threading.current_thread().name == "order-batcher":
+            self.died = True
+            raise SystemExit()
+        return super().record_transactions_bulk(orders)
+
+
+def test_dead_writer_is_replaced(make_lunch_db):
+    db_path = make_db(make_lunch_db).db.db_path
+    dying = DyingDB(db_path)
+    batcher = OrderBatcher(dying, max_wait=0.01, submit_timeout=1.0)
+    # Tråden dör med flit - ingen traceback i testutskriften
+    previous_hook, threading.excepthook = threading.excepthook, lambda args: None
+    try:
+        lost = batcher.submit(1, 1, "2026-10-19")
+        saved = batcher.submit(2, 1, "2026-10-19")
+    finally:
+        threading.excepthook = previous_hook
+    batcher.close()
+
+    assert lost.get("timed_out"), lost
+    assert "transaction_id" in saved, saved
+
+
+def test_flask_order_uses_batcher(make_lunch_db):
+    lunch_db = make_db(make_lunch_db)
+    batcher = OrderBatcher(lunch_db)
+    with flask_test_env.serving(db=lunch_db, order_batcher=batcher) as client:
+        with client.session_transaction() as session:
+            session['username'] = 'Elev 0'
+            session['student_id'] = 1
+        plain = client.post('/api/order', json={'meal_id': 1})
+        first = client.post('/api/order', json={'meal_id': 2}, headers={'Idempotency-Key': 'abc'})
+        retry = client.post('/api/order', json={'meal_id': 2}, headers={'Idempotency-Key': 'abc'})
+        string_retry = client.post('/api/order', json={'meal_id': '2'}, headers={'Idempotency-Key': 'abc'})
+        conflict = client.post('/api/order', json={'meal_id': 3}, headers={'Idempotency-Key': 'abc'})
+        invalid = client.post('/api/order', json={'meal_id': 'två'}, headers={'Idempotency-Key': 'def'})
+        with client.session_transaction() as session:
+            session['student_id'] = 2
+        other_student = client.post('/api/order', json={'meal_id': 2}, headers={'Idempotency-Key': 'abc'})
+    stats = batcher.stats()
+    batcher.close()
+
+    assert plain.status_code == 200 and plain.json['transaction_id']
+    assert first.json['replayed'] is False and retry.json['replayed'] is True
+    assert first.json['transaction_id'] == retry.json['transaction_id']
+    assert string_retry.status_code == 200 and string_retry.json['replayed'] is True
+    assert string_retry.json['transaction_id'] == first.json['transaction_id']
+    assert conflict.status_code == 409 and other_student.status_code == 409
+    assert invalid.status_code == 400
+    assert stats["orders"] == 6, stats
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test that the compiled keyword classifier gives exactly the same category
+and price bonus as the original any(...) chains in FoodAPI
+"""
+
+import random
+
+from food_api_stub_server import build_products
+from product_classifier import DEFAULT_CLASSIFIER, KeywordClassifier
+
+
+def legacy_category(categories: str, name: str) -> str:
+    if any(word in categories + name for word in ['kött', 'meat', 'beef', 'pork']):
+        return 'Kött'
+    elif any(word in categories + name for word in ['fisk', 'fish', 'seafood']):
+        return 'Fisk & Skaldjur'
+    elif any(word in categories + name for word in ['chicken', 'kyckling', 'poultry']):
+        return 'Kyckling'
+    elif any(word in categories + name for word in ['vegetarian', 'vegetarisk', 'vegan', 'vegansk']):
+        return 'Vegetariskt'
+    elif any(word in categories + name for word in ['pasta', 'noodles']):
+        return 'Pasta'
+    elif any(word in categories + name for word in ['soup', 'soppa']):
+        return 'Soppa'
+    elif any(word in categories + name for word in ['dessert', 'efterrätt', 'sweet']):
+        return 'Efterrätt'
+    return 'Huvudrätt'
+
+
+def legacy_price_bonus(cat: str) -> float:
+    if any(word in cat for word in ['kött', 'meat', 'beef', 'pork', 'lamb']):
+        return 25.0
+    if any(word in cat for word in ['fisk', 'fish', 'seafood', 'salmon']):
+        return 22.0
+    if any(word in cat for word in ['chicken', 'kyckling', 'poultry']):
+        return 18.0
+    if 'organic' in cat or 'ekologisk' in cat:
+        return 12.0
+    if any(word in cat for word in ['cheese', 'ost', 'dairy']):
+        return 10.0
+    if any(word in cat for word in ['pasta', 'bread', 'cereals']):
+        return 5.0
+    return 0.0
+
+
+FRAGMENTS = ["kött", "meat", "fisk", "fish", "sea", "food", "chick", "en", "vegan", "vegetari", "sk", "an",
+             "pasta", "soup", "soppa", "sweet", "dessert", "ost", "cheese", "lamb", "salmon", "organic",
+             "ekologisk", "bread", "cereals", "dairy", "poultry", "noodles", ", ", " ", "x", "Ö"]
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 6))).lower()
+
+
+def test_matches_legacy_on_random_text():
+    """Fragment soup incl. keywords split across the categories/name boundary"""
+    rng = random.Random(38)
+    for _ in range(20000):
+        categories, name = random_text(rng), random_text(rng)
+        category, bonus = DEFAULT_CLASSIFIER.classify_text(categories, name)
+        assert category == legacy_category(categories, name), (categories, name, category)
+        assert bonus == legacy_price_bonus(categories), (categories, bonus)
+
+
+def test_batch_matches_single_products():
+    products = build_products(200) + [{"categories": None, "product_name": None}, {}]
+    results = DEFAULT_CLASSIFIER.classify_batch(products)
+    for product, result in zip(products, results):
+        categories = (product.get('categories') or '').lower()
+        name = (product.get('product_name') or '').lower()
+        assert result == (legacy_category(categories, name), legacy_price_bonus(categories))
+
+
+def test_custom_rules():
+    classifier = KeywordClassifier([("category", "Bröd", ["bröd"]), ("price_bonus", 3.0, ["bröd"])],
+                                   default_category="Övrigt")
+    assert classifier.classify_text("fullkornsbröd") == ("Bröd", 3.0)
+    assert classifier.classify_text("", "bröd") == ("Bröd", 0.0)
+    assert classifier.classify_text("mjölk") == ("Övrigt", 0.0)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test write-behind ratings: concurrent submits end up as the exact average in
+a few batched transactions, acknowledged ratings survive a crash via the
+spool file and are applied exactly once, a torn last line is ignored,
+buffers in several processes on the same spool path get their own slot and
+a dead process's slot is taken over, and /api/rate acknowledges before the
+write
+"""
+
+import os
+import threading
+
+import flask_test_env
+from lunch_system_database import SchoolLunchDB
+from rating_buffer import RatingBuffer
+
+
+def meal_rating(lunch_db: SchoolLunchDB, meal_id: int):
+    return tuple(lunch_db.db.execute("SELECT rating, rating_count FROM meals WHERE id = ?", (meal_id,))[0])
+
+
+def test_concurrent_submits_are_batched(tmp_path, make_lunch_db):
+    lunch_db = make_lunch_db("ratings.db", meals=3)
+    buffer = RatingBuffer(lunch_db, spool_path=os.path.join(tmp_path, "ratings.spool"), flush_interval=0.05)
+    buffer.start()
+
+    def rate_many(rating):
+        for _ in range(200):
+            buffer.submit(1, rating)
+
+    threads = [threading.Thread(target=rate_many, args=(rating,)) for rating in (1, 2, 4, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.close()
+    rating, count = meal_rating(lunch_db, 1)
+    stats = buffer.stats()
+    changes = lunch_db.db.execute("SELECT COUNT(*) FROM changelog WHERE operation = 'rate'")[0][0]
+    spool_left = os.path.getsize(os.path.join(tmp_path, "ratings.spool"))
+
+    assert count == 800 and abs(rating - 3.0) < 1e-9, (rating, count)
+    assert stats["flushed"] == 800 and stats["pending"] == 0
+    assert stats["flushes"] < 100 and changes == stats["flushes"], stats
+    assert spool_left == 0
+
+
+def test_crash_replay_applies_once(tmp_path, make_lunch_db):
+    spool_path = os.path.join(tmp_path, "ratings.spool")
+    lunch_db = make_lunch_db("ratings.db", meals=3)
+
+    first = RatingBuffer(lunch_db, spool_path=spool_path, flush_interval=60)
+    first.start()
+    first.submit(1, 5)
+    first.submit(2, 3)
+    first.flush()
+    first.submit(1, 1)
+    first.submit(3, 4)
+    # "Krasch": inget close(), och en halvskriven rad i slutet
+    first._spool.write('{"seq": 99, "meal_')
+    first._spool.flush()
+    first._stopped.set()
+    first._slot_lock.close()  # Processen dör - låset på platsen släpps
+
+    second = RatingBuffer(make_lunch_db("ratings.db"), spool_path=spool_path, flush_interval=60)
+    replayed = second.start()
+    second.close()
+    third = RatingBuffer(make_lunch_db("ratings.db"), spool_path=spool_path, flush_interval=60)
+    replayed_again = third.start()
+    next_seq = third.submit(2, 5)
+    third.close()
+    ratings = [meal_rating(third.db, meal_id) for meal_id in (1, 2, 3)]
+
+    assert replayed == 2 and replayed_again == 0
+    assert next_seq == 5, next_seq
+    assert ratings == [(3.0, 2), (4.0, 2), (4.0, 1)], ratings
+
+
+def test_processes_get_own_slots(tmp_path, make_lunch_db):
+    spool_path = os.path.join(tmp_path, "ratings.spool")
+    make_lunch_db("ratings.db", meals=3)
+
+    # Två "workers" mot samma databas och samma spool_path
+    first = RatingBuffer(make_lunch_db("ratings.db"), spool_path=spool_path, flush_interval=60)
+    second = RatingBuffer(make_lunch_db("ratings.db"), spool_path=spool_path, flush_interval=60)
+    first.start()
+    second.start()
+    seqs = [first.submit(1, 5), second.submit(1, 1), second.submit(2, 2)]
+    first.submit(3, 4)
+    # Den andras flush skriver om sin egen spool - den förstas obekräftade betyg ligger kvar
+    second.flush()
+    first_spool = [entry[0] for entry in first._read_spool()]
+    second.submit(2, 4)
+    second.submit(3, 2)
+    second._stopped.set()
+    second._slot_lock.close()  # Den andra processen dör med två betyg i sin spool
+    first.close()
+
+    third = RatingBuffer(make_lunch_db("ratings.db"), spool_path=spool_path, flush_interval=60)
+    replayed = third.start()
+    third.close()
+    ratings = [meal_rating(third.db, meal_id) for meal_id in (1, 2, 3)]
+    states = dict(tuple(row) for row in third.db.db.execute("SELECT name, last_seq FROM rating_flush_state"))
+    files = sorted(name for name in os.listdir(tmp_path) if name.endswith(".spool"))
+
+    assert (first.slot, second.slot, third.slot) == (0, 1, 0), (first.slot, second.slot, third.slot)
+    assert second.spool_path.endswith("ratings.1.spool") and second.name == "ratings.1"
+    assert seqs == [1, 1, 2] and first_spool == [1, 2], (seqs, first_spool)
+    assert replayed == 0 and third.adopted == 2, (replayed, third.adopted)
+    assert ratings == [(3.0, 2), (3.0, 2), (3.0, 2)], ratings
+    assert states == {"ratings": 2, "ratings.1": 4} and files == ["ratings.spool"], (states, files)
+
+
+def test_max_pending_wakes_flusher(make_lunch_db):
+    lunch_db = make_lunch_db("ratings.db", meals=3)
+    buffer = RatingBuffer(lunch_db, durability="memory", flush_interval=60, max_pending=10)
+    buffer.start()
+    for _ in range(10):
+        buffer.submit(2, 4)
+    for _ in range(200):
+        if buffer.stats()["flushed"] == 10:
+            break
+        threading.Event().wait(0.01)
+    flushed = buffer.stats()["flushed"]
+    buffer.close()
+
+    assert flushed == 10, flushed
+
+
+def test_flask_rate_is_buffered(tmp_path, make_lunch_db):
+    lunch_db = make_lunch_db("ratings.db", meals=3)
+    buffer = RatingBuffer(lunch_db, spool_path=os.path.join(tmp_path, "ratings.spool"), flush_interval=60)
+    with flask_test_env.serving(db=lunch_db, rating_buffer=buffer) as client:
+        with client.session_transaction() as session:
+            session['username'] = 'Test Elev'
+        ok = client.post('/api/rate', json={'meal_id': 1, 'rating': 4})
+        unknown = client.post('/api/rate', json={'meal_id': 999, 'rating': 4})
+        invalid = client.post('/api/rate', json={'meal_id': 1, 'rating': 9})
+        before_flush = meal_rating(lunch_db, 1)
+        buffer.flush()
+        after_flush = meal_rating(lunch_db, 1)
+    buffer.close()
+
+    assert ok.status_code == 200 and ok.json['success'] and ok.json['seq'] == 1
+    assert unknown.status_code == 500 and invalid.status_code == 400
+    assert before_flush == (0.0, 0) and after_flush == (4.0, 1), (before_flush, after_flush)
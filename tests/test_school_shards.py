@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test per-school databases: school keys route to their own file, schools do
+not see each other's students, meals or orders, cross-school reports merge
+every school, and the web server in LUNCH_SCHOOLS_DIR mode sends each
+logged-in student to their own school's database
+"""
+
+import os
+
+import flask_test_env
+from school_shards import SchoolShardRouter
+
+
+def make_router(workdir) -> SchoolShardRouter:
+    router = SchoolShardRouter(os.path.join(workdir, "schools"))
+    north, south = router.for_school("norra"), router.for_school("sodra")
+    north.add_meals_bulk([{"name": "Pasta", "price": 40.0, "category": "Lunch"},
+                          {"name": "Soppa", "price": 30.0, "category": "Lunch"}])
+    south.add_meals_bulk([{"name": "Pasta", "price": 45.0, "category": "Lunch"}])
+    north.add_student({"name": "Alva Norr"})
+    south.add_student({"name": "Sam Söder"})
+    south.add_student({"name": "Alva Norr"})  # Samma namn på båda skolorna
+    north.record_transaction(1, 1, "2026-10-19")
+    north.record_transaction(1, 2, "2026-10-19")
+    south.record_transaction(1, 1, "2026-10-19")
+    return router
+
+
+def test_routing_and_isolation(tmp_path):
+    router = make_router(tmp_path)
+    same = router.for_school("  NORRA ") is router.for_school("norra")
+    files = sorted(os.listdir(router.shard_dir))
+    keys = router.school_keys()
+    north_students = [row["name"] for row in router.for_school("norra").db.execute("SELECT name FROM students")]
+    south_meals = [row["price"] for row in router.for_school("sodra").db.execute("SELECT price FROM meals")]
+    errors = []
+    for bad_key, create in (("../annan", True), ("", True), ("okand", False)):
+        try:
+            router.for_school(bad_key, create=create)
+        except ValueError as e:
+            errors.append(str(e))
+    router.close()
+    reopened = SchoolShardRouter(router.shard_dir).school_keys()
+
+    assert same and files == ["norra.db", "sodra.db"] and keys == ["norra", "sodra"], (files, keys)
+    assert north_students == ["Alva Norr"] and south_meals == [45.0], (north_students, south_meals)
+    assert len(errors) == 3 and "okand.db" not in files, errors
+    assert reopened == ["norra", "sodra"]
+
+
+def test_cross_school_reports(tmp_path):
+    router = make_router(tmp_path)
+    totals = router.get_report_totals()
+    popularity = router.get_meal_popularity(limit=5)
+    matches = router.search_meals("Pasta")
+    router.close()
+
+    assert (totals["students"], totals["meals"], totals["transactions"]) == (3, 3, 3), totals
+    assert totals["revenue"] == 40.0 + 30.0 + 45.0 and set(totals["schools"]) == {"norra", "sodra"}
+    assert popularity[0] == {"name": "Pasta", "category": "Lunch", "orders": 2}, popularity
+    assert [(meal["school"], meal["price"]) for meal in matches] == [("norra", 40.0), ("sodra", 45.0)]
+
+
+def login(client, school: str, name: str):
+    return client.post('/login', data={'school': school, 'username': name})
+
+
+def test_web_server_routes_by_school(tmp_path):
+    import flask_server
+    router = make_router(tmp_path)
+    schools = {}
+    with flask_test_env.serving(school_router=router, _schools=schools) as client:
+        login_page = client.get('/').get_data(as_text=True)
+        login(client, 'Norra', 'alva norr')
+        with client.session_transaction() as session:
+            north_session = dict(session)
+        north_meals = client.get('/api/meals').json
+        north_order = client.post('/api/order', json={'meal_id': 2})
+        login(client, 'sodra', 'Alva Norr')
+        south_meals = client.get('/api/meals').json
+        south_order = client.post('/api/order', json={'meal_id': 1})
+        unknown = login(client, 'finns-inte', 'Alva Norr')
+    for services in schools.values():
+        services.rating_buffer.close()
+        services.order_batcher.close()
+    north_orders = router.for_school('norra').db.execute("SELECT COUNT(*) FROM transactions")[0][0]
+    south_prices = [row["price"] for row in
+                    router.for_school('sodra').db.execute("SELECT price FROM transactions ORDER BY id")]
+    files = sorted(name for name in os.listdir(router.shard_dir) if name.endswith('.db'))
+    router.close()
+
+    assert 'name="school"' in login_page
+    assert north_session['school'] == 'norra' and north_session['student_id'] == 1
+    assert sorted(meal['price'] for meal in north_meals) == [30.0, 40.0], north_meals
+    assert [meal['price'] for meal in south_meals] == [45.0], south_meals
+    assert north_order.status_code == 200 and south_order.status_code == 200
+    # Södra skolans elev 1 beställer södra skolans rätt 1, till södra skolans pris
+    assert north_orders == 3 and south_prices == [45.0, 45.0], (north_orders, south_prices)
+    assert unknown.status_code == 302 and files == ["norra.db", "sodra.db"], files
+    assert flask_server.school_router is None and flask_server._schools == {}
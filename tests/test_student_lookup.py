@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test the login lookup: normalized names (case, whitespace, å/ä/ö), the
+indexed query, backfill of older databases and of students inserted
+elsewhere while running, the name cache being cleared when students
+change, and a quiet Flask login through the shared pool
+"""
+
+import io
+import sqlite3
+from contextlib import redirect_stdout
+
+import flask_test_env
+from lunch_system_database import normalize_name
+
+
+def test_normalized_lookup_uses_index(make_lunch_db):
+    db = make_lunch_db("students.db")
+    anna = db.add_student({"name": "Anna Andersson", "grade": "9"})
+    asa = db.add_student({"name": "Åsa Öberg", "grade": "8"})
+
+    found = [db.find_student_by_name(name) for name in
+             ("anna andersson", "  ANNA   Andersson ", "åsa öberg", "ÅSA ÖBERG")]
+    missing = db.find_student_by_name("Okänd Elev")
+    empty = db.find_student_by_name("   ")
+    plan = " ".join(row[3] for row in db.db.execute(
+        "EXPLAIN QUERY PLAN SELECT id, name FROM students WHERE name_normalized = ? ORDER BY id LIMIT 1",
+        ("anna andersson",)))
+
+    assert found == [(anna, "Anna Andersson")] * 2 + [(asa, "Åsa Öberg")] * 2, found
+    assert missing is None and empty is None
+    assert "idx_students_name_normalized" in plan, plan
+
+
+def test_cache_cleared_when_students_change(make_lunch_db):
+    db = make_lunch_db("students.db")
+    student_id = db.add_student({"name": "Erik Svensson"})
+    assert db.find_student_by_name("erik svensson") == (student_id, "Erik Svensson")
+    cached_before = len(db._student_cache)
+
+    db.add_student({"name": "Lisa Berg"})
+    cached_after_add = len(db._student_cache)
+    lisa = db.find_student_by_name("lisa berg")
+
+    assert cached_before == 1 and cached_after_add == 0
+    assert lisa is not None and lisa[1] == "Lisa Berg"
+
+
+def test_existing_database_is_backfilled(make_lunch_db):
+    path = make_lunch_db("old.db").db.db_path
+    conn = sqlite3.connect(path)
+    # Rader från äldre versioner eller andra verktyg saknar normaliserat namn
+    conn.execute("INSERT INTO students (name, grade) VALUES ('Karin Ödman', '7')")
+    conn.commit()
+    conn.close()
+
+    reopened = make_lunch_db("old.db")
+    student = reopened.find_student_by_name("karin ödman")
+
+    assert student is not None and student[1] == "Karin Ödman"
+    assert normalize_name("  Karin\tÖdman ") == "karin ödman"
+
+
+def test_students_added_elsewhere_can_log_in(make_lunch_db):
+    db = make_lunch_db("students.db")
+    path = db.db.db_path
+    db.add_student({"name": "Erik Svensson"})
+    db.find_student_by_name("erik svensson")
+    # Medan servern kör lägger ett annat verktyg in en elev direkt med SQL
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO students (name, grade) VALUES ('Åsa  Öberg', '8')")
+    conn.commit()
+    conn.close()
+    student = db.find_student_by_name("åsa öberg")
+    stored = db.db.execute("SELECT name_normalized FROM students WHERE name = 'Åsa  Öberg'")[0][0]
+    missing = db.find_student_by_name("Ingen Alls")
+
+    assert student is not None and student[1] == "Åsa  Öberg", student
+    assert stored == "åsa öberg" and missing is None
+
+
+def test_flask_login_is_quiet(make_lunch_db):
+    db = make_lunch_db("students.db")
+    student_id = db.add_student({"name": "Maja Lind"})
+    output = io.StringIO()
+    with flask_test_env.serving(db=db) as client, redirect_stdout(output):
+        ok = client.post('/login', data={'username': ' maja LIND'})
+        with client.session_transaction() as session:
+            logged_in = dict(session)
+        failed = client.post('/login', data={'username': 'Ingen Alls'})
+
+    assert ok.status_code == 302 and ok.headers['Location'].endswith('/dashboard')
+    assert logged_in['student_id'] == student_id and logged_in['username'] == "Maja Lind"
+    assert failed.status_code == 302 and failed.headers['Location'].endswith('/')
+    assert output.getvalue() == "", output.getvalue()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the TheMealDB catalog crawler against the local stub server:
+full catalog without duplicates, resume from checkpoint, retry of failed listings
+"""
+
+import os
+
+from food_api_stub_server import StubServer
+from lunch_system_database import SchoolLunchDB
+from skolmaten_api import FoodAPI
+from themealdb_crawler import TheMealDBCrawler
+from upstream_resilience import RetryPolicy, UpstreamGuard
+
+
+def make_crawler(server: StubServer, workdir: str, db: SchoolLunchDB) -> TheMealDBCrawler:
+    guard = UpstreamGuard(RetryPolicy(max_attempts=1), rate_per_second=None, failure_threshold=1000)
+    api = FoodAPI(server.openfoodfacts_url, server.themealdb_url, guard=guard)
+    return TheMealDBCrawler(db, api, os.path.join(workdir, "crawl.json"), max_workers=4)
+
+
+def meal_names(db: SchoolLunchDB) -> list:
+    return [row[0] for row in db.db.execute("SELECT name FROM meals")]
+
+
+def test_full_catalog_without_duplicates(tmp_path, make_lunch_db):
+    with StubServer(meal_count=60) as server:
+        db = make_lunch_db("crawl.db")
+        result = make_crawler(server, tmp_path, db).crawl()
+        names = meal_names(db)
+
+    assert len(names) == 60 and len(set(names)) == 60, len(names)
+    assert result["added"] == 60 and result["errors"] is None, result
+
+
+def test_resume_from_checkpoint(tmp_path, make_lunch_db):
+    with StubServer(meal_count=60) as server:
+        db = make_lunch_db("crawl.db")
+        first = make_crawler(server, tmp_path, db).crawl(letters="ts", categories=[])
+        requests_before = server.request_count
+
+        # Ny process: läser checkpoint och hämtar inte om de klara listorna
+        resumed = make_crawler(server, tmp_path, db)
+        assert resumed.done_listings == {"letter:t", "letter:s"}
+        second = resumed.crawl(letters="ts")
+        names = meal_names(db)
+
+    assert first["added"] > 0 and first["added"] + second["added"] == 60, (first, second)
+    assert server.request_count - requests_before == 1 + 8 + second["lookups"]
+    assert len(set(names)) == len(names) == 60
+
+
+def test_failed_listings_are_retried(tmp_path, make_lunch_db):
+    with StubServer(meal_count=60, error_rate=1.0) as server:
+        db = make_lunch_db("crawl.db")
+        failed = make_crawler(server, tmp_path, db).crawl(letters="abc", categories=["Beef"])
+        assert failed["errors"] and failed["listings"] == 0
+
+        server.configure(error_rate=0.0)
+        retried = make_crawler(server, tmp_path, db).crawl(letters="abc", categories=["Beef"])
+
+    assert retried["listings"] == 4 and retried["errors"] is None, retried
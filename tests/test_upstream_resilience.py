@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test FoodAPI retry, circuit breaker and rate limiter against the local
+fault-injecting stub server (no internet needed)
+"""
+
+import time
+
+from food_api_stub_server import StubServer
+from skolmaten_api import FoodAPI
+from upstream_resilience import RetryPolicy, UpstreamGuard
+
+
+def make_api(server: StubServer, guard: UpstreamGuard) -> FoodAPI:
+    return FoodAPI(server.openfoodfacts_url, server.themealdb_url, guard=guard)
+
+
+def test_retries_hide_transient_errors():
+    """30% injected 503s - retries should still give a product for every call"""
+    with StubServer(error_rate=0.3, seed=7) as server:
+        guard = UpstreamGuard(RetryPolicy(max_attempts=5, base_delay=0.001, max_delay=0.01, max_budget=50),
+                              rate_per_second=None, failure_threshold=100)
+        api = make_api(server, guard)
+        results = [api.get_product_by_barcode(str(i)) for i in range(30)]
+
+    assert all("error" not in result for result in results)
+    assert guard.stats()["retry"]["retries"] > 0
+
+
+def test_circuit_breaker_fails_fast_and_recovers():
+    """Upstream down -> breaker opens and stops calling; half-open probe closes it again"""
+    with StubServer(error_rate=1.0) as server:
+        guard = UpstreamGuard(RetryPolicy(max_attempts=1), rate_per_second=None,
+                              failure_threshold=3, reset_timeout=0.2)
+        api = make_api(server, guard)
+
+        for i in range(10):
+            api.get_product_by_barcode(str(i))
+        host_stats = list(guard.stats()["hosts"].values())[0]["circuit_breaker"]
+        assert host_stats["state"] == "open"
+        assert server.request_count == 3
+        assert host_stats["rejected"] == 7
+
+        server.configure(error_rate=0.0)
+        time.sleep(0.25)
+        result = api.get_product_by_barcode("42")
+        host_stats = list(guard.stats()["hosts"].values())[0]["circuit_breaker"]
+
+    assert "error" not in result
+    assert host_stats["state"] == "closed"
+
+
+def test_rate_limiter_spaces_requests():
+    """5 req/s with burst 2 -> 7 calls need at least ~1 second"""
+    with StubServer() as server:
+        guard = UpstreamGuard(rate_per_second=5, burst=2)
+        api = make_api(server, guard)
+        started = time.monotonic()
+        for i in range(7):
+            api.get_product_by_barcode(str(i))
+        elapsed = time.monotonic() - started
+
+    limiter_stats = list(guard.stats()["hosts"].values())[0]["rate_limiter"]
+    assert elapsed >= 0.9
+    assert limiter_stats["acquired"] == 7
@@ -0,0 +1,217 @@
+"""
+Hämtar hela TheMealDB-katalogen i stället för slumpade recept
+Går igenom bokstavs- och kategorilistorna parallellt (med tak för antal
+samtidiga anrop), slår ihop dubbletter på idMeal, hämtar detaljer för
+måltider som bara listats och sparar dem i omgångar i databasen.
+Förloppet sparas i en checkpoint-fil så att en avbruten körning kan
+återupptas där den slutade.
+"""
+
+import argparse
+import json
+import os
+import string
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from lunch_system_database import SchoolLunchDB
+from skolmaten_api import FoodAPI, get_default_api
+
+DEFAULT_CHECKPOINT_PATH = "themealdb_crawl.json"
+LETTERS = string.ascii_lowercase
+
+
+def _is_full_meal(meal: Dict[str, Any]) -> bool:
+    """filter.php ger bara id, namn och bild - fullständiga måltider har kategori och instruktioner"""
+    return bool(meal.get('strCategory') or meal.get('strInstructions'))
+
+
+class TheMealDBCrawler:
+    """Återupptagbar genomgång av TheMealDB:s bokstavs- och kategorilistor"""
+
+    def __init__(self, db: SchoolLunchDB, api: Optional[FoodAPI] = None,
+                 checkpoint_path: str = DEFAULT_CHECKPOINT_PATH, max_workers: int = 4) -> None:
+        self.db: SchoolLunchDB = db
+        self.api: FoodAPI = api or get_default_api()
+        self.checkpoint_path: str = checkpoint_path
+        self.max_workers: int = max_workers
+        self.done_listings: Set[str] = set()
+        self.stored_ids: Set[str] = set()
+        self.pending_ids: Set[str] = set()
+        self._load_checkpoint()
+
+    def _load_checkpoint(self) -> None:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        self.done_listings = set(state.get("done_listings", []))
+        self.stored_ids = set(state.get("stored_ids", []))
+        self.pending_ids = set(state.get("pending_ids", []))
+
+    def save_checkpoint(self) -> None:
+        """Skriv förloppet atomiskt (tmp-fil + os.replace)"""
+        state = {
+            "done_listings": sorted(self.done_listings),
+            "stored_ids": sorted(self.stored_ids),
+            "pending_ids": sorted(self.pending_ids),
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def reset(self) -> None:
+        """Börja om från början"""
+        self.done_listings.clear()
+        self.stored_ids.clear()
+        self.pending_ids.clear()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _listings(self, letters: str, categories: Optional[List[str]]) -> Tuple[List[str], List[str]]:
+        errors = []
+        if categories is None:
+            result = self.api.list_meal_categories()
+            if "error" in result:
+                errors.append(result["error"])
+                categories = []
+            else:
+                categories = [item['strCategory'] for item in result.get('categories') or []]
+        listings = [f"letter:{letter}" for letter in letters] + [f"category:{name}" for name in categories]
+        return [listing for listing in listings if listing not in self.done_listings], errors
+
+    def _fetch_listing(self, listing: str) -> Dict[str, Any]:
+        kind, value = listing.split(":", 1)
+        if kind == "letter":
+            return self.api.list_meals_by_letter(value)
+        return self.api.list_meals_by_category(value)
+
+    def _store(self, meals: List[Dict[str, Any]], existing_names: Set[str]) -> Tuple[int, int]:
+        """Konvertera och spara nya måltider i en transaktion; returnerar (tillagda, överhoppade)"""
+        to_add = []
+        for local_meal in self.api.convert_themealdb_to_local({"meals": meals}):
+            if local_meal["name"] in existing_names:
+                continue
+            existing_names.add(local_meal["name"])
+            to_add.append({key: local_meal[key] for key in ("name", "description", "price", "category", "ingredients")
+                           if key in local_meal})
+        if to_add:
+            self.db.add_meals_bulk(to_add)
+        self.stored_ids.update(meal['idMeal'] for meal in meals)
+        return len(to_add), len(meals) - len(to_add)
+
+    def crawl(self, letters: str = LETTERS, categories: Optional[List[str]] = None,
+              deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Hämta och importera katalogen (hoppar över det som redan är klart enligt checkpoint)
+
+        Args:
+            letters: Bokstäver att gå igenom med search.php?f=
+            categories: Kategorier att gå igenom (None = hämta listan från TheMealDB)
+            deadline: Max antal sekunder; förloppet sparas och kan återupptas
+
+        Returns:
+            Dict med antal listor, uppslag, tillagda och överhoppade måltider samt fel
+        """
+        started = time.monotonic()
+        stop_at = started + deadline if deadline is not None else None
+        listings, errors = self._listings(letters, categories)
+        existing_names = {row[0] for row in self.db.db.execute("SELECT name FROM meals")}
+        stats = {"listings": 0, "lookups": 0, "added": 0, "skipped": 0}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        running: Dict[Future, Tuple[str, str]] = {}
+        queued_ids: Set[str] = set()
+
+        def lookup(meal_id: str) -> None:
+            queued_ids.add(meal_id)
+            running[executor.submit(self.api.lookup_meal, meal_id)] = ("lookup", meal_id)
+
+        try:
+            for listing in listings:
+                running[executor.submit(self._fetch_listing, listing)] = ("listing", listing)
+            for meal_id in self.pending_ids - self.stored_ids:
+                lookup(meal_id)
+
+            while running:
+                remaining = None if stop_at is None else stop_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    errors.append(f"Tidsgränsen på {deadline}s överskreds - kör igen för att fortsätta")
+                    break
+                done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, key = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"error": str(e)}
+                    if "error" in result:
+                        # Inte markerad som klar - tas om vid nästa körning
+                        errors.append(f"{key}: {result['error']}")
+                        continue
+
+                    ready = []
+                    for meal in result.get('meals') or []:
+                        meal_id = meal.get('idMeal')
+                        if not meal_id or meal_id in self.stored_ids:
+                            continue
+                        if _is_full_meal(meal):
+                            ready.append(meal)
+                        elif meal_id not in queued_ids:
+                            self.pending_ids.add(meal_id)
+                            lookup(meal_id)
+
+                    # Samma måltid kan finnas två gånger i samma svar
+                    ready = list({meal['idMeal']: meal for meal in ready}.values())
+                    added, skipped = self._store(ready, existing_names)
+                    stats["added"] += added
+                    stats["skipped"] += skipped
+                    self.pending_ids.difference_update(meal['idMeal'] for meal in ready)
+                    if kind == "listing":
+                        self.done_listings.add(key)
+                        stats["listings"] += 1
+                    else:
+                        self.pending_ids.discard(key)
+                        stats["lookups"] += 1
+                    self.save_checkpoint()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.save_checkpoint()
+
+        stats["meals_known"] = len(self.stored_ids)
+        stats["pending"] = len(self.pending_ids)
+        stats["errors"] = errors or None
+        stats["seconds"] = round(time.monotonic() - started, 2)
+        return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Importera hela TheMealDB-katalogen')
+    parser.add_argument('--db', default='test.db', help='Databasfil')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_PATH, help='Checkpoint-fil för återupptagning')
+    parser.add_argument('--workers', type=int, default=4, help='Max antal samtidiga anrop')
+    parser.add_argument('--letters', default=LETTERS, help='Bokstäver att gå igenom')
+    parser.add_argument('--deadline', type=float, default=None, help='Max antal sekunder för körningen')
+    parser.add_argument('--fresh', action='store_true', help='Ignorera tidigare checkpoint och börja om')
+
+    args = parser.parse_args()
+    crawler = TheMealDBCrawler(SchoolLunchDB(args.db), checkpoint_path=args.checkpoint, max_workers=args.workers)
+    if args.fresh:
+        crawler.reset()
+    elif crawler.done_listings:
+        print(f"↩️  Återupptar: {len(crawler.done_listings)} listor klara, {len(crawler.stored_ids)} måltider kända")
+
+    print(f"🍽️  Hämtar TheMealDB-katalogen till {args.db} ({args.workers} samtidiga anrop)")
+    result = crawler.crawl(args.letters, deadline=args.deadline)
+    print(f"✅ {result['added']} nya måltider, {result['skipped']} fanns redan "
+          f"({result['listings']} listor, {result['lookups']} uppslag, {result['seconds']}s)")
+    for error in result['errors'] or []:
+        print(f"⚠️  {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Motståndskraft mot långsamma eller trasiga externa API:er
+Retry med jitter och retry-budget, token bucket per värd och en
+circuit breaker som slutar anropa en värd som inte mår bra.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+# HTTP-statusar som räknas som fel hos servern och får försökas igen
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Värden är markerad som ohälsosam - anropet görs inte alls"""
+
+
+class RateLimitExceeded(requests.exceptions.ConnectionError):
+    """Ingen token blev ledig inom väntetiden"""
+
+
+class RetryPolicy:
+    """
+    Exponentiell backoff med full jitter och en retry-budget
+
+    Varje anrop sätter in `budget_ratio` tokens och varje nytt försök tar en,
+    så omförsök kan aldrig bli mer än en viss andel av trafiken.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0,
+                 budget_ratio: float = 0.2, max_budget: float = 10.0) -> None:
+        self.max_attempts: int = max_attempts
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.budget_ratio: float = budget_ratio
+        self.max_budget: float = max_budget
+        self._tokens: float = max_budget
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"requests": 0, "retries": 0, "budget_exhausted": 0}
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._counters["requests"] += 1
+            self._tokens = min(self.max_budget, self._tokens + self.budget_ratio)
+
+    def try_acquire_retry(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                self._counters["budget_exhausted"] += 1
+                return False
+            self._tokens -= 1
+            self._counters["retries"] += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, budget=round(self._tokens, 2))
+
+
+class TokenBucket:
+    """Begränsar antal anrop per sekund (med tillåten burst)"""
+
+    def __init__(self, rate_per_second: float, burst: int) -> None:
+        self.rate: float = rate_per_second
+        self.burst: int = burst
+        self._tokens: float = float(burst)
+        self._updated: float = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Any] = {"acquired": 0, "rejected": 0, "waited_seconds": 0.0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Vänta på en token; False om den inte blev ledig inom timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self._counters["acquired"] += 1
+                    self._counters["waited_seconds"] += waited
+                    return True
+                wait_time = (1 - self._tokens) / self.rate
+                if deadline is not None and time.monotonic() + wait_time > deadline:
+                    self._counters["rejected"] += 1
+                    return False
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill()
+            stats = dict(self._counters, tokens=round(self._tokens, 2))
+        stats["waited_seconds"] = round(stats["waited_seconds"], 3)
+        return stats
+
+
+class CircuitBreaker:
+    """
+    closed -> open efter `failure_threshold` fel i rad
+    open -> half_open efter `reset_timeout` sekunder (släpper igenom provanrop)
+    half_open -> closed vid lyckat prov, tillbaka till open vid fel
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.half_open_max_calls: int = half_open_max_calls
+        self.state: str = "closed"
+        self._failures: int = 0
+        self._opened_at: float = 0.0
+        self._probes: int = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probes = 0
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def cancel_probe(self) -> None:
+        """Ett släppt provanrop skickades aldrig (t.ex. stoppat av rate limitern)"""
+        with self._lock:
+            if self.state == "half_open" and self._probes > 0:
+                self._probes -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._counters["successes"] += 1
+            self._failures = 0
+            self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self._counters["opened"] += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, state=self.state, consecutive_failures=self._failures)
+
+
+class UpstreamGuard:
+    """Kombinerar retry, rate limiter och circuit breaker per värd"""
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, rate_per_second: Optional[float] = 10.0,
+                 burst: int = 20, limiter_timeout: float = 5.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0) -> None:
+        self.retry: RetryPolicy = retry or RetryPolicy()
+        self.rate_per_second: Optional[float] = rate_per_second
+        self.burst: int = burst
+        self.limiter_timeout: float = limiter_timeout
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self._hosts: Dict[str, Tuple[Optional[TokenBucket], CircuitBreaker]] = {}
+        self._lock = threading.Lock()
+
+    def _for_host(self, host: str) -> Tuple[Optional[TokenBucket], CircuitBreaker]:
+        with self._lock:
+            if host not in self._hosts:
+                limiter = TokenBucket(self.rate_per_second, self.burst) if self.rate_per_second else None
+                self._hosts[host] = (limiter, CircuitBreaker(self.failure_threshold, self.reset_timeout))
+            return self._hosts[host]
+
+    def call(self, url: str, send: Callable[[], requests.Response]) -> requests.Response:
+        """
+        Skicka ett idempotent GET-anrop genom skydden
+
+        Returnerar sista svaret (även 5xx när försöken är slut) så att
+        anroparen kan köra raise_for_status som vanligt.
+        """
+        limiter, breaker = self._for_host(urlparse(url).netloc)
+        self.retry.record_request()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            if not breaker.allow_request():
+                raise CircuitOpenError(f"Circuit breaker öppen för {urlparse(url).netloc}")
+            if limiter and not limiter.acquire(timeout=self.limiter_timeout):
+                breaker.cancel_probe()
+                raise RateLimitExceeded(f"Rate limit för {urlparse(url).netloc}")
+
+            error: Optional[Exception] = None
+            response: Optional[requests.Response] = None
+            try:
+                response = send()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            if response is not None and response.status_code not in RETRYABLE_STATUS:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+
+            if attempt >= self.retry.max_attempts or not self.retry.try_acquire_retry():
+                if response is not None:
+                    return response
+                raise error
+            time.sleep(self.retry.backoff(attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {
+            "retry": self.retry.stats(),
+            "hosts": {
+                host: {
+                    "rate_limiter": limiter.stats() if limiter else None,
+                    "circuit_breaker": breaker.stats()
+                }
+                for host, (limiter, breaker) in hosts.items()
+            }
+        }
@@ -1,62 +1,136 @@
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-from datetime import datetime
+from datetime import datetime, timezone
+import atexit
+import base64
+import gzip
+import json
 import sys
 import os
-from typing import Dict, Any, Union
+import threading
+from typing import Dict, Any, Tuple, Union
 
 # Add parent directory to Python path to import our database module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from lunch_system_database import SchoolLunchDB
+from allergen_tagging import parse_allergen_list
+from database_backup import BackupScheduler
+from import_jobs import ImportJobQueue, openfoodfacts_import_handler
+from order_batcher import OrderBatcher
+from rating_buffer import RatingBuffer
+from school_shards import SchoolShardRouter
 
 app = Flask(__name__)
 app.secret_key = 'simple-secret-key'
 
-# Initialize database with absolute path
+# Initialize database with absolute path; LUNCH_DB_PATH points the server (or the tests) at another file
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-db_path = os.path.join(project_root, 'test.db')
-db = SchoolLunchDB(db_path)
+db_path = os.environ.get('LUNCH_DB_PATH') or os.path.join(project_root, 'test.db')
+# Servern kör WAL så att backup och läsare inte väntar på beställningar (LUNCH_JOURNAL_MODE ändrar)
+db = SchoolLunchDB(db_path, journal_mode=os.environ.get('LUNCH_JOURNAL_MODE', 'WAL'))
+
+class SchoolServices:
+    """En skolas databas med importjobb, betygsbuffert och beställningsbatcher"""
+
+    def __init__(self, db: SchoolLunchDB, jobs: ImportJobQueue, rating_buffer: RatingBuffer,
+                 order_batcher: OrderBatcher) -> None:
+        self.db = db
+        self.jobs = jobs
+        self.rating_buffer = rating_buffer
+        self.order_batcher = order_batcher
+
+def _build_services(lunch_db: SchoolLunchDB, spool_path: str) -> SchoolServices:
+    # Importer körs som bakgrundsjobb så att förfrågan svarar direkt
+    school_jobs = ImportJobQueue(lunch_db.db)
+    school_jobs.register('openfoodfacts', openfoodfacts_import_handler(lunch_db))
+    # Betyg kvitteras direkt och sparas i omgångar; spool-filen gör att kvitterade betyg överlever en krasch
+    buffer = RatingBuffer(lunch_db, spool_path=spool_path)
+    # Beställningar som kommer inom några millisekunder sparas med en gemensam commit
+    batcher = OrderBatcher(lunch_db, max_batch_size=int(os.environ.get('ORDER_BATCH_SIZE', '64')),
+                           max_wait=float(os.environ.get('ORDER_BATCH_WAIT_MS', '5')) / 1000,
+                           submit_timeout=float(os.environ.get('ORDER_SUBMIT_TIMEOUT', '10')))
+    return SchoolServices(lunch_db, school_jobs, buffer, batcher)
+
+def _start_services(services: SchoolServices, db_file: str, backup_dir: str) -> None:
+    services.jobs.resume_pending()
+    services.rating_buffer.start()
+    atexit.register(services.rating_buffer.close)
+    atexit.register(services.order_batcher.close)
+    # LUNCH_BACKUP_INTERVAL (sekunder) startar online-backup av databasen
+    backup_interval = float(os.environ.get('LUNCH_BACKUP_INTERVAL', '0'))
+    if backup_interval > 0:
+        backups = BackupScheduler(db_file, backup_interval, backup_dir=backup_dir)
+        backups.start()
+        atexit.register(backups.stop)
+
+_default = _build_services(db, os.environ.get('RATING_SPOOL_PATH')
+                           or os.path.join(os.path.dirname(db_path), 'ratings.spool'))
+jobs, rating_buffer, order_batcher = _default.jobs, _default.rating_buffer, _default.order_batcher
+
+# LUNCH_SCHOOLS_DIR: en databasfil per skola (school_shards.py) - eleven väljer skola vid inloggning
+# och alla förfrågningar går till den skolans databas, jobbkö, betygsbuffert och batcher
+schools_dir = os.environ.get('LUNCH_SCHOOLS_DIR')
+school_router = (SchoolShardRouter(schools_dir, journal_mode=os.environ.get('LUNCH_JOURNAL_MODE', 'WAL'))
+                 if schools_dir else None)
+_schools: Dict[str, SchoolServices] = {}
+_schools_lock = threading.Lock()
+
+def _school(school_key: Union[str, None] = None) -> SchoolServices:
+    """Tjänsterna för inloggad skola (eller school_key); utan LUNCH_SCHOOLS_DIR den enda databasen"""
+    if school_router is None:
+        # Läses vid varje anrop så att testerna kan byta ut globalerna
+        return SchoolServices(db, jobs, rating_buffer, order_batcher)
+    key = school_router.normalize_key(school_key or session.get('school', ''))
+    with _schools_lock:
+        if key not in _schools:
+            # Bara skolor som finns - en inloggning med fel skolnyckel ska inte skapa en databas
+            lunch_db = school_router.for_school(key, create=False)
+            services = _build_services(lunch_db, os.path.join(school_router.shard_dir, f'{key}.ratings.spool'))
+            _start_services(services, school_router.shard_path(key),
+                            os.path.join(school_router.shard_dir, 'backups', key))
+            _schools[key] = services
+        return _schools[key]
+
+# Debug-läget startar om servern i en barnprocess - bara den (eller en WSGI-server) återupptar jobb
+if school_router is None and (__name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    _start_services(_default, db_path, os.path.join(os.path.dirname(db_path), 'backups'))
+
+@app.before_request
+def require_school():
+    # En session från innan LUNCH_SCHOOLS_DIR slogs på saknar skola - logga in igen
+    if school_router is not None and 'username' in session and 'school' not in session:
+        session.clear()
 
 @app.route('/')
 def index():
     if 'username' in session:
         return redirect(url_for('dashboard'))
-    return render_template('login.html')
+    return render_template('login.html', schools_enabled=school_router is not None)
 
 @app.route('/login', methods=['POST'])
 def login():
-    username = request.form['username']
-    print(f"🔐 LOGIN ATTEMPT: username = '{username}'")
+    username = request.form.get('username', '')
+    school_key = request.form.get('school', '')
     
-    # Direct database query to avoid Row object issues
+    # Indexerad uppslagning via den delade anslutningen (skiftläges- och mellanslagsokänslig)
     try:
-        import sqlite3
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        print(f"🔍 Searching for: LOWER('{username}') in database")
-        
-        # Look for student by name (case-insensitive)
-        cursor.execute("SELECT id, name FROM students WHERE LOWER(name) = LOWER(?)", (username,))
-        student = cursor.fetchone()
-        
-        print(f"📊 Database result: {student}")
-        
-        conn.close()
-        
-        if student:
-            session['username'] = student[1]  # Use the actual name from database
-            session['student_id'] = student[0]  # student ID
-            print(f"✅ LOGIN SUCCESS: {student[1]} (ID: {student[0]})")
-            return redirect(url_for('dashboard'))
-        else:
-            print(f"❌ LOGIN FAILED: No user found for '{username}'")
-            flash('Username not found')
-            return redirect(url_for('index'))
-            
+        student = _school(school_key).db.find_student_by_name(username)
+    except ValueError as e:
+        # Ogiltig eller okänd skolnyckel
+        flash(str(e))
+        return redirect(url_for('index'))
     except Exception as e:
-        print(f"💥 LOGIN ERROR: {str(e)}")
+        app.logger.exception("Login lookup failed")
         flash(f'Login error: {str(e)}')
         return redirect(url_for('index'))
+    
+    if not student:
+        flash('Username not found')
+        return redirect(url_for('index'))
+    
+    session['student_id'], session['username'] = student  # Use the actual name from database
+    if school_router is not None:
+        session['school'] = school_router.normalize_key(school_key)
+    return redirect(url_for('dashboard'))
 
 @app.route('/logout')
 def logout():
@@ -70,30 +144,150 @@ def dashboard():
     
     return render_template('dashboard.html', username=session['username'])
 
+# Serialiserade /api/meals-svar för aktuell katalogversion, per query-sträng och kodning;
+# en post per databas (boot_id) så att flera skolor inte tömmer varandras cache
+_meals_cache: Dict[str, Tuple[str, Dict[str, bytes]]] = {}
+_meals_cache_lock = threading.Lock()
+MEALS_CACHE_VARIANTS = 64
+
+MEAL_FIELDS = ('id', 'name', 'description', 'price', 'category', 'rating', 'rating_count', 'allergens')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Mindre svar än så här skickas okomprimerade - gzip-huvudet äter upp vinsten
+GZIP_MIN_BYTES = 1024
+
+def _cached_meals_body(db: SchoolLunchDB, version: str, key: str) -> Union[bytes, None]:
+    with _meals_cache_lock:
+        cached_version, bodies = _meals_cache.get(db.boot_id, ('', {}))
+        return bodies.get(key) if cached_version == version else None
+
+def _store_meals_body(db: SchoolLunchDB, version: str, key: str, body: bytes) -> None:
+    with _meals_cache_lock:
+        cached_version, bodies = _meals_cache.get(db.boot_id, ('', {}))
+        if cached_version != version:
+            bodies = {}
+            _meals_cache[db.boot_id] = (version, bodies)
+        if len(bodies) < MEALS_CACHE_VARIANTS:
+            bodies[key] = body
+
+def _encode_cursor(meal: Any) -> str:
+    raw = json.dumps([meal['name'], meal['id']], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        name, meal_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(name), int(meal_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def _number_arg(name: str) -> Union[float, None]:
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+def _meal_json(meal: Any, allergens: Dict[int, Any], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    meal_dict = {
+        'id': meal['id'],
+        'name': meal['name'],
+        'description': meal['description'],
+        'price': meal['price'],
+        'category': meal['category'],
+        'rating': round(meal['rating'], 1) if meal['rating'] else 0.0,
+        'rating_count': meal['rating_count'] if meal['rating_count'] else 0,
+        'allergens': allergens.get(meal['id'], [])
+    }
+    return meal_dict if fields == MEAL_FIELDS else {field: meal_dict[field] for field in fields}
+
+def _load_meals_body(db: SchoolLunchDB) -> bytes:
+    fields = tuple(field.strip() for field in request.args.get('fields', '').split(',') if field.strip()) or MEAL_FIELDS
+    unknown = [field for field in fields if field not in MEAL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    filters = {
+        'category': request.args.get('category') or None,
+        'min_price': _number_arg('min_price'),
+        'max_price': _number_arg('max_price'),
+        'min_rating': _number_arg('min_rating'),
+        # ?exclude_allergens=milk,gluten filtrerar på de lagrade allergentaggarna
+        'exclude_allergens': parse_allergen_list(request.args.get('exclude_allergens'))
+    }
+    
+    # Utan limit/cursor: hela listan som en array, som tidigare
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        meals = db.get_meals_page(None, **filters)
+        allergens = db.get_allergens_by_meal() if 'allergens' in fields else {}
+        return jsonify([_meal_json(meal, allergens, fields) for meal in meals]).get_data()
+    
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    after = _decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    # En extra rad avgör om det finns en sida till
+    meals = db.get_meals_page(limit + 1, after, **filters)
+    has_more = len(meals) > limit
+    meals = meals[:limit]
+    allergens = db.get_allergens_for([meal['id'] for meal in meals]) if 'allergens' in fields else {}
+    return jsonify({
+        'meals': [_meal_json(meal, allergens, fields) for meal in meals],
+        'next_cursor': _encode_cursor(meals[-1]) if has_more else None,
+        'has_more': has_more
+    }).get_data()
+
 @app.route('/api/meals')
 def get_meals():
     if 'username' not in session:
         return jsonify({'error': 'Not logged in'}), 401
     
+    # Versionen läses före frågan: ändras katalogen under tiden får svaret en äldre
+    # ETag och hämtas om nästa gång, aldrig tvärtom
+    db = _school().db
+    version = db.catalog_version
+    etag = f'meals-{version}'
+    last_modified = datetime.fromtimestamp(int(db.catalog_modified_at), timezone.utc)
+    
+    # Oförändrad katalog -> 304 utan frågor mot katalogen (versionen läser bara PRAGMA data_version)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+    
     try:
-        meals = db.get_all_meals()
-        meals_list = []
-        
-        if meals:  # Check if meals is not None
-            for meal in meals:
-                meals_list.append({
-                    'id': meal[0],
-                    'name': meal[1],
-                    'description': meal[2],
-                    'price': meal[3],
-                    'category': meal[4],
-                    'rating': round(meal[5], 1) if meal[5] else 0.0,  # meal[5] is rating
-                    'rating_count': meal[6] if meal[6] else 0  # meal[6] is rating_count
-                })
-        
-        return jsonify(meals_list)
+        if not_modified:
+            response = app.response_class(status=304)
+        else:
+            query = request.query_string.decode('utf-8', 'replace')
+            body = _cached_meals_body(db, version, query)
+            if body is None:
+                body = _load_meals_body(db)
+                _store_meals_body(db, version, query, body)
+            gzipped = len(body) >= GZIP_MIN_BYTES and request.accept_encodings['gzip'] > 0
+            if gzipped:
+                compressed = _cached_meals_body(db, version, 'gzip:' + query)
+                if compressed is None:
+                    compressed = gzip.compress(body, compresslevel=6, mtime=0)
+                    _store_meals_body(db, version, 'gzip:' + query, compressed)
+                body = compressed
+            response = app.response_class(body, mimetype='application/json')
+            if gzipped:
+                response.headers['Content-Encoding'] = 'gzip'
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Failed to load meals: {str(e)}'}), 500
+    
+    response.set_etag(etag, weak=True)
+    response.last_modified = last_modified
+    response.vary.add('Accept-Encoding')
+    # Webbläsaren får spara svaret men måste fråga om det ändrats innan det används
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/api/order', methods=['POST'])
 def order_meal():
@@ -105,16 +299,32 @@ def order_meal():
     
     if not meal_id:
         return jsonify({'error': 'No meal selected'}), 400
+    # JSON clients may send the id as a string; compare and store it as an int
+    try:
+        meal_id = int(meal_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid meal ID'}), 400
     
     # Record the transaction
     student_id = session.get('student_id')
     today = datetime.now().strftime('%Y-%m-%d')
+    # Clients may retry with the same key; the order is only stored once
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
     
-    try:
-        transaction_id = db.record_transaction(student_id, meal_id, today)
-        return jsonify({'success': True, 'message': 'Order placed successfully!'})
-    except Exception as e:
+    result = _school().order_batcher.submit(student_id, meal_id, today, idempotency_key)
+    if result.get('timed_out'):
+        # Kan ha sparats ändå - klienten försöker igen med samma Idempotency-Key
+        return jsonify({'error': 'Order could not be confirmed in time, please retry'}), 503
+    if 'error' in result:
         return jsonify({'error': 'Failed to place order'}), 500
+    if not idempotency_key:
+        return jsonify({'success': True, 'message': 'Order placed successfully!',
+                        'transaction_id': result['transaction_id']})
+    
+    if result['student_id'] != student_id or result['meal_id'] != meal_id:
+        return jsonify({'error': 'Idempotency key already used for another order'}), 409
+    return jsonify({'success': True, 'message': 'Order placed successfully!',
+                    'transaction_id': result['transaction_id'], 'replayed': result['replayed']})
 
 @app.route('/api/rate', methods=['POST'])
 def rate_meal():
@@ -131,35 +341,57 @@ def rate_meal():
     if rating < 1 or rating > 5:
         return jsonify({'error': 'Rating must be between 1 and 5'}), 400
     
-    success = db.rate_meal(meal_id, rating)
-    if success:
-        return jsonify({'success': True, 'message': 'Rating submitted!'})
-    else:
+    school = _school()
+    # En läsning på primärnyckeln; själva skrivningen görs av rating_buffer i en batch
+    if not school.db.db.execute("SELECT 1 FROM meals WHERE id = ?", (meal_id,)):
         return jsonify({'error': 'Failed to submit rating'}), 500
+    
+    seq = school.rating_buffer.submit(meal_id, rating)
+    return jsonify({'success': True, 'message': 'Rating submitted!', 'seq': seq})
 
 @app.route('/api/import-openfoodfacts', methods=['POST'])
 def import_from_openfoodfacts():
-    """Importera måltider från Open Food Facts API"""
+    """Starta en import från Open Food Facts som bakgrundsjobb"""
     if 'username' not in session:
         return jsonify({'error': 'Not logged in'}), 401
     
-    data = request.get_json()
-    search_term = data.get('search_term', 'pasta')
+    data = request.get_json() or {}
+    # search_terms (lista eller kommaseparerad sträng) importerar flera termer parallellt i ett jobb
+    search_terms = data.get('search_terms') or data.get('search_term') or 'pasta'
+    if isinstance(search_terms, str):
+        search_terms = search_terms.split(',')
+    search_terms = list(dict.fromkeys(term.strip() for term in search_terms if term and term.strip())) or ['pasta']
     
     try:
-        result = db.import_meals_from_openfoodfacts(search_term)
-        
-        if "error" in result:
-            return jsonify({'error': result['error']}), 500
-        
+        # Samma sökterm(er) som redan väntar eller körs ger samma jobb
+        if len(search_terms) == 1:
+            params = {'search_term': search_terms[0]}
+        else:
+            params = {'search_terms': search_terms}
+        dedupe_key = "openfoodfacts:" + ",".join(sorted(term.lower() for term in search_terms))
+        job, deduplicated = _school().jobs.submit('openfoodfacts', params, dedupe_key=dedupe_key)
         return jsonify({
             'success': True,
-            'message': f"Importerade {result['added']} nya måltider för söktermen '{result['search_term']}'",
-            'details': result
-        })
+            'message': f"Import av '{', '.join(search_terms)}' {'pågår redan' if deduplicated else 'startad'}",
+            'job_id': job['id'],
+            'status': job['status'],
+            'deduplicated': deduplicated,
+            'status_url': url_for('get_job', job_id=job['id'])
+        }), 202
     except Exception as e:
         return jsonify({'error': f'Import misslyckades: {str(e)}'}), 500
 
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id: str):
+    """Status, progress och resultat för ett importjobb"""
+    if 'username' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    job = _school().jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
 @app.route('/api/test-openfoodfacts')
 def test_openfoodfacts():
     """Test-endpoint för att testa Open Food Facts API"""
@@ -181,5 +413,14 @@ def test_openfoodfacts():
     except Exception as e:
         return jsonify({'error': f'Test misslyckades: {str(e)}'}), 500
 
+@app.route('/api/upstream-status')
+def upstream_status():
+    """Retry-, rate limit-, circuit breaker- och cache-räknare för de externa API:erna"""
+    try:
+        from skolmaten_api import get_default_api
+        return jsonify(get_default_api().upstream_stats())
+    except ImportError:
+        return jsonify({'error': 'Open Food Facts API inte tillgängligt'}), 500
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)